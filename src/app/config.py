@@ -1,5 +1,6 @@
 # src/app/config.py
 import configparser
+import io
 import logging
 import os
 import shutil
@@ -74,6 +75,103 @@ def load_config(config_file: str = None) -> configparser.ConfigParser:
         config["AI"] = {"default_model_gemini": "gemini-3.0-flash"}
     if "Proxy" not in config:
         config["Proxy"] = {"http_proxy": ""}
+    if "Images" not in config:
+        config["Images"] = {
+            "max_inline_mb": "20",
+            "max_download_mb": "20",
+            "download_timeout": "30",
+            "max_concurrent_fetches": "4",
+            "preprocess": "false",
+            "max_edge": "1536",
+            "high_detail_max_edge": "2048",
+            "low_detail_max_edge": "512",
+            "output_format": "jpeg",
+            "quality": "85",
+            "preprocess_workers": "2",
+            "dedupe_frames": "false",
+            "dedupe_threshold": "6",
+        }
+    if "PDF" not in config:
+        config["PDF"] = {
+            "preprocess": "false",
+            "max_image_edge": "1600",
+            "oversized_images": "downscale",
+            "image_quality": "75",
+            "workers": "2",
+        }
+    if "Batch" not in config:
+        config["Batch"] = {
+            "concurrency": "4",
+            "max_retries": "2",
+        }
+    if "MicroBatch" not in config:
+        config["MicroBatch"] = {
+            "models": "",
+            "window_ms": "30",
+            "max_batch": "8",
+            "max_prompt_chars": "1500",
+            "max_batch_chars": "12000",
+        }
+    if "Translate" not in config:
+        config["Translate"] = {
+            "concurrency": "4",
+            "chunk_chars": "4000",
+            "pack_size": "40",
+            "memory_entries": "20000",
+        }
+    if "Responses" not in config:
+        config["Responses"] = {"max_stored": "1000"}
+    if "Telemetry" not in config:
+        config["Telemetry"] = {
+            "server_timing": "true",
+            "slow_request_ms": "15000",
+            "top_clients": "100",
+            "timeseries_seconds": "300",
+            "timeseries_minutes": "120",
+        }
+    if "Tracing" not in config:
+        config["Tracing"] = {
+            "enabled": "false",
+            "sample_rate": "0.1",
+            "keep_slow_and_errors": "true",
+            "format": "otlp",
+            "export_dir": "",
+            "retention_days": "3",
+        }
+    if "LoopMonitor" not in config:
+        config["LoopMonitor"] = {
+            "enabled": "true",
+            "interval_ms": "100",
+            "block_threshold_ms": "200",
+            "max_events": "20",
+        }
+    if "Executors" not in config:
+        config["Executors"] = {
+            "io_workers": "4",
+            "cpu_workers": "2",
+            "cpu_processes": "2",
+            "process_threshold_kb": "1024",
+        }
+    if "Memory" not in config:
+        config["Memory"] = {
+            "tracemalloc_at_start": "false",
+            "tracemalloc_frames": "10",
+            "request_sample_rate": "0.0",
+        }
+    if "Jobs" not in config:
+        config["Jobs"] = {
+            "retention_minutes": "60",
+            "max_active": "32",
+            "webhook_hosts": "localhost,127.0.0.1,::1",
+        }
+    if "Storage" not in config:
+        config["Storage"] = {
+            "ttl_hours": "24",
+            "quota_mb": "2048",
+            "sweep_interval": "300",
+            "max_upload_mb": "50",
+            "files_dir": "",
+        }
     if "Telegram" not in config:
         config["Telegram"] = {
             "enabled": "false",
@@ -95,11 +193,27 @@ def load_config(config_file: str = None) -> configparser.ConfigParser:
 
 def write_config(config: configparser.ConfigParser, config_file: str = None) -> bool:
     """Write the current config state to disk."""
-    if config_file is None:
-        config_file = DEFAULT_CONFIG_PATH
+    buffer = io.StringIO()
+    config.write(buffer)
+    return _write_config_text(buffer.getvalue(), config_file or DEFAULT_CONFIG_PATH)
+
+
+async def write_config_async(config: configparser.ConfigParser, config_file: str = None) -> bool:
+    """
+    ``write_config`` for coroutines: the file is written on the ``io`` executor.
+    The config is rendered first, on the loop, so later edits cannot race the write.
+    """
+    from app.utils.executors import run_blocking  # executors reads CONFIG from this module
+
+    buffer = io.StringIO()
+    config.write(buffer)
+    return await run_blocking(_write_config_text, buffer.getvalue(), config_file or DEFAULT_CONFIG_PATH)
+
+
+def _write_config_text(text: str, config_file: str) -> bool:
     try:
         with open(config_file, "w", encoding="utf-8") as f:
-            config.write(f)
+            f.write(text)
         return True
     except Exception as e:
         logger.error(f"Error writing to config file: {e}")
@@ -1,13 +1,17 @@
 # src/app/endpoints/admin_api.py
+import asyncio
 import json
+import time
 import tomllib
 from pathlib import Path
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response
 from pydantic import BaseModel
 from sse_starlette.sse import EventSourceResponse
 
-from app.config import CONFIG, write_config
+from app.config import CONFIG, write_config_async
 from app.logger import logger
 from app.services.gemini_client import (
     GeminiClientNotInitializedError,
@@ -17,8 +21,14 @@ from app.services.gemini_client import (
 )
 from app.services.curl_parser import parse_curl_command
 from app.services.log_broadcaster import SSELogBroadcaster
+from app.services.loop_monitor import LoopMonitor
+from app.services.memory_diagnostics import GROUP_BY, MemoryDiagnostics
+from app.services.micro_batcher import MicroBatcher
+from app.services.profiler import CpuProfiler, ProfileResult
 from app.services.stats_collector import StatsCollector
 from app.services.telegram_notifier import TelegramNotifier
+from app.services.temp_janitor import TempJanitor
+from app.services.timeseries import StatsTimeSeries
 
 router = APIRouter(prefix="/api/admin", tags=["Admin API"])
 
@@ -88,6 +98,27 @@ async def get_status():
     }
 
 
+@router.get("/stats/stream")
+async def stream_stats(request: Request):
+    """
+    SSE stream for the dashboard: ``history`` (the per-second and per-minute
+    rings) on connect, then a ``second`` point every second, a ``minute``
+    point each minute and the full ``status`` every 10 seconds.
+    """
+    series = StatsTimeSeries.get_instance()
+
+    async def event_generator():
+        yield {"event": "status", "data": json.dumps(await get_status())}
+        async for kind, payload in series.subscribe():
+            if await request.is_disconnected():
+                break
+            yield {"event": kind, "data": json.dumps(payload)}
+            if kind == "second" and payload["t"] % 10 == 0:
+                yield {"event": "status", "data": json.dumps(await get_status())}
+
+    return EventSourceResponse(event_generator())
+
+
 # --- Config ---
 
 
@@ -132,7 +163,7 @@ async def import_from_curl(request: CurlImportRequest):
         )
     CONFIG["Cookies"]["gemini_cookie_1psid"] = result.secure_1psid
     CONFIG["Cookies"]["gemini_cookie_1psidts"] = result.secure_1psidts
-    write_config(CONFIG)
+    await write_config_async(CONFIG)
     logger.info("Cookies imported from cURL, reinitializing client...")
     success = await init_gemini_client()
     status = get_client_status()
@@ -155,7 +186,7 @@ async def update_cookies(request: CookieUpdateRequest):
     """Update cookie values and reinitialize the Gemini client."""
     CONFIG["Cookies"]["gemini_cookie_1psid"] = request.secure_1psid
     CONFIG["Cookies"]["gemini_cookie_1psidts"] = request.secure_1psidts
-    write_config(CONFIG)
+    await write_config_async(CONFIG)
     logger.info("Cookies updated via admin UI, reinitializing client...")
     success = await init_gemini_client()
     status = get_client_status()
@@ -172,7 +203,7 @@ async def update_cookies(request: CookieUpdateRequest):
 async def update_model(request: ModelUpdateRequest):
     """Update the default Gemini model."""
     CONFIG["AI"]["default_model_gemini"] = request.model
-    write_config(CONFIG)
+    await write_config_async(CONFIG)
     return {"success": True, "model": request.model}
 
 
@@ -180,7 +211,7 @@ async def update_model(request: ModelUpdateRequest):
 async def update_proxy(request: ProxyUpdateRequest):
     """Update proxy settings and reinitialize client."""
     CONFIG["Proxy"]["http_proxy"] = request.http_proxy
-    write_config(CONFIG)
+    await write_config_async(CONFIG)
     logger.info("Proxy updated, reinitializing client...")
     success = await init_gemini_client()
     return {"success": success}
@@ -227,6 +258,181 @@ async def get_recent_logs(count: int = 50):
     return {"logs": broadcaster.get_recent(count)}
 
 
+# --- Temp Storage ---
+
+
+@router.get("/storage")
+async def get_storage_stats():
+    """Return temp directory usage and janitor metrics."""
+    return TempJanitor.get_instance().get_stats()
+
+
+@router.post("/storage/sweep")
+async def run_storage_sweep():
+    """Run a janitor sweep (TTL + quota) immediately."""
+    janitor = TempJanitor.get_instance()
+    result = await asyncio.to_thread(janitor.sweep)
+    return {"success": True, **result, "stats": janitor.get_stats()}
+
+
+@router.get("/microbatch")
+async def get_microbatch_stats():
+    """Return micro-batching counters (batches, fallbacks, pending prompts)."""
+    return MicroBatcher.get_instance().get_stats()
+
+
+# --- Event loop ---
+
+
+@router.get("/loop")
+async def get_loop_stats():
+    """Event-loop lag percentiles and the most recent blocking calls with their stacks."""
+    return {
+        **StatsCollector.get_instance().get_stats()["event_loop"],
+        "recent_blocks": LoopMonitor.get_instance().recent_blocks(),
+    }
+
+
+@router.get("/clients")
+async def get_top_clients(limit: int = Query(20, ge=1, le=1000)):
+    """Heaviest clients (API key fingerprint or user agent + address) by request count."""
+    return {"clients": StatsCollector.get_instance().top_clients(limit)}
+
+
+# --- Profiling ---
+
+
+def _profile_download(result: ProfileResult, fmt: str) -> Response:
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if fmt == "pstats":
+        return Response(
+            result.to_pstats(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="profile-{stamp}.pstats"'},
+        )
+    return Response(
+        result.to_collapsed(),
+        media_type="text/plain; charset=utf-8",
+        headers={"Content-Disposition": f'attachment; filename="profile-{stamp}.collapsed.txt"'},
+    )
+
+
+def _profile_summary(result: ProfileResult) -> dict:
+    return {
+        "duration_seconds": round(result.duration, 2),
+        "interval_ms": result.interval * 1000,
+        "samples": result.sample_count,
+        "idle_samples_dropped": result.idle_dropped,
+        "threads": sorted({thread for thread, _ in result.samples}),
+        "top": result.top(),
+    }
+
+
+@router.post("/profile")
+async def run_cpu_profile(
+    seconds: float = Query(10, ge=1, le=120),
+    interval_ms: float = Query(5, ge=1, le=100),
+    format: str = Query("json", pattern="^(json|collapsed|pstats)$"),
+    include_idle: bool = False,
+):
+    """
+    Sample the stacks of all threads for *seconds*.
+
+    ``format=json`` returns a summary (top functions by self time); the full
+    profile stays downloadable from ``GET /profile/last``.  ``collapsed`` and
+    ``pstats`` return the file directly.
+    """
+    profiler = CpuProfiler.get_instance()
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="A profile is already running.")
+    logger.info(f"CPU profile started ({seconds:g}s, every {interval_ms:g} ms)")
+    result = await profiler.run(seconds, interval_ms, include_idle)
+    logger.info(f"CPU profile finished: {result.sample_count} sample(s)")
+    if format == "json":
+        return _profile_summary(result)
+    return _profile_download(result, format)
+
+
+@router.get("/profile/last")
+async def download_last_profile(format: str = Query("collapsed", pattern="^(collapsed|pstats)$")):
+    """Download the most recent profile as collapsed stacks or a pstats file."""
+    result = CpuProfiler.get_instance().last
+    if result is None:
+        raise HTTPException(status_code=404, detail="No profile has been recorded yet.")
+    return _profile_download(result, format)
+
+
+# --- Memory ---
+
+_GROUP_BY_PATTERN = "^(" + "|".join(GROUP_BY) + ")$"
+
+
+@router.get("/memory")
+async def get_memory_status():
+    """tracemalloc state, RSS, stored snapshots and sizes of in-process caches."""
+    return MemoryDiagnostics.get_instance().status()
+
+
+@router.post("/memory/tracemalloc/start")
+async def start_tracemalloc(frames: Optional[int] = Query(None, ge=1, le=100)):
+    diagnostics = MemoryDiagnostics.get_instance()
+    diagnostics.start(frames)
+    return {"success": True, **diagnostics.status()}
+
+
+@router.post("/memory/tracemalloc/stop")
+async def stop_tracemalloc():
+    diagnostics = MemoryDiagnostics.get_instance()
+    diagnostics.stop()
+    return {"success": True, **diagnostics.status()}
+
+
+@router.post("/memory/snapshots")
+async def take_memory_snapshot(
+    group_by: str = Query("lineno", pattern=_GROUP_BY_PATTERN), limit: int = Query(25, ge=1, le=500)
+):
+    """Take a tracemalloc snapshot; returns its id and top allocation sites."""
+    diagnostics = MemoryDiagnostics.get_instance()
+    try:
+        snapshot_id = await diagnostics.take_snapshot()
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    return await diagnostics.top(snapshot_id, group_by, limit)
+
+
+@router.get("/memory/snapshots/{snapshot_id}")
+async def get_memory_snapshot(
+    snapshot_id: int,
+    group_by: str = Query("lineno", pattern=_GROUP_BY_PATTERN),
+    limit: int = Query(25, ge=1, le=500),
+):
+    try:
+        return await MemoryDiagnostics.get_instance().top(snapshot_id, group_by, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Snapshot {snapshot_id} not found.")
+
+
+@router.delete("/memory/snapshots/{snapshot_id}")
+async def delete_memory_snapshot(snapshot_id: int):
+    if not MemoryDiagnostics.get_instance().delete_snapshot(snapshot_id):
+        raise HTTPException(status_code=404, detail=f"Snapshot {snapshot_id} not found.")
+    return {"success": True}
+
+
+@router.get("/memory/diff")
+async def diff_memory_snapshots(
+    base: int,
+    target: int,
+    group_by: str = Query("lineno", pattern=_GROUP_BY_PATTERN),
+    limit: int = Query(25, ge=1, le=500),
+):
+    """Allocation sites ordered by how much they grew from *base* to *target*."""
+    try:
+        return await MemoryDiagnostics.get_instance().diff(base, target, group_by, limit)
+    except KeyError as exc:
+        raise HTTPException(status_code=404, detail=f"Snapshot {exc.args[0]} not found.")
+
+
 # --- Telegram ---
 
 
@@ -252,7 +458,7 @@ async def update_telegram_config(request: TelegramUpdateRequest):
     CONFIG["Telegram"]["bot_token"] = request.bot_token
     CONFIG["Telegram"]["chat_id"] = request.chat_id
     CONFIG["Telegram"]["cooldown_seconds"] = str(request.cooldown_seconds)
-    write_config(CONFIG)
+    await write_config_async(CONFIG)
     logger.info(f"Telegram notifications {'enabled' if request.enabled else 'disabled'}.")
     return {"success": True}
 
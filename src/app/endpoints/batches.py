@@ -0,0 +1,85 @@
+# src/app/endpoints/batches.py
+"""
+OpenAI-compatible Batch API.
+
+Upload a JSONL file of chat-completion requests via ``POST /v1/files``
+(``purpose=batch``), then create a batch from its file ID.  Progress is polled
+with ``GET /v1/batches/{id}``; once it completes, ``output_file_id`` (and
+``error_file_id``) can be downloaded from ``GET /v1/files/{id}/content``.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, ValidationError
+
+from app.endpoints.chat import _to_openai_format, generate_chat_completion
+from app.services.batch_manager import BatchError, BatchManager
+from schemas.request import OpenAIChatRequest
+
+router = APIRouter()
+
+
+class CreateBatchRequest(BaseModel):
+    input_file_id: str
+    endpoint: str = "/v1/chat/completions"
+    completion_window: str = "24h"
+    metadata: Optional[dict] = None
+
+
+async def _run_chat_completion(body: dict) -> dict:
+    """Batch handler: one non-streaming chat completion."""
+    try:
+        request = OpenAIChatRequest.model_validate(body)
+    except ValidationError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    text, model_value, images, dropped = await generate_chat_completion(request)
+    return _to_openai_format(text, model_value, images, False, dropped)
+
+
+BatchManager.register_handler("/v1/chat/completions", _run_chat_completion)
+
+
+@router.post("/v1/batches")
+async def create_batch(request: CreateBatchRequest):
+    """Create and start a batch from an uploaded JSONL file."""
+    try:
+        return await BatchManager.get_instance().create(
+            request.input_file_id, request.endpoint, request.completion_window, request.metadata
+        )
+    except BatchError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+
+
+@router.get("/v1/batches")
+async def list_batches(
+    after: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+):
+    """List batches, newest first."""
+    batches, has_more = BatchManager.get_instance().list_batches(after, limit)
+    return {
+        "object": "list",
+        "data": batches,
+        "first_id": batches[0]["id"] if batches else None,
+        "last_id": batches[-1]["id"] if batches else None,
+        "has_more": has_more,
+    }
+
+
+@router.get("/v1/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    """Return a batch's status and request counts."""
+    batch = BatchManager.get_instance().get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Batch not found: {batch_id}")
+    return batch
+
+
+@router.post("/v1/batches/{batch_id}/cancel")
+async def cancel_batch(batch_id: str):
+    """Cancel a running batch; finished results stay downloadable."""
+    try:
+        return await BatchManager.get_instance().cancel(batch_id)
+    except BatchError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
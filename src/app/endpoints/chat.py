@@ -1,25 +1,40 @@
 # src/app/endpoints/chat.py
+import asyncio
 import json
 import time
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import List, Optional, Sequence, Tuple
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
 from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
 from app.config import CONFIG
 from app.logger import logger
 from app.services.gemini_client import GeminiClientNotInitializedError, get_gemini_client
 from app.services.telegram_notifier import TelegramNotifier
 from app.services.session_manager import get_translate_session_manager
+from app.services.file_index import FileIndex
+from app.services.micro_batcher import MicroBatcher
+from app.services.stats_collector import request_phase, set_request_model
+from app.services.temp_janitor import TempJanitor
+from app.services.tracer import span
+from app.services.translator import BulkTranslator
 from app.utils.image_utils import (
+    InlineDataTooLarge,
     cleanup_temp_files,
     decode_base64_to_tempfile,
     download_to_tempfile,
+    drop_near_duplicate_frames,
     get_temp_dir,
+    preprocess_image,
     serialize_response_images,
 )
-from schemas.request import GeminiModels, GeminiRequest, OpenAIChatRequest
+from app.utils.executors import run_cpu
+from app.utils.json_ingest import ingest_json_body
+from app.utils.pdf_utils import extract_pdf_text, preprocess_pdf
+from schemas.request import BulkTranslateRequest, GeminiModels, GeminiRequest, OpenAIChatRequest
 
 router = APIRouter()
 
@@ -103,7 +118,126 @@ def _get_cookies(gemini_client) -> dict:
         return {}
 
 
-async def _extract_multimodal_content(content) -> Tuple[str, List[Path]]:
+async def _read_json_body(request: Request) -> Tuple[dict, List[Path]]:
+    """
+    Stream the request body, spooling inline base64 images straight to disk.
+
+    Returns ``(body, temp_file_paths)``; data URIs in the body are replaced by
+    ``file://`` references to the returned temp files, which the caller must
+    clean up.  Oversized inline images are rejected with 413 while streaming.
+    """
+    max_inline_bytes = CONFIG.getint("Images", "max_inline_mb", fallback=20) * 1024 * 1024
+    try:
+        with request_phase("body"):
+            body, paths = await ingest_json_body(request.stream(), max_inline_bytes)
+    except InlineDataTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON body: {exc}")
+
+    if not isinstance(body, dict):
+        cleanup_temp_files(paths)
+        raise HTTPException(status_code=400, detail="Request body must be a JSON object.")
+    return body, paths
+
+
+async def _resolve_image_url(url: str, detail: Optional[str] = None) -> Optional[Path]:
+    """
+    Turn one image URL into a local file path, ready for upload.
+
+    Handles base64 data URIs, ``file://<file_id>`` references to uploaded
+    files, and remote ``http(s)://`` URLs (downloaded to a temp file), then
+    runs the optional ``[Images]`` preprocess stage honouring ``detail``
+    (or the ``[PDF]`` stage for PDFs).
+    Returns None (after logging) when the image cannot be used.
+    """
+    path, _ = await _resolve_file_url(url, detail=detail)
+    return path
+
+
+async def _resolve_file_url(
+    url: str,
+    detail: Optional[str] = None,
+    pages: Optional[str] = None,
+    text_only: bool = False,
+    mime_type: Optional[str] = None,
+) -> Tuple[Optional[Path], Optional[str]]:
+    """
+    Resolve an image or document reference into ``(path, text)``.
+
+    ``mime_type`` is the type the client declared for a remote URL, used when
+    the server does not send a specific one.
+
+    PDFs go through the ``[PDF]`` stage: ``pages`` selects a page range and
+    ``text_only`` returns the extracted text layer instead of a file (falling
+    back to the file when the PDF has no usable text).
+    """
+    with span("input.fetch", source=url.split(":", 1)[0]) as fetch_span:
+        path = await _fetch_image_url(url, mime_type)
+        if fetch_span is not None and path is not None:
+            fetch_span.set(bytes=path.stat().st_size if path.exists() else 0)
+    if path is None:
+        return None, None
+
+    if path.suffix.lower() == ".pdf":
+        if text_only:
+            text = await extract_pdf_text(path, pages)
+            if text:
+                if not url.startswith("file://"):
+                    cleanup_temp_files([path])
+                return None, text
+        processed = await preprocess_pdf(path, pages)
+    else:
+        processed = await preprocess_image(path, detail)
+    if processed != path and not url.startswith("file://"):
+        # The downloaded/decoded original is no longer needed
+        cleanup_temp_files([path])
+    return processed, None
+
+
+async def _fetch_image_url(url: str, mime_type: Optional[str] = None) -> Optional[Path]:
+    if url.startswith("data:"):
+        # base64 data URI
+        max_bytes = CONFIG.getint("Images", "max_inline_mb", fallback=20) * 1024 * 1024
+        try:
+            # Decoded on a worker; large payloads go to a worker process
+            return await run_cpu(decode_base64_to_tempfile, url, max_bytes, get_temp_dir(), size=len(url))
+        except ValueError as exc:
+            logger.warning(f"Skipping invalid base64 image: {exc}")
+            return None
+        except Exception as exc:
+            # e.g. OSError or a broken worker pool — skip the part rather than
+            # failing the gather (and leaking the other parts' temp files)
+            logger.error(f"Failed to decode base64 image: {exc}", exc_info=True)
+            return None
+
+    if url.startswith("file://"):
+        # Reference to a previously uploaded file — resolve file_id
+        file_id = url[len("file://"):]
+        uploaded = FileIndex.get_instance().resolve(file_id)
+        if uploaded is not None:
+            TempJanitor.get_instance().touch(uploaded)
+            return uploaded
+        # Otherwise an inline image spooled to the temp dir while reading the body
+        if "/" in file_id or "\\" in file_id or ".." in file_id:
+            logger.warning(f"Invalid file_id in URL: {url}")
+            return None
+        candidate = get_temp_dir() / file_id
+        if candidate.exists():
+            return candidate
+        logger.warning(f"File not found for file_id: {file_id}")
+        return None
+
+    if url.startswith("http://") or url.startswith("https://"):
+        # Remote image URL — download to temp file
+        return await download_to_tempfile(url, mime_type=mime_type)
+
+    return None
+
+
+async def _extract_multimodal_content(
+    content, semaphore: Optional[asyncio.Semaphore] = None
+) -> Tuple[str, List[Path]]:
     """
     Parse a message ``content`` field that may be:
     - a plain string
@@ -117,6 +251,14 @@ async def _extract_multimodal_content(content) -> Tuple[str, List[Path]]:
     - Chat Completions: ``{"image_url": {"url": "data:..."}}``)
     - Responses API:    ``{"image_url": "data:..."}``  (direct string)
 
+    Document parts (``file`` / ``input_file``) take ``file_data``, ``file_id``
+    or ``file_url``, plus optional ``pages`` and ``text_only`` extensions for
+    PDFs; text-only PDFs contribute their text layer instead of a file.
+
+    Image parts are resolved concurrently (downloads bounded by ``semaphore``)
+    and may be downscaled per their ``detail`` hint (see ``preprocess_image``);
+    the returned file list keeps the original part order.
+
     Returns ``(text_prompt, temp_file_paths)``.
     Temp files are created for base64 data URIs and remote URL images; the caller
     is responsible for cleaning them up after use.
@@ -127,8 +269,15 @@ async def _extract_multimodal_content(content) -> Tuple[str, List[Path]]:
     if not isinstance(content, list):
         return str(content) if content else "", []
 
+    if semaphore is None:
+        semaphore = _new_fetch_semaphore()
+
+    # Text per part in order; file parts hold "" until a text-only PDF fills
+    # in its text layer at the same position
     text_parts: List[str] = []
-    file_paths: List[Path] = []
+    # (url, detail, pages, text_only, mime_type) per image/file part, in order
+    file_refs: List[Tuple[str, Optional[str], Optional[str], bool, Optional[str]]] = []
+    file_slots: List[int] = []  # index in text_parts of each file_refs entry
 
     for part in content:
         if not isinstance(part, dict):
@@ -146,40 +295,68 @@ async def _extract_multimodal_content(content) -> Tuple[str, List[Path]]:
         elif part_type in ("image_url", "input_image"):
             img_url_obj = part.get("image_url", {})
             # Chat Completions: image_url is {"url": "...", "detail": "..."}
-            # Responses API:    image_url is a direct string "data:..." or "https://..."
-            url: str = img_url_obj.get("url", "") if isinstance(img_url_obj, dict) else str(img_url_obj)
-
-            if not url:
-                continue
+            # Responses API:    image_url is a direct string "data:..." or "https://...",
+            #                   with "detail" on the part itself
+            if isinstance(img_url_obj, dict):
+                url: str = img_url_obj.get("url", "")
+                detail = img_url_obj.get("detail")
+            else:
+                url = str(img_url_obj)
+                detail = part.get("detail")
+            if url:
+                file_refs.append((url, detail, None, False, None))
+                file_slots.append(len(text_parts))
+                text_parts.append("")
+
+        # File parts — Chat Completions ("file": {...}) and Responses API ("input_file")
+        elif part_type in ("file", "input_file"):
+            file_obj = part.get("file") if isinstance(part.get("file"), dict) else part
+            if file_obj.get("file_data"):
+                url = file_obj["file_data"]
+            elif file_obj.get("file_id"):
+                url = f"file://{file_obj['file_id']}"
+            else:
+                url = file_obj.get("file_url", "")
+            # Extensions: "pages": "1-3,7" and "text_only": true (PDFs), and
+            # "mime_type" declaring the type of a file_url
+            pages = file_obj.get("pages", part.get("pages"))
+            text_only = bool(file_obj.get("text_only", part.get("text_only", False)))
+            if url:
+                file_refs.append((url, None, pages, text_only, file_obj.get("mime_type")))
+                file_slots.append(len(text_parts))
+                text_parts.append("")
+
+    async def _bounded(ref) -> Tuple[Optional[Path], Optional[str]]:
+        async with semaphore:
+            return await _resolve_file_url(*ref)
+
+    resolved = await asyncio.gather(*(_bounded(ref) for ref in file_refs))
+    file_paths = [path for path, _ in resolved if path is not None]
+    for slot, (_, text) in zip(file_slots, resolved):
+        if text:
+            text_parts[slot] = text
+
+    return " ".join(part for part in text_parts if part), file_paths
+
+
+def _new_fetch_semaphore() -> asyncio.Semaphore:
+    """Semaphore bounding concurrent image fetches/decodes for one request."""
+    return asyncio.Semaphore(max(1, CONFIG.getint("Images", "max_concurrent_fetches", fallback=4)))
+
+
+async def _extract_all_contents(contents: list) -> List[Tuple[str, List[Path]]]:
+    """
+    Run ``_extract_multimodal_content`` for every message content at once.
 
-            if url.startswith("data:"):
-                # base64 data URI
-                try:
-                    temp_path = decode_base64_to_tempfile(url)
-                    file_paths.append(temp_path)
-                except ValueError as exc:
-                    logger.warning(f"Skipping invalid base64 image: {exc}")
-
-            elif url.startswith("file://"):
-                # Reference to a previously uploaded file — resolve file_id
-                file_id = url[len("file://"):]
-                # Sanitize
-                if "/" not in file_id and "\\" not in file_id and ".." not in file_id:
-                    candidate = get_temp_dir() / file_id
-                    if candidate.exists():
-                        file_paths.append(candidate)
-                    else:
-                        logger.warning(f"File not found for file_id: {file_id}")
-                else:
-                    logger.warning(f"Invalid file_id in URL: {url}")
-
-            elif url.startswith("http://") or url.startswith("https://"):
-                # Remote image URL — download to temp file
-                temp_path = await download_to_tempfile(url)
-                if temp_path:
-                    file_paths.append(temp_path)
-
-    return " ".join(text_parts), file_paths
+    All image parts of all messages share one fan-out bound, so a request
+    with N remote images costs roughly the slowest download instead of the
+    sum.  Results are returned in message order.
+    """
+    semaphore = _new_fetch_semaphore()
+    with request_phase("inputs"):
+        return list(await asyncio.gather(
+            *(_extract_multimodal_content(content, semaphore) for content in contents)
+        ))
 
 
 # ---------------------------------------------------------------------------
@@ -213,6 +390,7 @@ async def translate_chat(request: GeminiRequest):
     except GeminiClientNotInitializedError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
+    set_request_model(request.model.value)
     session_manager = get_translate_session_manager()
     if not session_manager:
         raise HTTPException(status_code=503, detail="Session manager is not initialized.")
@@ -224,11 +402,49 @@ async def translate_chat(request: GeminiRequest):
         raise HTTPException(status_code=500, detail=f"Error during translation: {str(e)}")
 
 
+@router.post("/translate/bulk")
+async def translate_bulk(request: BulkTranslateRequest):
+    """
+    Translate many strings (``texts``) or one long ``document`` in parallel
+    stateless calls, reusing the translation memory for repeated segments.
+    """
+    try:
+        gemini_client = get_gemini_client()
+    except GeminiClientNotInitializedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    if (request.texts is None) == (request.document is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'texts' or 'document'.")
+    set_request_model(request.model.value)
+
+    translator = BulkTranslator(
+        gemini_client,
+        request.model.value,
+        request.target_language,
+        source=request.source_language,
+        instructions=request.instructions,
+        use_memory=request.use_memory is not False,
+    )
+    try:
+        if request.texts is not None:
+            result: dict = {"translations": await translator.translate_texts(request.texts)}
+        else:
+            result = {"translation": await translator.translate_document(request.document)}
+    except Exception as e:
+        logger.error(f"Error in /translate/bulk endpoint: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error during translation: {str(e)}")
+
+    result["stats"] = translator.stats
+    return result
+
+
 # ---------------------------------------------------------------------------
 # OpenAI-compatible streaming helpers
 # ---------------------------------------------------------------------------
 
-def _to_openai_format(response_text: str, model: str, images: list, stream: bool = False) -> dict:
+def _to_openai_format(
+    response_text: str, model: str, images: list, stream: bool = False, dropped_frames: int = 0
+) -> dict:
     """Build an OpenAI-compatible chat completion response dict."""
     content = response_text
     # Append image references as markdown if present (keeps text content useful)
@@ -262,10 +478,13 @@ def _to_openai_format(response_text: str, model: str, images: list, stream: bool
     # Attach raw images as a top-level extension field
     if images:
         result["images"] = images
+    # Extension field: near-duplicate input frames that were not sent upstream
+    if dropped_frames:
+        result["dropped_frames"] = dropped_frames
     return result
 
 
-async def _stream_response(response_text: str, model: str, images: list):
+async def _stream_response(response_text: str, model: str, images: list, dropped_frames: int = 0):
     """Yield SSE chunks in OpenAI streaming format."""
     completion_id = f"chatcmpl-{int(time.time())}"
     created = int(time.time())
@@ -293,6 +512,8 @@ async def _stream_response(response_text: str, model: str, images: list):
     }
     if images:
         content_chunk["images"] = images
+    if dropped_frames:
+        content_chunk["dropped_frames"] = dropped_frames
     yield f"data: {json.dumps(content_chunk)}\n\n"
 
     final_chunk = {
@@ -310,102 +531,155 @@ async def _stream_response(response_text: str, model: str, images: list):
 # OpenAI-compatible chat completions
 # ---------------------------------------------------------------------------
 
-@router.post("/v1/chat/completions")
-async def chat_completions(request: OpenAIChatRequest):
+@router.post(
+    "/v1/chat/completions",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": OpenAIChatRequest.model_json_schema()}},
+        }
+    },
+)
+async def chat_completions(raw_request: Request):
     """
     OpenAI-compatible chat completion endpoint with multimodal support.
 
     Supports:
     - Plain text messages
-    - ``image_url`` content parts with base64 data URIs (``data:image/...;base64,...``)
+    - ``image_url`` content parts with base64 data URIs (``data:image/...;base64,...``),
+      decoded to disk while the body streams in
     - ``image_url`` content parts with remote HTTPS URLs (downloaded automatically)
     - ``image_url`` content parts with ``file://`` references to uploaded file IDs
+    - ``file`` content parts (``file_id`` / ``file_data``) for PDFs, with optional
+      ``pages`` and ``text_only`` extensions (see ``[PDF]`` in config)
     - ``thoughts`` field in response (thinking models)
     - ``images`` field in response (web/generated images)
+    - ``dropped_frames`` field in response when ``[Images] dedupe_frames`` removed
+      near-duplicate input images
     """
     try:
-        gemini_client = get_gemini_client()
+        get_gemini_client()
     except GeminiClientNotInitializedError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
-    is_stream = bool(request.stream)
+    body, ingested_paths = await _read_json_body(raw_request)
+    try:
+        request = OpenAIChatRequest.model_validate(body)
+    except ValidationError as exc:
+        cleanup_temp_files(ingested_paths)
+        raise RequestValidationError(exc.errors())
+
+    text, model_value, images, dropped = await generate_chat_completion(request, ingested_paths)
+
+    if request.stream:
+        return StreamingResponse(
+            _stream_response(text, model_value, images, dropped),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    return _to_openai_format(text, model_value, images, False, dropped)
+
+
+async def generate_chat_completion(
+    request: OpenAIChatRequest, ingested_paths: Sequence[Path] = ()
+) -> Tuple[str, str, list, int]:
+    """
+    Run one chat completion through Gemini — shared by the HTTP endpoint and
+    the batch runner.
+
+    Returns ``(text, model_value, images, dropped_frames)``.  Raises
+    HTTPException with the status the endpoint would answer with.  Temp files
+    (``ingested_paths`` and anything created while resolving images) are
+    always cleaned up.
+    """
+    # Track which paths are temp files that should be cleaned up
+    # (starting with inline images spooled while reading the body)
+    temp_file_paths: List[Path] = list(ingested_paths)
+
+    try:
+        gemini_client = get_gemini_client()
+    except GeminiClientNotInitializedError as e:
+        cleanup_temp_files(temp_file_paths)
+        raise HTTPException(status_code=503, detail=str(e))
 
     if not request.messages:
+        cleanup_temp_files(temp_file_paths)
         raise HTTPException(status_code=400, detail="No messages provided.")
 
     # Resolve model string → GeminiModels (handles HA aliases like "gemini-3-pro-image-preview")
     gemini_model = _resolve_model(request.model)
     model_value = gemini_model.value
+    set_request_model(model_value)
 
     # Parse all messages — collect text parts and any image file paths
     conversation_parts: List[str] = []
     all_file_paths: List[Path] = []
-    # Track which paths are temp files that should be cleaned up
-    temp_file_paths: List[Path] = []
 
-    for msg in request.messages:
-        role = msg.get("role", "user")
-        raw_content = msg.get("content", "")
+    # Everything from here on may add temp files; the finally removes them all
+    try:
+        extracted = await _extract_all_contents([msg.get("content", "") for msg in request.messages])
 
-        text, file_paths = await _extract_multimodal_content(raw_content)
+        for msg, (text, file_paths) in zip(request.messages, extracted):
+            role = msg.get("role", "user")
 
-        # Mark newly created temp files for cleanup
-        for fp in file_paths:
-            if str(fp).startswith(str(get_temp_dir())):
-                temp_file_paths.append(fp)
-        all_file_paths.extend(file_paths)
+            # Mark newly created temp files for cleanup
+            for fp in file_paths:
+                if str(fp).startswith(str(get_temp_dir())):
+                    temp_file_paths.append(fp)
+            all_file_paths.extend(file_paths)
 
-        if not text:
-            continue
+            if not text:
+                continue
 
-        if role == "system":
-            conversation_parts.append(f"System: {text}")
-        elif role == "user":
-            conversation_parts.append(f"User: {text}")
-        elif role == "assistant":
-            conversation_parts.append(f"Assistant: {text}")
+            if role == "system":
+                conversation_parts.append(f"System: {text}")
+            elif role == "user":
+                conversation_parts.append(f"User: {text}")
+            elif role == "assistant":
+                conversation_parts.append(f"Assistant: {text}")
 
-    if not conversation_parts:
-        raise HTTPException(status_code=400, detail="No valid messages found.")
+        if not conversation_parts:
+            raise HTTPException(status_code=400, detail="No valid messages found.")
 
-    final_prompt = "\n\n".join(conversation_parts)
-    files_arg = all_file_paths if all_file_paths else None
+        # Optional near-duplicate frame suppression (camera bursts)
+        all_file_paths, dropped = await drop_near_duplicate_frames(all_file_paths)
 
-    try:
-        response = await gemini_client.generate_content(
-            message=final_prompt,
-            model=model_value,
-            files=files_arg,
-        )
+        final_prompt = "\n\n".join(conversation_parts)
+        files_arg = all_file_paths if all_file_paths else None
 
-        images = await serialize_response_images(
-            response, gemini_cookies=_get_cookies(gemini_client)
-        )
+        try:
+            batcher = MicroBatcher.get_instance()
+            if files_arg is None and batcher.accepts(model_value, final_prompt):
+                text = await batcher.generate(gemini_client, final_prompt, model_value)
+                return text, model_value, [], len(dropped)
 
-        if is_stream:
-            return StreamingResponse(
-                _stream_response(response.text, model_value, images),
-                media_type="text/event-stream",
-                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            response = await gemini_client.generate_content(
+                message=final_prompt,
+                model=model_value,
+                files=files_arg,
             )
-        return _to_openai_format(response.text, model_value, images, is_stream)
 
-    except Exception as e:
-        err_str = str(e)
-        err_lower = err_str.lower()
-        notifier = TelegramNotifier.get_instance()
-        if "auth" in err_lower or "cookie" in err_lower:
-            logger.error(f"[chat/completions] Auth error: {e}")
-            await notifier.notify_error("auth", "Authentication failed", "/v1/chat/completions", err_str)
-            raise HTTPException(status_code=401, detail=f"Gemini authentication failed: {err_str}")
-        elif "zombie" in err_lower or "parse" in err_lower or "stalled" in err_lower:
-            logger.error(f"[chat/completions] Stream error after retries (model={model_value}): {e}")
-            await notifier.notify_error("503", "Stream temporarily unavailable", "/v1/chat/completions", err_str)
-            raise HTTPException(status_code=503, detail="Gemini stream temporarily unavailable — please retry")
-        else:
-            logger.error(f"[chat/completions] Unexpected error (model={model_value}): {e}", exc_info=True)
-            await notifier.notify_error("500", "Unexpected error", "/v1/chat/completions", err_str)
-            raise HTTPException(status_code=500, detail=f"Error processing chat completion: {err_str}")
+            images = await serialize_response_images(
+                response, gemini_cookies=_get_cookies(gemini_client)
+            )
+            return response.text, model_value, images, len(dropped)
+
+        except Exception as e:
+            err_str = str(e)
+            err_lower = err_str.lower()
+            notifier = TelegramNotifier.get_instance()
+            if "auth" in err_lower or "cookie" in err_lower:
+                logger.error(f"[chat/completions] Auth error: {e}")
+                await notifier.notify_error("auth", "Authentication failed", "/v1/chat/completions", err_str)
+                raise HTTPException(status_code=401, detail=f"Gemini authentication failed: {err_str}")
+            elif "zombie" in err_lower or "parse" in err_lower or "stalled" in err_lower:
+                logger.error(f"[chat/completions] Stream error after retries (model={model_value}): {e}")
+                await notifier.notify_error("503", "Stream temporarily unavailable", "/v1/chat/completions", err_str)
+                raise HTTPException(status_code=503, detail="Gemini stream temporarily unavailable — please retry")
+            else:
+                logger.error(f"[chat/completions] Unexpected error (model={model_value}): {e}", exc_info=True)
+                await notifier.notify_error("500", "Unexpected error", "/v1/chat/completions", err_str)
+                raise HTTPException(status_code=500, detail=f"Error processing chat completion: {err_str}")
 
     finally:
         # Clean up temp files created from base64/URL image inputs
@@ -4,21 +4,35 @@ File upload endpoint — allows clients to upload images or PDFs and receive
 a file_id that can be referenced in subsequent /gemini or /v1/chat/completions
 requests via the `files` field.
 
-Compatible with the OpenAI Files API surface (subset).
+Compatible with the OpenAI Files API surface (create, list, retrieve, content,
+delete).  Metadata is served from the in-memory FileIndex.
 """
 
 import hashlib
-import time
+import mimetypes
+import shutil
+import uuid
 from pathlib import Path
+from typing import Literal, Optional
 
-from fastapi import APIRouter, File, HTTPException, UploadFile
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse
+from python_multipart.multipart import MultipartParser, parse_options_header
 
+from app.config import CONFIG
 from app.logger import logger
-from app.utils.image_utils import ALLOWED_MIME_TYPES, get_temp_dir
+from app.services.file_index import FileIndex
+from app.services.temp_janitor import TempJanitor
+from app.utils.executors import run_blocking
+from app.utils.image_utils import ALLOWED_MIME_TYPES, cleanup_temp_files, get_temp_dir, preprocess_image
+from app.utils.pdf_utils import preprocess_pdf
 
 router = APIRouter()
 
-_MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
+# Slack for multipart boundaries/headers when pre-checking Content-Length
+_MULTIPART_OVERHEAD = 64 * 1024
+# Cap for plain (non-file) form fields such as ``purpose``
+_MAX_FIELD_SIZE = 4 * 1024
 
 _MIME_TO_EXT: dict[str, str] = {
     "image/jpeg": ".jpg",
@@ -30,84 +44,337 @@ _MIME_TO_EXT: dict[str, str] = {
     "application/pdf": ".pdf",
 }
 
+# JSONL inputs for /v1/batches (purpose "batch")
+_BATCH_MIME_TYPES = {"application/jsonl", "application/x-ndjson", "text/jsonl", "application/json", "text/plain"}
+_UPLOAD_MIME_TYPES = ALLOWED_MIME_TYPES | _BATCH_MIME_TYPES
 
-@router.post("/v1/files")
-async def upload_file(file: UploadFile = File(...)):
+
+def _max_upload_bytes() -> int:
+    return CONFIG.getint("Storage", "max_upload_mb", fallback=50) * 1024 * 1024
+
+
+class _UploadTooLarge(ValueError):
+    def __init__(self, max_bytes: int):
+        super().__init__(f"File too large (max {max_bytes // (1024 * 1024)} MB)")
+
+
+class _UnsupportedUpload(ValueError):
+    def __init__(self, content_type: str):
+        super().__init__(
+            f"Unsupported file type: {content_type}. Allowed: {sorted(_UPLOAD_MIME_TYPES)}"
+        )
+
+
+class _UploadReceiver:
+    """
+    Incremental multipart/form-data receiver for ``POST /v1/files``.
+
+    The ``file`` part is written to a staging file chunk by chunk while its
+    SHA-256 is computed, so memory stays at one chunk per upload no matter the
+    file size.  Small text fields are kept in memory.  Parser callbacks only
+    record events; they are applied after each ``feed`` so errors surface as
+    regular exceptions.
+    """
+
+    def __init__(self, boundary: bytes, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.fields: dict[str, str] = {}
+        self.filename: Optional[str] = None
+        self.content_type = ""
+        self.ext = ".bin"
+        self.path: Optional[Path] = None
+        self.size = 0
+        self._hasher = hashlib.sha256()
+        self._fh = None
+        self._done = False
+        self._events: list[tuple[str, object]] = []
+        self._headers: dict[bytes, bytes] = {}
+        self._header_field = bytearray()
+        self._header_value = bytearray()
+        self._target: Optional[str] = None  # "file", a field name, or None (ignored)
+        self._field_value = bytearray()
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": lambda d, s, e: self._header_field.extend(d[s:e]),
+            "on_header_value": lambda d, s, e: self._header_value.extend(d[s:e]),
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": lambda: self._events.append(("headers", self._headers)),
+            "on_part_data": lambda d, s, e: self._events.append(("data", bytes(d[s:e]))),
+            "on_part_end": lambda: self._events.append(("end", b"")),
+        })
+
+    @property
+    def sha256(self) -> str:
+        return self._hasher.hexdigest()
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_end(self) -> None:
+        self._headers[bytes(self._header_field).lower()] = bytes(self._header_value)
+        self._header_field.clear()
+        self._header_value.clear()
+
+    def feed(self, chunk: bytes) -> None:
+        self._parser.write(chunk)
+        self._drain()
+
+    def finish(self) -> None:
+        self._parser.finalize()
+        self._drain()
+        if self._fh is not None:
+            raise ValueError("Multipart body ended inside the file part")
+        if self.path is None:
+            raise ValueError("Missing 'file' field")
+
+    def abort(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if self.path is not None:
+            cleanup_temp_files([self.path])
+            self.path = None
+
+    def _drain(self) -> None:
+        events, self._events = self._events, []
+        for kind, data in events:
+            if kind == "headers":
+                self._start_part(data)
+            elif kind == "data":
+                self._write(data)
+            else:
+                self._end_part()
+
+    def _start_part(self, headers: dict[bytes, bytes]) -> None:
+        _, params = parse_options_header(headers.get(b"content-disposition", b""))
+        name = params.get(b"name", b"").decode("utf-8", errors="replace")
+        filename = params.get(b"filename")
+        self._field_value.clear()
+        if filename is None:
+            self._target = name or None
+            return
+        if name != "file" or self._done:
+            self._target = None  # extra file parts are drained and dropped
+            return
+
+        self.filename = filename.decode("utf-8", errors="replace")
+        content_type, _ = parse_options_header(headers.get(b"content-type", b""))
+        self.content_type = content_type.decode("latin-1").lower()
+        if self.content_type == "application/octet-stream":
+            self.content_type = ""
+        if self.content_type and self.content_type not in _UPLOAD_MIME_TYPES:
+            raise _UnsupportedUpload(self.content_type)
+        if self.content_type in _BATCH_MIME_TYPES:
+            self.ext = ".jsonl"
+        else:
+            self.ext = _MIME_TO_EXT.get(self.content_type) or Path(self.filename).suffix.lower() or ".bin"
+        self.path = get_temp_dir() / f"upload_{uuid.uuid4().hex}{self.ext}"
+        self._fh = open(self.path, "wb")
+        self._target = "file"
+
+    def _write(self, data: bytes) -> None:
+        if self._target == "file":
+            self.size += len(data)
+            if self.size > self.max_bytes:
+                raise _UploadTooLarge(self.max_bytes)
+            self._hasher.update(data)
+            self._fh.write(data)
+        elif self._target is not None:
+            if len(self._field_value) + len(data) > _MAX_FIELD_SIZE:
+                raise ValueError(f"Form field '{self._target}' is too large")
+            self._field_value += data
+
+    def _end_part(self) -> None:
+        if self._target == "file":
+            self._fh.close()
+            self._fh = None
+            self._done = True
+        elif self._target is not None:
+            self.fields[self._target] = self._field_value.decode("utf-8", errors="replace")
+        self._target = None
+
+
+async def _receive_upload(request: Request) -> _UploadReceiver:
+    """Stream a multipart upload to a staging file. Raises HTTPException."""
+    mime, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if mime != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body with a 'file' field")
+
+    max_bytes = _max_upload_bytes()
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_bytes + _MULTIPART_OVERHEAD:
+        # Reject before reading a single byte of the body
+        raise HTTPException(status_code=413, detail=str(_UploadTooLarge(max_bytes)))
+
+    receiver = _UploadReceiver(boundary, max_bytes)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                receiver.feed(chunk)
+        receiver.finish()
+    except _UploadTooLarge as exc:
+        receiver.abort()
+        raise HTTPException(status_code=413, detail=str(exc))
+    except _UnsupportedUpload as exc:
+        receiver.abort()
+        raise HTTPException(status_code=415, detail=str(exc))
+    except Exception as exc:
+        receiver.abort()
+        raise HTTPException(status_code=400, detail=f"Invalid upload: {exc}")
+    return receiver
+
+
+def _to_openai_file(record: dict) -> dict:
+    """Render an index record as an OpenAI ``FileObject`` (plus local extras)."""
+    return {
+        "id": record["id"],
+        "object": "file",
+        "bytes": record["bytes"],
+        "created_at": record["created_at"],
+        "filename": record["filename"],
+        "purpose": record["purpose"],
+        "status": "processed",
+        "status_details": None,
+        "content_type": record["content_type"],
+        "local_path": str(FileIndex.get_instance().path_of(record)),
+    }
+
+
+def _get_record_or_404(file_id: str) -> dict:
+    record = FileIndex.get_instance().get(file_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
+    return record
+
+
+@router.post(
+    "/v1/files",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": ["file"],
+                        "properties": {
+                            "file": {"type": "string", "format": "binary"},
+                            "purpose": {"type": "string"},
+                        },
+                    }
+                }
+            },
+        }
+    },
+)
+async def upload_file(request: Request):
     """
     Upload an image or PDF file.
 
     Returns a ``file_id`` (and ``local_path``) that you can pass to:
     - ``POST /gemini`` → ``files: ["<local_path>"]``
     - ``POST /v1/chat/completions`` → content part ``{"type": "image_url", "image_url": {"url": "file://<file_id>"}}``
-    """
-    content = await file.read()
 
-    if len(content) > _MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File too large (max 50 MB)")
+    The body is streamed to disk and hashed on the fly; uploads over
+    ``[Storage] max_upload_mb`` are rejected with 413 as soon as they pass the
+    limit.  Content is stored once per hash: uploading the same bytes again
+    returns a new file (own id, filename and purpose) sharing the stored copy.
+    """
+    upload = await _receive_upload(request)
+    index = FileIndex.get_instance()
+    janitor = TempJanitor.get_instance()
 
-    # Determine content type — prefer header, fall back to filename extension
-    content_type = (file.content_type or "").split(";")[0].strip()
-    if content_type and content_type not in ALLOWED_MIME_TYPES:
-        raise HTTPException(
-            status_code=415,
-            detail=f"Unsupported file type: {content_type}. Allowed: {sorted(ALLOWED_MIME_TYPES)}",
-        )
+    duplicate = index.add_duplicate(upload.sha256, {
+        "id": f"file_{uuid.uuid4().hex}",
+        "filename": upload.filename,
+        "purpose": upload.fields.get("purpose") or "vision",
+    })
+    if duplicate is not None:
+        cleanup_temp_files([upload.path])
+        janitor.touch(index.path_of(duplicate))
+        logger.info(f"File upload deduplicated: {duplicate['id']} -> {duplicate['blob']} ({upload.size} bytes)")
+        return _to_openai_file(duplicate)
 
-    # Derive file extension
-    if content_type and content_type in _MIME_TO_EXT:
-        ext = _MIME_TO_EXT[content_type]
+    # Optional downscale/recompress (images) or image reduction (PDFs) — the
+    # stored file replaces the original
+    content_type = (
+        upload.content_type
+        or mimetypes.guess_type(f"x{upload.ext}")[0]
+        or ("application/jsonl" if upload.ext == ".jsonl" else "application/octet-stream")
+    )
+    if upload.ext == ".pdf":
+        processed = await preprocess_pdf(upload.path)
     else:
-        ext = Path(file.filename or "").suffix or ".bin"
+        processed = await preprocess_image(upload.path)
+    if processed != upload.path:
+        cleanup_temp_files([upload.path])
+        if processed.suffix != ".pdf":
+            content_type = "image/webp" if processed.suffix == ".webp" else "image/jpeg"
 
-    # Unique, deterministic-ish file ID
-    file_hash = hashlib.md5(content).hexdigest()[:8]
-    timestamp = int(time.time() * 1000)
-    file_id = f"file_{timestamp}_{file_hash}{ext}"
+    file_id = f"file_{upload.sha256[:32]}{processed.suffix}"
+    dest = index.directory / file_id
+    await run_blocking(shutil.move, processed, dest)  # a copy when the temp dir is on another filesystem
+    record = index.add({
+        "id": file_id,
+        "sha256": upload.sha256,
+        "bytes": dest.stat().st_size,
+        "filename": upload.filename,
+        "purpose": upload.fields.get("purpose") or "vision",
+        "content_type": content_type,
+    })
+    janitor.touch(dest)
+    logger.info(f"File uploaded: {file_id} ({record['bytes']} bytes, type={content_type})")
+    return _to_openai_file(record)
 
-    dest = get_temp_dir() / file_id
-    dest.write_bytes(content)
-    logger.info(f"File uploaded: {file_id} ({len(content)} bytes, type={content_type})")
 
+@router.get("/v1/files")
+async def list_files(
+    purpose: Optional[str] = None,
+    limit: int = Query(10000, ge=1, le=10000),
+    after: Optional[str] = None,
+    order: Literal["asc", "desc"] = "desc",
+):
+    """List uploaded files, newest first by default (OpenAI cursor pagination)."""
+    records, has_more = FileIndex.get_instance().list_records(purpose, after, limit, order)
+    data = [_to_openai_file(r) for r in records]
     return {
-        "id": file_id,
-        "object": "file",
-        "bytes": len(content),
-        "filename": file.filename,
-        "content_type": content_type,
-        "purpose": "vision",
-        "local_path": str(dest),
+        "object": "list",
+        "data": data,
+        "first_id": data[0]["id"] if data else None,
+        "last_id": data[-1]["id"] if data else None,
+        "has_more": has_more,
     }
 
 
 @router.get("/v1/files/{file_id}")
 async def get_file_info(file_id: str):
     """Return metadata for a previously uploaded file."""
-    # Sanitize: prevent path traversal
-    if "/" in file_id or "\\" in file_id or ".." in file_id:
-        raise HTTPException(status_code=400, detail="Invalid file_id")
+    return _to_openai_file(_get_record_or_404(file_id))
 
-    dest = get_temp_dir() / file_id
-    if not dest.exists():
-        raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
 
-    return {
-        "id": file_id,
-        "object": "file",
-        "bytes": dest.stat().st_size,
-        "local_path": str(dest),
-    }
+@router.get("/v1/files/{file_id}/content")
+async def get_file_content(file_id: str):
+    """Return the stored bytes of an uploaded file."""
+    record = _get_record_or_404(file_id)
+    return FileResponse(
+        FileIndex.get_instance().path_of(record),
+        media_type=record["content_type"],
+        filename=record["filename"],
+    )
 
 
 @router.delete("/v1/files/{file_id}")
 async def delete_file(file_id: str):
-    """Delete a previously uploaded file."""
-    if "/" in file_id or "\\" in file_id or ".." in file_id:
-        raise HTTPException(status_code=400, detail="Invalid file_id")
-
-    dest = get_temp_dir() / file_id
-    if not dest.exists():
+    """Delete a previously uploaded file (its stored copy once no other file shares it)."""
+    index = FileIndex.get_instance()
+    record, last_reference = index.remove(file_id)
+    if record is None:
         raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
 
-    dest.unlink()
+    if last_reference:
+        dest = index.path_of(record)
+        await run_blocking(dest.unlink, missing_ok=True)
+        TempJanitor.get_instance().forget(dest)
     logger.info(f"File deleted: {file_id}")
     return {"id": file_id, "object": "file", "deleted": True}
@@ -1,14 +1,18 @@
 # src/app/endpoints/gemini.py
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import List, Optional, Tuple, Union
 
 from fastapi import APIRouter, HTTPException
 
 from app.logger import logger
 from app.services.gemini_client import GeminiClientNotInitializedError, get_gemini_client
+from app.services.job_manager import JobError, JobManager
+from app.services.micro_batcher import MicroBatcher
+from app.services.stats_collector import request_phase, set_request_model
 from app.services.telegram_notifier import TelegramNotifier
 from app.services.session_manager import get_or_create_chat_session
 from app.utils.image_utils import cleanup_temp_files, serialize_response_images
+from app.utils.pdf_utils import extract_pdf_text, preprocess_pdf
 from schemas.request import GeminiRequest
 
 router = APIRouter()
@@ -22,6 +26,35 @@ def _get_cookies(gemini_client) -> dict:
         return {}
 
 
+async def _prepare_files(request: GeminiRequest) -> Tuple[str, List[Path], List[Path]]:
+    """
+    Apply the ``[PDF]`` stage to PDF entries of ``request.files``.
+
+    Returns ``(message, files, temp_files)``: with ``pdf_text_only`` the text
+    layer is appended to the message instead of uploading the PDF; otherwise
+    PDFs are reduced to ``pdf_pages`` (and shrunk if enabled).  ``temp_files``
+    are the derived copies the caller must clean up.
+    """
+    message = request.message
+    files: List[Path] = []
+    temp_files: List[Path] = []
+    with request_phase("inputs"):
+        for path in (Path(f) for f in request.files or []):
+            if path.suffix.lower() != ".pdf":
+                files.append(path)
+                continue
+            if request.pdf_text_only:
+                text = await extract_pdf_text(path, request.pdf_pages)
+                if text:
+                    message = f"{message}\n\n[{path.name}]\n{text}"
+                    continue
+            processed = await preprocess_pdf(path, request.pdf_pages)
+            if processed != path:
+                temp_files.append(processed)
+            files.append(processed)
+    return message, files, temp_files
+
+
 @router.post("/gemini")
 async def gemini_generate(request: GeminiRequest):
     """
@@ -31,17 +64,46 @@ async def gemini_generate(request: GeminiRequest):
     - ``response``: generated text
     - ``images``: list of web/generated images (URL + base64), if any
     - ``thoughts``: chain-of-thought text (thinking models only), if any
+
+    With ``background: true`` the call returns ``{"job_id", "status",
+    "poll_url"}`` immediately; the result is fetched from ``GET /jobs/{job_id}``
+    or posted to ``webhook_url`` (local hosts only).
     """
+    try:
+        get_gemini_client()
+    except GeminiClientNotInitializedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    set_request_model(request.model.value)
+
+    if request.background:
+        try:
+            job = JobManager.get_instance().submit(
+                "gemini", lambda: _generate(request), webhook_url=request.webhook_url,
+                meta={"model": request.model.value},
+            )
+        except JobError as exc:
+            raise HTTPException(status_code=exc.status_code, detail=str(exc))
+        return {"job_id": job["id"], "status": job["status"], "poll_url": f"/jobs/{job['id']}"}
+
+    return await _generate(request)
+
+
+async def _generate(request: GeminiRequest) -> dict:
+    """Run one stateless /gemini request; raises HTTPException on failure."""
     try:
         gemini_client = get_gemini_client()
     except GeminiClientNotInitializedError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
-    file_paths: List[Path] = [Path(f) for f in request.files] if request.files else []
+    message, file_paths, temp_files = await _prepare_files(request)
 
     try:
+        batcher = MicroBatcher.get_instance()
+        if not file_paths and batcher.accepts(request.model.value, message):
+            return {"response": await batcher.generate(gemini_client, message, request.model.value)}
+
         response = await gemini_client.generate_content(
-            request.message, request.model.value, files=file_paths or None
+            message, request.model.value, files=file_paths or None
         )
 
         images = await serialize_response_images(response, gemini_cookies=_get_cookies(gemini_client))
@@ -63,6 +125,8 @@ async def gemini_generate(request: GeminiRequest):
         else:
             await notifier.notify_error("500", "Unexpected error", "/gemini", err_str)
         raise HTTPException(status_code=500, detail=f"Error generating content: {err_str}")
+    finally:
+        cleanup_temp_files(temp_files)
 
 
 @router.post("/gemini-chat")
@@ -86,14 +150,17 @@ async def gemini_chat(request: GeminiRequest):
         raise HTTPException(status_code=503, detail=str(e))
 
     sid = request.session_id or str(uuid.uuid4())
+    set_request_model(request.model.value)
 
     try:
         session_manager = get_or_create_chat_session(sid)
     except Exception as e:
         raise HTTPException(status_code=503, detail=f"Could not create session: {e}")
 
+    message, file_paths, temp_files = await _prepare_files(request)
+
     try:
-        response = await session_manager.get_response(request.model, request.message, request.files)
+        response = await session_manager.get_response(request.model, message, file_paths)
 
         images = await serialize_response_images(response, gemini_cookies=_get_cookies(gemini_client))
 
@@ -114,3 +181,5 @@ async def gemini_chat(request: GeminiRequest):
         else:
             await notifier.notify_error("500", "Unexpected error", "/gemini-chat", err_str)
         raise HTTPException(status_code=500, detail=f"Error in chat: {err_str}")
+    finally:
+        cleanup_temp_files(temp_files)
@@ -1,90 +1,235 @@
 # src/app/endpoints/google_generative.py
+"""
+Google Generative Language API (``/v1beta/models/{model}:<method>``).
+
+Supports ``:generateContent`` and ``:streamGenerateContent`` (SSE with
+``?alt=sse``, otherwise a streamed JSON array as the Google SDKs expect),
+multi-turn ``contents`` with roles, ``systemInstruction``, and
+``inlineData`` / ``fileData`` parts, which go through the same file
+pipeline as the OpenAI-compatible endpoints.
+"""
+import json
+from pathlib import Path
+from typing import List, Optional, Tuple
+
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.endpoints.chat import _extract_all_contents, _get_cookies, _resolve_model
 from app.logger import logger
-from schemas.request import GoogleGenerativeRequest
 from app.services.gemini_client import get_gemini_client, GeminiClientNotInitializedError
+from app.services.micro_batcher import MicroBatcher
+from app.services.stats_collector import set_request_model
+from app.services.telegram_notifier import TelegramNotifier
+from app.utils.image_utils import ALLOWED_MIME_TYPES, cleanup_temp_files, get_temp_dir, serialize_response_images
+from schemas.request import Content, GoogleGenerativeRequest
 
 router = APIRouter()
 
-# @router.post("/v1beta/models/{model}:generateContent")
+_SAFETY_RATINGS = [
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "probability": "NEGLIGIBLE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "probability": "NEGLIGIBLE"},
+    {"category": "HARM_CATEGORY_HARASSMENT", "probability": "NEGLIGIBLE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "probability": "NEGLIGIBLE"},
+]
+
+
+# ---------------------------------------------------------------------------
+# Request conversion
+# ---------------------------------------------------------------------------
+
+def _to_content_parts(content: Content) -> list:
+    """Map Google parts onto the OpenAI-style parts understood by chat.py."""
+    parts: list = []
+    for part in content.parts:
+        if part.text:
+            parts.append({"type": "text", "text": part.text})
+        if part.inline_data is not None:
+            uri = f"data:{part.inline_data.mime_type};base64,{part.inline_data.data}"
+            if part.inline_data.mime_type.startswith("image/"):
+                parts.append({"type": "image_url", "image_url": {"url": uri}})
+            else:
+                parts.append({"type": "file", "file": {"file_data": uri}})
+        if part.file_data is not None:
+            uri = part.file_data.file_uri
+            mime_type = (part.file_data.mime_type or "").lower()
+            if uri.startswith(("http://", "https://")):
+                # Downloads accept images and the document types of the file pipeline
+                if mime_type and not (mime_type.startswith("image/") or mime_type in ALLOWED_MIME_TYPES):
+                    raise HTTPException(
+                        status_code=400,
+                        detail=f"fileData mimeType {mime_type} is not supported for a remote fileUri "
+                               "(images and PDFs only).",
+                    )
+                parts.append({"type": "file", "file": {"file_url": uri, "mime_type": mime_type or None}})
+            elif uri.startswith("file://"):
+                parts.append({"type": "file", "file": {"file_url": uri}})
+            elif uri.startswith("file_"):
+                parts.append({"type": "file", "file": {"file_id": uri}})
+            else:
+                logger.warning(f"Unsupported fileData URI, skipping: {uri[:80]}")
+    return parts
+
+
+async def _build_prompt(request: GoogleGenerativeRequest) -> Tuple[str, List[Path], List[Path]]:
+    """
+    Flatten ``systemInstruction`` + ``contents`` into one prompt.
+
+    Returns ``(prompt, file_paths, temp_files)``.  A single user turn is sent
+    as-is; multi-turn conversations are labelled like /v1/chat/completions.
+    """
+    turns = ([("system", request.system_instruction)] if request.system_instruction else []) + [
+        (content.role or "user", content) for content in request.contents
+    ]
+    extracted = await _extract_all_contents([_to_content_parts(content) for _, content in turns])
+
+    temp_dir = str(get_temp_dir())
+    file_paths: List[Path] = []
+    temp_files: List[Path] = []
+    labelled: List[Tuple[str, str]] = []
+    for (role, _), (text, paths) in zip(turns, extracted):
+        file_paths.extend(paths)
+        temp_files.extend(p for p in paths if str(p).startswith(temp_dir))
+        if text:
+            label = {"system": "System", "model": "Assistant"}.get(role, "User")
+            labelled.append((label, text))
+
+    if len(labelled) == 1 and labelled[0][0] == "User":
+        return labelled[0][1], file_paths, temp_files
+    return "\n\n".join(f"{label}: {text}" for label, text in labelled), file_paths, temp_files
+
+
+# ---------------------------------------------------------------------------
+# Response formatting
+# ---------------------------------------------------------------------------
+
+def _image_parts(images: list) -> list:
+    parts = []
+    for img in images:
+        header, _, data = (img.get("base64") or "").partition(",")
+        if data:
+            mime = header[len("data:"):].split(";")[0] or "image/png"
+            parts.append({"inlineData": {"mimeType": mime, "data": data}})
+        else:
+            parts.append({"fileData": {"mimeType": "image/*", "fileUri": img["url"]}})
+    return parts
+
+
+def _chunk(parts: list, model_value: str, finished: bool = False) -> dict:
+    candidate: dict = {"content": {"parts": parts, "role": "model"}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+        candidate["safetyRatings"] = _SAFETY_RATINGS
+    return {"candidates": [candidate], "modelVersion": model_value}
+
+
+def _error_body(status_code: int, message: str) -> dict:
+    status = {400: "INVALID_ARGUMENT", 401: "UNAUTHENTICATED", 503: "UNAVAILABLE"}.get(status_code, "INTERNAL")
+    return {"error": {"code": status_code, "message": message, "status": status}}
+
+
+async def _notify_failure(e: Exception) -> None:
+    err_str = str(e)
+    err_lower = err_str.lower()
+    notifier = TelegramNotifier.get_instance()
+    if "auth" in err_lower or "cookie" in err_lower:
+        await notifier.notify_error("auth", "Authentication failed", "/v1beta/models", err_str)
+    else:
+        await notifier.notify_error("500", "Unexpected error", "/v1beta/models", err_str)
+
+
+# ---------------------------------------------------------------------------
+# Endpoint
+# ---------------------------------------------------------------------------
+
 @router.post("/v1beta/models/{model}")
-async def google_generative_generate(model: str, request: GoogleGenerativeRequest):
+async def google_generative_generate(model: str, request: GoogleGenerativeRequest, alt: Optional[str] = None):
     try:
         gemini_client = get_gemini_client()
     except GeminiClientNotInitializedError as e:
         raise HTTPException(status_code=503, detail=str(e))
 
-    model = model.split(":")
+    model_name, _, method = model.partition(":")
+    method = method or "generateContent"
+    if method not in ("generateContent", "streamGenerateContent"):
+        raise HTTPException(status_code=404, detail=f"Unsupported method: {method}")
+    model_value = _resolve_model(model_name).value
+    set_request_model(model_value)
+
+    prompt, file_paths, temp_files = await _build_prompt(request)
+    if not prompt and not file_paths:
+        cleanup_temp_files(temp_files)
+        raise HTTPException(status_code=400, detail="contents must contain at least one part.")
+
+    if method == "streamGenerateContent":
+        sse = (alt or "").lower() == "sse"
+        return StreamingResponse(
+            _stream(gemini_client, prompt, model_value, file_paths, temp_files, sse),
+            media_type="text/event-stream" if sse else "application/json",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
     try:
-        # Extract the text from the request
-        prompt = ""
-        if request.contents:
-            for content in request.contents:
-                if content.parts:
-                    for part in content.parts:
-                        prompt += part.text
-
-        # Call the gemini_client with the extracted prompt
-        response = await gemini_client.generate_content(prompt, model[0])
-
-        # Format the response to match the Google Generative AI API format
-        google_response = {
-            "candidates": [
-                {
-                    "content": {
-                        "parts": [
-                            {
-                                "text": response.text
-                            }
-                        ],
-                        "role": "model"
-                    },
-                    "finishReason": "STOP",
-                    "index": 0,
-                    "safetyRatings": [
-                        {
-                            "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                            "probability": "NEGLIGIBLE"
-                        },
-                        {
-                            "category": "HARM_CATEGORY_HATE_SPEECH",
-                            "probability": "NEGLIGIBLE"
-                        },
-                        {
-                            "category": "HARM_CATEGORY_HARASSMENT",
-                            "probability": "NEGLIGIBLE"
-                        },
-                        {
-                            "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                            "probability": "NEGLIGIBLE"
-                        }
-                    ]
-                }
-            ],
-            "promptFeedback": {
-                "safetyRatings": [
-                    {
-                        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                        "probability": "NEGLIGIBLE"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_HATE_SPEECH",
-                        "probability": "NEGLIGIBLE"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_HARASSMENT",
-                        "probability": "NEGLIGIBLE"
-                    },
-                    {
-                        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                        "probability": "NEGLIGIBLE"
-                    }
-                ]
-            }
-        }
-
-        return google_response
+        batcher = MicroBatcher.get_instance()
+        if not file_paths and batcher.accepts(model_value, prompt):
+            text = await batcher.generate(gemini_client, prompt, model_value)
+            return {**_chunk([{"text": text}], model_value, finished=True),
+                    "promptFeedback": {"safetyRatings": _SAFETY_RATINGS}}
+
+        response = await gemini_client.generate_content(prompt, model_value, files=file_paths or None)
+        images = await serialize_response_images(response, gemini_cookies=_get_cookies(gemini_client))
+
+        parts: list = []
+        if response.thoughts:
+            parts.append({"text": response.thoughts, "thought": True})
+        parts.append({"text": response.text})
+        parts.extend(_image_parts(images))
+        return {**_chunk(parts, model_value, finished=True), "promptFeedback": {"safetyRatings": _SAFETY_RATINGS}}
     except Exception as e:
         logger.error(f"Error in /google_generative endpoint: {e}", exc_info=True)
+        await _notify_failure(e)
         raise HTTPException(status_code=500, detail=f"Error generating content: {str(e)}")
+    finally:
+        cleanup_temp_files(temp_files)
+
+
+async def _stream(gemini_client, prompt: str, model_value: str, file_paths: List[Path], temp_files: List[Path], sse: bool):
+    """
+    Relay upstream deltas as Google stream chunks.
+
+    SSE frames are ``data: {...}``; without ``alt=sse`` the chunks form one
+    JSON array written incrementally (``[{...},\\r\\n{...}]``).
+    """
+    first = True
+
+    def frame(payload: dict) -> str:
+        nonlocal first
+        body = json.dumps(payload, ensure_ascii=False)
+        if sse:
+            return f"data: {body}\r\n\r\n"
+        prefix = "[" if first else ",\r\n"
+        first = False
+        return prefix + body
+
+    last = None
+    try:
+        async for output in gemini_client.generate_content_stream(prompt, model_value, files=file_paths or None):
+            last = output
+            parts = []
+            if output.thoughts_delta:
+                parts.append({"text": output.thoughts_delta, "thought": True})
+            if output.text_delta:
+                parts.append({"text": output.text_delta})
+            if parts:
+                yield frame(_chunk(parts, model_value))
+
+        images = await serialize_response_images(last, gemini_cookies=_get_cookies(gemini_client)) if last else []
+        yield frame(_chunk(_image_parts(images) or [{"text": ""}], model_value, finished=True))
+    except Exception as e:
+        logger.error(f"Error in /google_generative stream: {e}", exc_info=True)
+        await _notify_failure(e)
+        yield frame(_error_body(500, f"Error generating content: {e}"))
+    finally:
+        cleanup_temp_files(temp_files)
+    if not sse:
+        yield "[]" if first else "]"
@@ -5,5 +5,8 @@ from .chat import router as chat_router
 from .google_generative import router as google_generative_router
 from .files import router as files_router
 from .responses import router as responses_router
+from .batches import router as batches_router
+from .jobs import router as jobs_router
+from .metrics import router as metrics_router
 
-__all__ = ["gemini_router", "chat_router", "google_generative_router", "files_router", "responses_router"]
+__all__ = ["gemini_router", "chat_router", "google_generative_router", "files_router", "responses_router", "batches_router", "jobs_router", "metrics_router"]
@@ -0,0 +1,41 @@
+# src/app/endpoints/jobs.py
+"""
+Polling endpoints for background jobs started with ``background: true``
+(``/gemini`` and ``/v1/responses``).
+"""
+
+from fastapi import APIRouter, HTTPException
+
+from app.services.job_manager import JobManager
+
+router = APIRouter()
+
+
+def _public(job: dict) -> dict:
+    return {k: v for k, v in job.items() if k != "meta"}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Return job status; ``result`` is set once ``status`` is ``completed``."""
+    job = JobManager.get_instance().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found or expired: {job_id}")
+    return _public(job)
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a job that is still running."""
+    job = JobManager.get_instance().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found or expired: {job_id}")
+    return _public(job)
+
+
+@router.delete("/jobs/{job_id}")
+async def delete_job(job_id: str):
+    """Cancel (if running) and discard a job and its result."""
+    if not JobManager.get_instance().delete(job_id):
+        raise HTTPException(status_code=404, detail=f"Job not found or expired: {job_id}")
+    return {"id": job_id, "object": "job", "deleted": True}
@@ -31,21 +31,25 @@ import json
 import time
 import uuid
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from fastapi.responses import StreamingResponse
 
 from app.logger import logger
 from app.services.gemini_client import GeminiClientNotInitializedError, get_gemini_client
+from app.services.job_manager import JobError, JobManager
+from app.services.response_store import ResponseStore
+from app.services.stats_collector import set_request_model
 from app.utils.image_utils import (
     cleanup_temp_files,
+    drop_near_duplicate_frames,
     get_temp_dir,
     serialize_response_images,
 )
 
 # Reuse model resolution and content extraction from chat.py
-from app.endpoints.chat import _resolve_model, _extract_multimodal_content, _get_cookies
+from app.endpoints.chat import _resolve_model, _extract_all_contents, _get_cookies, _read_json_body
 
 router = APIRouter()
 
@@ -86,28 +90,27 @@ def _sse(event: str, data: dict) -> str:
     return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 
-async def _stream_responses_api(text: str, model_value: str, images: list):
+async def _stream_responses_api(response: dict):
     """
     Emit the full OpenAI Responses API SSE event sequence for a completed response.
 
     Since gemini-webapi returns the full text at once (not token-by-token), we
     emit a single delta containing all text, then close the stream properly so
-    HA parses the response correctly.
+    HA parses the response correctly.  ``response`` is the object built by
+    ``_to_response_object`` (and stored when ``store`` is on), so the streamed
+    ids match what ``GET /v1/responses/{id}`` returns later.
     """
-    resp_id = _make_response_id()
-    msg_id = _make_message_id()
-    created = int(time.time())
-
-    # Append image markdown to text if images were generated
-    content_text = text
-    if images:
-        md_links = "\n".join(f"![{img['title']}]({img['url']})" for img in images)
-        content_text = f"{text}\n\n{md_links}".strip()
+    completed_item = response["output"][0]
+    msg_id = completed_item["id"]
+    content_text = completed_item["content"][0]["text"]
 
     # 1. response.created
+    in_progress = {**response, "status": "in_progress", "output": []}
+    for key in ("images", "dropped_frames", "thoughts"):
+        in_progress.pop(key, None)
     yield _sse("response.created", {
         "type": "response.created",
-        "response": _build_response_base(resp_id, model_value, "in_progress", []),
+        "response": in_progress,
     })
 
     # 2. response.output_item.added
@@ -148,26 +151,16 @@ async def _stream_responses_api(text: str, model_value: str, images: list):
     })
 
     # 6. response.output_item.done
-    completed_item = {
-        "type": "message",
-        "id": msg_id,
-        "role": "assistant",
-        "status": "completed",
-        "content": [{"type": "output_text", "text": content_text, "annotations": []}],
-    }
     yield _sse("response.output_item.done", {
         "type": "response.output_item.done",
         "output_index": 0,
         "item": completed_item,
     })
 
-    # 7. response.completed
-    completed_response = _build_response_base(resp_id, model_value, "completed", [completed_item])
-    if images:
-        completed_response["images"] = images  # extension field
+    # 7. response.completed (images / dropped_frames ride along as extension fields)
     yield _sse("response.completed", {
         "type": "response.completed",
-        "response": completed_response,
+        "response": response,
     })
 
 
@@ -175,8 +168,16 @@ async def _stream_responses_api(text: str, model_value: str, images: list):
 # Main endpoint
 # ---------------------------------------------------------------------------
 
-@router.post("/v1/responses")
-async def create_response(request: dict):
+@router.post(
+    "/v1/responses",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {"type": "object"}}},
+        }
+    },
+)
+async def create_response(raw_request: Request):
     """
     OpenAI Responses API — used by Home Assistant's openai_conversation integration
     when sending camera images for analysis via the ai_task / AI task agent.
@@ -184,47 +185,150 @@ async def create_response(request: dict):
     Supports:
     - ``input_text`` and ``input_image`` content parts (Responses API format)
     - ``text`` and ``image_url`` content parts (Chat Completions format, for compatibility)
-    - Base64 data URIs, public image URLs, and ``file://`` uploaded file references
+    - Base64 data URIs (decoded to disk while the body streams in), public image URLs,
+      and ``file://`` uploaded file references
     - ``instructions`` field as system prompt shorthand
     - Streaming (``stream: true``) with full SSE event sequence
     - Any model name — unknown names are auto-mapped to the closest Gemini model
+    - ``dropped_frames`` extension field when near-duplicate input images were removed
+    - ``background: true`` — returns a ``queued`` response at once; poll
+      ``GET /v1/responses/{id}`` (optional ``webhook_url`` extension for a
+      local callback)
+    - ``store`` (default true) and ``previous_response_id`` — follow-ups
+      continue the stored upstream Gemini conversation and only send the new
+      input items
     """
+    try:
+        get_gemini_client()
+    except GeminiClientNotInitializedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    request, ingested_paths = await _read_json_body(raw_request)
+
+    if not request.get("input") and not request.get("instructions"):
+        cleanup_temp_files(ingested_paths)
+        raise HTTPException(status_code=400, detail="No input provided.")
+
+    if request.get("background"):
+        return _submit_background_response(request, ingested_paths)
+
+    response = await _complete_response(_make_response_id(), request, ingested_paths)
+
+    if request.get("stream"):
+        return StreamingResponse(
+            _stream_responses_api(response),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    return response
+
+
+def _to_response_object(
+    resp_id: str, model_value: str, text: str, images: list, dropped_frames: int, thoughts: Optional[str]
+) -> dict:
+    """Build a completed (non-streaming) Responses API object."""
+    content_text = text
+    if images:
+        md_links = "\n".join(f"![{img['title']}]({img['url']})" for img in images)
+        content_text = f"{content_text}\n\n{md_links}".strip()
+
+    result = _build_response_base(
+        resp_id, model_value, "completed",
+        [{
+            "type": "message",
+            "id": _make_message_id(),
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": content_text, "annotations": []}],
+        }]
+    )
+    if images:
+        result["images"] = images
+    if dropped_frames:
+        result["dropped_frames"] = dropped_frames
+    if thoughts:
+        result["thoughts"] = thoughts
+    return result
+
+
+async def _complete_response(
+    resp_id: str, request: dict, ingested_paths: List[Path], background: bool = False
+) -> dict:
+    """Generate, build the response object and store it unless ``store`` is false."""
+    text, model_value, images, dropped, thoughts, metadata = await _generate_response(request, ingested_paths)
+    response = _to_response_object(resp_id, model_value, text, images, dropped, thoughts)
+    store = request.get("store") is not False
+    response["store"] = store
+    response["previous_response_id"] = request.get("previous_response_id")
+    if background:
+        response["background"] = True
+    if store:
+        # Images are kept by URL only — their base64 copies would bloat the store
+        stored = dict(response)
+        if images:
+            stored["images"] = [{k: v for k, v in img.items() if k != "base64"} for img in images]
+        ResponseStore.get_instance().put(stored, model_value, metadata)
+    return response
+
+
+async def _generate_response(
+    request: dict, ingested_paths: List[Path]
+) -> Tuple[str, str, list, int, Optional[str], Optional[list]]:
+    """
+    Run one Responses API request through Gemini.
+
+    With ``previous_response_id`` the stored upstream conversation is resumed
+    and only this request's input is sent.
+
+    Returns ``(text, model_value, images, dropped_frames, thoughts,
+    chat_metadata)``; raises HTTPException.  Temp files (including
+    ``ingested_paths``) are always cleaned up.
+    """
+    temp_file_paths: List[Path] = list(ingested_paths)
     try:
         gemini_client = get_gemini_client()
     except GeminiClientNotInitializedError as e:
+        cleanup_temp_files(temp_file_paths)
         raise HTTPException(status_code=503, detail=str(e))
 
+    previous = None
+    previous_id = request.get("previous_response_id")
+    if previous_id:
+        previous = ResponseStore.get_instance().get(previous_id)
+        if previous is None or not previous.get("metadata"):
+            cleanup_temp_files(temp_file_paths)
+            raise HTTPException(status_code=400, detail=f"Previous response with id '{previous_id}' not found.")
+
     # ── Resolve model ──────────────────────────────────────────────
-    gemini_model = _resolve_model(request.get("model"))
-    model_value = gemini_model.value
-    is_stream = bool(request.get("stream", False))
+    # A follow-up without a model stays on the model of the conversation
+    if previous is not None and not request.get("model"):
+        model_value = previous["model"]
+    else:
+        model_value = _resolve_model(request.get("model")).value
+    set_request_model(model_value)
 
     # ── Parse input array ──────────────────────────────────────────
     input_items = request.get("input", [])
-    if not input_items and not request.get("instructions"):
-        raise HTTPException(status_code=400, detail="No input provided.")
+    if isinstance(input_items, str):
+        input_items = [{"type": "message", "role": "user", "content": input_items}]
 
     conversation_parts: List[str] = []
     all_file_paths: List[Path] = []
-    temp_file_paths: List[Path] = []
 
     # Optional top-level system prompt shorthand
     instructions = request.get("instructions", "")
     if instructions:
         conversation_parts.append(f"System: {instructions}")
 
-    for item in input_items:
-        if not isinstance(item, dict):
-            continue
-
-        # Only handle message items (ignore function_call, etc.)
-        if item.get("type") != "message":
-            continue
+    # Only handle message items (ignore function_call, etc.)
+    message_items = [
+        item for item in input_items
+        if isinstance(item, dict) and item.get("type") == "message"
+    ]
+    extracted = await _extract_all_contents([item.get("content", "") for item in message_items])
 
+    for item, (text, file_paths) in zip(message_items, extracted):
         role = item.get("role", "user")
-        raw_content = item.get("content", "")
-
-        text, file_paths = await _extract_multimodal_content(raw_content)
 
         # Track temp files for cleanup
         for fp in file_paths:
@@ -244,52 +348,33 @@ async def create_response(request: dict):
             conversation_parts.append(f"Assistant: {text}")
 
     if not conversation_parts:
+        cleanup_temp_files(temp_file_paths)
         raise HTTPException(status_code=400, detail="No valid messages found in input.")
 
+    # Optional near-duplicate frame suppression (camera bursts)
+    all_file_paths, dropped = await drop_near_duplicate_frames(all_file_paths)
+
     final_prompt = "\n\n".join(conversation_parts)
     files_arg = all_file_paths if all_file_paths else None
 
     try:
-        response = await gemini_client.generate_content(
-            message=final_prompt,
-            model=model_value,
-            files=files_arg,
-        )
+        if previous is not None:
+            response, metadata = await gemini_client.send_chat(
+                final_prompt, model_value, previous["metadata"], files=files_arg
+            )
+        else:
+            response = await gemini_client.generate_content(
+                message=final_prompt,
+                model=model_value,
+                files=files_arg,
+            )
+            metadata = getattr(response, "metadata", None)
 
         images = await serialize_response_images(
             response, gemini_cookies=_get_cookies(gemini_client)
         )
 
-        if is_stream:
-            return StreamingResponse(
-                _stream_responses_api(response.text, model_value, images),
-                media_type="text/event-stream",
-                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
-            )
-
-        # Non-streaming response
-        resp_id = _make_response_id()
-        msg_id = _make_message_id()
-        content_text = response.text
-        if images:
-            md_links = "\n".join(f"![{img['title']}]({img['url']})" for img in images)
-            content_text = f"{content_text}\n\n{md_links}".strip()
-
-        result = _build_response_base(
-            resp_id, model_value, "completed",
-            [{
-                "type": "message",
-                "id": msg_id,
-                "role": "assistant",
-                "status": "completed",
-                "content": [{"type": "output_text", "text": content_text, "annotations": []}],
-            }]
-        )
-        if images:
-            result["images"] = images
-        if response.thoughts:
-            result["thoughts"] = response.thoughts
-        return result
+        return response.text, model_value, images, len(dropped), response.thoughts, metadata
 
     except Exception as e:
         err_str = str(e)
@@ -306,3 +391,83 @@ async def create_response(request: dict):
 
     finally:
         cleanup_temp_files(temp_file_paths)
+
+
+# ---------------------------------------------------------------------------
+# Background mode (``background: true``)
+# ---------------------------------------------------------------------------
+
+def _submit_background_response(request: dict, ingested_paths: List[Path]) -> dict:
+    """Queue the generation as a job and return the ``queued`` response object."""
+    if request.get("stream"):
+        cleanup_temp_files(ingested_paths)
+        raise HTTPException(status_code=400, detail="stream is not supported together with background.")
+
+    resp_id = _make_response_id()
+    model_value = _resolve_model(request.get("model")).value
+
+    async def work() -> dict:
+        return await _complete_response(resp_id, request, ingested_paths, background=True)
+
+    try:
+        JobManager.get_instance().submit(
+            "response", work, job_id=resp_id,
+            webhook_url=request.get("webhook_url"), meta={"model": model_value},
+            # Also covers jobs cancelled before work() started
+            on_done=lambda: cleanup_temp_files(ingested_paths),
+        )
+    except JobError as exc:
+        cleanup_temp_files(ingested_paths)
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+
+    placeholder = _build_response_base(resp_id, model_value, "queued", [])
+    placeholder["background"] = True
+    return placeholder
+
+
+def _job_to_response(job: dict) -> dict:
+    """Map a background job to the Responses API object clients poll for."""
+    if job["status"] == "completed":
+        return job["result"]
+    response = _build_response_base(job["id"], job["meta"].get("model", ""), job["status"], [])
+    response["created_at"] = job["created_at"]
+    response["background"] = True
+    if job["error"]:
+        response["error"] = job["error"]
+    return response
+
+
+@router.get("/v1/responses/{response_id}")
+async def get_response(response_id: str):
+    """
+    Return a stored response, or poll a background one
+    (``queued`` → ``in_progress`` → ``completed``).
+    """
+    job = JobManager.get_instance().get(response_id)
+    if job is not None and job["kind"] == "response":
+        return _job_to_response(job)
+    record = ResponseStore.get_instance().get(response_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Response not found: {response_id}")
+    return record["response"]
+
+
+@router.delete("/v1/responses/{response_id}")
+async def delete_response(response_id: str):
+    """Delete a stored response; later ``previous_response_id`` references fail."""
+    job_deleted = False
+    job = JobManager.get_instance().get(response_id)
+    if job is not None and job["kind"] == "response":
+        job_deleted = JobManager.get_instance().delete(response_id)
+    if not ResponseStore.get_instance().delete(response_id) and not job_deleted:
+        raise HTTPException(status_code=404, detail=f"Response not found: {response_id}")
+    return {"id": response_id, "object": "response.deleted", "deleted": True}
+
+
+@router.post("/v1/responses/{response_id}/cancel")
+async def cancel_response(response_id: str):
+    """Cancel a background response that is still running."""
+    job = JobManager.get_instance().get(response_id)
+    if job is None or job["kind"] != "response":
+        raise HTTPException(status_code=404, detail=f"Response not found: {response_id}")
+    return _job_to_response(JobManager.get_instance().cancel(response_id))
@@ -1,8 +1,23 @@
 # src/app/logger.py
 import logging
 
+from app.services.stats_collector import current_request_id
+
+_default_record_factory = logging.getLogRecordFactory()
+
+
+def _record_factory(*args, **kwargs) -> logging.LogRecord:
+    """Tag every record with the ID of the request it was logged for."""
+    record = _default_record_factory(*args, **kwargs)
+    record.request_id = current_request_id()
+    record.request_tag = f"[{record.request_id}] " if record.request_id else ""
+    return record
+
+
+logging.setLogRecordFactory(_record_factory)
+
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    format="%(asctime)s - %(name)s - %(levelname)s - %(request_tag)s%(message)s"
 )
 logger = logging.getLogger("app")
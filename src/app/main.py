@@ -1,21 +1,36 @@
 # src/app/main.py
+import hashlib
 import logging
+import re
+import time
+import uuid
 from pathlib import Path
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.services.gemini_client import get_gemini_client, init_gemini_client, GeminiClientNotInitializedError, start_cookie_persister, stop_cookie_persister
 from app.services.session_manager import init_session_managers
 from app.services.log_broadcaster import SSELogBroadcaster, BroadcastLogHandler
-from app.services.stats_collector import StatsCollector
+from app.config import CONFIG
+from app.services.stats_collector import StatsCollector, begin_request_context, request_phase, request_phases
+from app.services.batch_manager import BatchManager
+from app.services.file_index import FileIndex
+from app.services.job_manager import JobManager
+from app.services.loop_monitor import LoopMonitor
+from app.services.memory_diagnostics import MemoryDiagnostics
+from app.services.micro_batcher import MicroBatcher
+from app.services.temp_janitor import TempJanitor
+from app.services.timeseries import StatsTimeSeries
+from app.services.tracer import finish_trace, span, start_trace
+from app.utils.executors import shutdown_executors
 from app.logger import logger
 
 # Import endpoint routers
-from app.endpoints import gemini, chat, google_generative, files, responses
+from app.endpoints import gemini, chat, google_generative, files, responses, batches, jobs, metrics
 from app.endpoints import admin, admin_api
 
 _SRC_DIR = Path(__file__).resolve().parent.parent  # points to src/
@@ -35,6 +50,20 @@ async def lifespan(app: FastAPI):
     handler.setLevel(logging.INFO)
     logging.getLogger().addHandler(handler)
 
+    LoopMonitor.get_instance().start()
+    StatsTimeSeries.get_instance().start()
+    if CONFIG.getboolean("Memory", "tracemalloc_at_start", fallback=False):
+        MemoryDiagnostics.get_instance().start()
+
+    # Load the uploaded-files index and the batches (whose files the janitor
+    # spares), then reclaim orphaned temp dirs and keep storage within TTL/quota
+    FileIndex.get_instance()
+    batches = BatchManager.get_instance()
+    janitor = TempJanitor.get_instance()
+    janitor.start()
+    # Resume batches interrupted by the last shutdown
+    batches.start()
+
     # Try to get the existing client first
     client_initialized = False
     try:
@@ -68,10 +97,25 @@ async def lifespan(app: FastAPI):
 
     # Cleanup on shutdown
     stop_cookie_persister()
+    BatchManager.get_instance().stop()
+    JobManager.get_instance().stop()
+    MicroBatcher.get_instance().stop()
+    LoopMonitor.get_instance().stop()
+    StatsTimeSeries.get_instance().stop()
+    janitor.stop()
+    shutdown_executors()
     logging.getLogger().removeHandler(handler)
     logger.info("Application shutdown complete.")
 
-app = FastAPI(lifespan=lifespan)
+class _TimedJSONResponse(JSONResponse):
+    """JSONResponse whose serialization is reported as the ``encode`` phase."""
+
+    def render(self, content) -> bytes:
+        with request_phase("encode"):
+            return super().render(content)
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=_TimedJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -87,6 +131,9 @@ app.include_router(chat.router)
 app.include_router(google_generative.router)
 app.include_router(files.router)
 app.include_router(responses.router)
+app.include_router(batches.router)
+app.include_router(jobs.router)
+app.include_router(metrics.router)
 
 # Register admin routers
 app.include_router(admin.router)
@@ -102,10 +149,141 @@ async def root():
 
 
 # Stats middleware - track API requests (skip static/admin)
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+# Label for requests no route matched (404s, scanners), so arbitrary paths
+# never become latency / client / phase keys
+_UNMATCHED_ROUTE = "<unmatched>"
+
+
+def _route_template(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", None) or _UNMATCHED_ROUTE
+
+
 @app.middleware("http")
 async def stats_middleware(request: Request, call_next):
-    response = await call_next(request)
     path = request.url.path
-    if not path.startswith("/static") and not path.startswith("/admin") and not path.startswith("/api/admin"):
-        StatsCollector.get_instance().record_request(path, response.status_code)
+    tracked = (
+        not path.startswith("/static") and not path.startswith("/admin")
+        and not path.startswith("/api/admin") and path != "/metrics"
+    )
+    # Honour a caller-supplied X-Request-ID; otherwise it doubles as the trace ID
+    request_id = request.headers.get("x-request-id", "")
+    if not _REQUEST_ID.match(request_id):
+        request_id = uuid.uuid4().hex
+    ctx = begin_request_context(request_id)
+    memory = MemoryDiagnostics.get_instance()
+    memory_start = memory.begin_request() if tracked else None
+    root = None
+    series = StatsTimeSeries.get_instance()
+    if tracked:
+        series.request_started()
+        trace_id = request_id if _TRACE_ID.match(request_id) else uuid.uuid4().hex
+        root = start_trace(
+            f"{request.method} {path}", trace_id, request.headers.get("traceparent"),
+            **{"http.method": request.method, "http.target": path, "request.id": request_id},
+        )
+    start = time.perf_counter()
+    try:
+        with span("endpoint"):
+            response = await call_next(request)
+    except Exception as exc:
+        memory.end_request(memory_start)
+        if tracked:
+            series.request_finished(500, time.perf_counter() - start)
+        if root is not None:
+            root.name = f"{request.method} {_route_template(request)}"
+            finish_trace(root, 500, (time.perf_counter() - start) * 1000, repr(exc))
+        raise
+    response.headers["X-Request-ID"] = request_id
+    if tracked:
+        stats = StatsCollector.get_instance()
+        stats.record_request(path, response.status_code)
+        # Latency covers the whole body (streams included), keyed by route template
+        route = _route_template(request)
+        status_code = response.status_code
+        if root is not None:
+            root.name = f"{request.method} {route}"
+            root.set(**{"http.route": route})
+        if CONFIG.getboolean("Telemetry", "server_timing", fallback=True):
+            response.headers["Server-Timing"] = _server_timing(
+                request_phases(ctx), (time.perf_counter() - start) * 1000
+            )
+
+        def on_done(completed: bool, bytes_out: int) -> None:
+            elapsed = time.perf_counter() - start
+            phases = request_phases(ctx)
+            stats.record_latency(route, ctx.get("model"), status_code, elapsed, completed)
+            series.request_finished(status_code, elapsed)
+            content_length = request.headers.get("content-length", "")
+            stats.record_client(
+                _client_identity(request), route, ctx.get("model"), status_code, elapsed,
+                int(content_length) if content_length.isdigit() else 0, bytes_out,
+                request.headers.get("user-agent", "")[:200], request.client.host if request.client else "",
+            )
+            stats.record_phases(route, phases)
+            usage = memory.end_request(memory_start)
+            if usage is not None:
+                stats.record_memory(route, *usage)
+            if root is not None:
+                if ctx.get("model"):
+                    root.set(**{"gemini.model": ctx["model"]})
+                finish_trace(root, status_code, elapsed * 1000, None if completed else "client disconnected")
+            slow_ms = CONFIG.getint("Telemetry", "slow_request_ms", fallback=15000)
+            if 0 < slow_ms <= elapsed * 1000:
+                breakdown = ", ".join(f"{name}={ms:.0f}ms" for name, ms in phases.items()) or "no phases"
+                logger.warning(
+                    f"Slow request: {request.method} {route} → {status_code} in {elapsed * 1000:.0f} ms"
+                    f" (model={ctx.get('model') or '-'}; {breakdown})"
+                )
+
+        response.body_iterator = _timed_body(response.body_iterator, on_done)
     return response
+
+
+def _client_identity(request: Request) -> str:
+    """
+    Who sent a request: a fingerprint of its API key (OpenAI ``Authorization``
+    bearer, ``x-api-key``, Gemini ``x-goog-api-key`` or ``?key=``), else its
+    user agent and remote address.  Keys are hashed, never stored.
+    """
+    auth = request.headers.get("authorization", "")
+    key = (
+        (auth[7:].strip() if auth[:7].lower() == "bearer " else "")
+        or request.headers.get("x-api-key")
+        or request.headers.get("x-goog-api-key")
+        or request.query_params.get("key")
+    )
+    if key:
+        return "key:" + hashlib.sha256(key.encode()).hexdigest()[:12]
+    user_agent = request.headers.get("user-agent", "-")[:80]
+    address = request.client.host if request.client else "-"
+    return f"{user_agent} @ {address}"
+
+
+# Phases that run inside another phase and are not subtracted for "other"
+_NESTED_PHASES = {"upload"}
+
+
+def _server_timing(phases: dict[str, float], total_ms: float) -> str:
+    """
+    ``Server-Timing`` value for the time until the response headers: every
+    phase seen so far, ``other`` for the untracked remainder (validation,
+    routing, ...) and ``total``.
+    """
+    tracked = sum(ms for name, ms in phases.items() if name not in _NESTED_PHASES)
+    entries = [*phases.items(), ("other", max(0.0, total_ms - tracked)), ("total", total_ms)]
+    return ", ".join(f"{name};dur={ms:.1f}" for name, ms in entries)
+
+
+async def _timed_body(body, on_done):
+    completed = False
+    sent = 0
+    try:
+        async for chunk in body:
+            sent += len(chunk)
+            yield chunk
+        completed = True
+    finally:
+        on_done(completed, sent)
@@ -0,0 +1,429 @@
+# src/app/services/batch_manager.py
+"""
+Offline batch processing for ``/v1/batches`` (OpenAI Batch API surface).
+
+A batch is a JSONL file uploaded through the Files API, one request per line::
+
+    {"custom_id": "req-1", "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+
+Lines are run through a registered endpoint handler with bounded concurrency
+(``[Batch] concurrency``, shared by all batches).  Every batch lives in its own
+directory under ``<files_dir>/batches/<batch_id>/``:
+
+- ``batch.json``   — the Batch object (status, timestamps), rewritten on changes
+- ``input.jsonl``  — a private copy of the input file
+- ``output.jsonl`` / ``errors.jsonl`` — results, appended as lines finish
+
+Results are the checkpoint: after a restart, unfinished batches resume and
+skip every ``custom_id`` already present in the output or error file.  When a
+batch ends, its result files are registered in the FileIndex so clients can
+download them with ``GET /v1/files/{id}/content``.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+from app.config import CONFIG
+from app.logger import logger
+from app.services.file_index import FileIndex
+from app.services.gemini_client import GeminiClientNotInitializedError, get_gemini_client
+from app.services.stats_collector import detach_request_context
+from app.utils.executors import run_blocking
+
+# handler(body) -> response body; raises an exception carrying ``status_code``
+# and ``detail`` (e.g. HTTPException) for error responses
+BatchHandler = Callable[[dict], Awaitable[dict]]
+
+_ACTIVE = ("validating", "in_progress", "finalizing", "cancelling")
+_TERMINAL = ("completed", "failed", "expired", "cancelled")
+_WINDOWS = {"24h": 24 * 3600}
+_append_lock = threading.Lock()
+
+
+class BatchError(ValueError):
+    """Raised for invalid batch requests (maps to HTTP 400/404)."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class BatchManager:
+    """Singleton that stores, runs and resumes batches."""
+
+    _instance: Optional["BatchManager"] = None
+    _handlers: dict[str, BatchHandler] = {}
+
+    def __init__(self):
+        self._dir = FileIndex.get_instance().directory / "batches"
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._batches: dict[str, dict] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._load()
+
+    @classmethod
+    def get_instance(cls) -> "BatchManager":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def register_handler(cls, endpoint: str, handler: BatchHandler) -> None:
+        """Make ``endpoint`` available as a batch target."""
+        cls._handlers[endpoint] = handler
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def create(
+        self,
+        input_file_id: str,
+        endpoint: str,
+        completion_window: str = "24h",
+        metadata: Optional[dict] = None,
+    ) -> dict:
+        if endpoint not in self._handlers:
+            raise BatchError(f"Unsupported endpoint: {endpoint}. Supported: {sorted(self._handlers)}")
+        if completion_window not in _WINDOWS:
+            raise BatchError(f"Unsupported completion_window: {completion_window}")
+        source = FileIndex.get_instance().resolve(input_file_id)
+        if source is None:
+            raise BatchError(f"File not found: {input_file_id}", status_code=404)
+
+        now = int(time.time())
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": endpoint,
+            "errors": None,
+            "input_file_id": input_file_id,
+            "completion_window": completion_window,
+            "status": "validating",
+            "output_file_id": None,
+            "error_file_id": None,
+            "created_at": now,
+            "in_progress_at": None,
+            "expires_at": now + _WINDOWS[completion_window],
+            "finalizing_at": None,
+            "completed_at": None,
+            "failed_at": None,
+            "expired_at": None,
+            "cancelling_at": None,
+            "cancelled_at": None,
+            "request_counts": {"total": 0, "completed": 0, "failed": 0},
+            "metadata": metadata,
+        }
+        batch_dir = self._dir / batch_id
+        batch_dir.mkdir()
+        await run_blocking(shutil.copyfile, source, batch_dir / "input.jsonl")
+        self._batches[batch_id] = batch
+        self._save(batch)
+        self._spawn(batch_id)
+        logger.info(f"Batch {batch_id} created from {input_file_id} ({endpoint})")
+        return dict(batch)
+
+    def get(self, batch_id: str) -> Optional[dict]:
+        batch = self._batches.get(batch_id)
+        return dict(batch) if batch else None
+
+    def list_batches(self, after: Optional[str] = None, limit: int = 20) -> tuple[list[dict], bool]:
+        """Newest first, OpenAI-style ``after`` cursor."""
+        batches = sorted(self._batches.values(), key=lambda b: b["created_at"], reverse=True)
+        if after:
+            ids = [b["id"] for b in batches]
+            batches = batches[ids.index(after) + 1:] if after in ids else []
+        return [dict(b) for b in batches[:limit]], len(batches) > limit
+
+    def referenced_file_ids(self) -> set[str]:
+        """
+        Files the batches still point at: the output and error files of every
+        batch, plus the input files of active ones.
+        """
+        file_ids = set()
+        for batch in list(self._batches.values()):
+            file_ids.update(batch[key] for key in ("output_file_id", "error_file_id") if batch.get(key))
+            if batch["status"] in _ACTIVE:
+                file_ids.add(batch["input_file_id"])
+        return file_ids
+
+    async def cancel(self, batch_id: str) -> dict:
+        batch = self._batches.get(batch_id)
+        if batch is None:
+            raise BatchError(f"Batch not found: {batch_id}", status_code=404)
+        if batch["status"] in _TERMINAL or batch["status"] == "cancelling":
+            return dict(batch)
+        batch["cancelling_at"] = int(time.time())
+        self._set_status(batch, "cancelling")
+        task = self._tasks.get(batch_id)
+        if task is not None and not task.done():
+            task.cancel()
+        else:
+            await self._finalize(batch, "cancelled")
+        return dict(batch)
+
+    def start(self) -> None:
+        """Resume batches that were still running when the process stopped."""
+        for batch_id, batch in self._batches.items():
+            if batch["status"] in _ACTIVE:
+                logger.info(f"Resuming batch {batch_id} ({batch['status']})")
+                self._spawn(batch_id)
+
+    def stop(self) -> None:
+        """Stop workers on shutdown; the on-disk state lets them resume later."""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+        self._tasks.clear()
+
+    # ------------------------------------------------------------------
+    # Processing
+    # ------------------------------------------------------------------
+
+    def _spawn(self, batch_id: str) -> None:
+        self._tasks[batch_id] = asyncio.create_task(self._run(batch_id))
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, CONFIG.getint("Batch", "concurrency", fallback=4)))
+        return self._semaphore
+
+    async def _run(self, batch_id: str) -> None:
+        # Lines are not part of the POST /v1/batches request that spawned this
+        detach_request_context()
+        batch = self._batches[batch_id]
+        batch_dir = self._dir / batch_id
+        try:
+            if batch["status"] == "cancelling":
+                await self._finalize(batch, "cancelled")
+                return
+            requests, errors = await run_blocking(self._read_input, batch_dir / "input.jsonl", batch["endpoint"])
+            if errors:
+                batch["errors"] = {"object": "list", "data": errors}
+                batch["failed_at"] = int(time.time())
+                self._set_status(batch, "failed")
+                logger.warning(f"Batch {batch_id} failed validation ({len(errors)} error(s))")
+                return
+
+            done = await run_blocking(self._finished_ids, batch_dir)
+            counts = batch["request_counts"]
+            counts["total"] = len(requests)
+            counts["completed"], counts["failed"] = await run_blocking(_count_results, batch_dir)
+            if batch["status"] == "validating":
+                batch["in_progress_at"] = int(time.time())
+                self._set_status(batch, "in_progress")
+
+            pending = [r for r in requests if r["custom_id"] not in done]
+            if done:
+                logger.info(f"Batch {batch_id}: resuming with {len(pending)}/{len(requests)} request(s) left")
+            await asyncio.gather(*(self._run_line(batch, r) for r in pending))
+            await self._finalize(batch, "completed")
+
+        except asyncio.CancelledError:
+            # Explicit cancel finalizes; a shutdown leaves the batch resumable
+            if batch["status"] == "cancelling":
+                await self._finalize(batch, "cancelled")
+            raise
+        except Exception as exc:
+            logger.error(f"Batch {batch_id} failed: {exc}", exc_info=True)
+            batch["errors"] = {"object": "list", "data": [{"code": "internal_error", "message": str(exc), "line": None}]}
+            batch["failed_at"] = int(time.time())
+            self._set_status(batch, "failed")
+        finally:
+            self._tasks.pop(batch_id, None)
+
+    async def _run_line(self, batch: dict, request: dict) -> None:
+        max_retries = CONFIG.getint("Batch", "max_retries", fallback=2)
+        handler = self._handlers[batch["endpoint"]]
+        async with self._get_semaphore():
+            if time.time() > batch["expires_at"]:
+                # Still reported, so completed + failed always adds up to total
+                body = None
+                error = {
+                    "code": "batch_expired",
+                    "message": "This request could not be executed before the completion window expired.",
+                }
+            else:
+                await self._wait_for_client()
+                for attempt in range(max_retries + 1):
+                    try:
+                        body = await handler(dict(request["body"]))
+                        status, error = 200, None
+                        break
+                    except Exception as exc:
+                        status = getattr(exc, "status_code", 500)
+                        body, error = None, {"code": str(status), "message": str(getattr(exc, "detail", exc))}
+                        if status < 500 or attempt == max_retries:
+                            break
+                        await asyncio.sleep(2 ** attempt)
+
+        entry = {
+            "id": f"batch_req_{uuid.uuid4().hex}",
+            "custom_id": request["custom_id"],
+            "response": {"status_code": status, "request_id": uuid.uuid4().hex, "body": body} if body else None,
+            "error": error,
+        }
+        target = "output.jsonl" if error is None else "errors.jsonl"
+        await run_blocking(_append_line, self._dir / batch["id"] / target, entry)
+        batch["request_counts"]["completed" if error is None else "failed"] += 1
+
+    @staticmethod
+    async def _wait_for_client() -> None:
+        """Hold lines back while the Gemini client is down instead of failing them."""
+        while True:
+            try:
+                get_gemini_client()
+                return
+            except GeminiClientNotInitializedError:
+                await asyncio.sleep(5)
+
+    async def _finalize(self, batch: dict, outcome: str) -> None:
+        batch_dir = self._dir / batch["id"]
+        if outcome == "completed" and time.time() > batch["expires_at"]:
+            outcome = "expired"
+        if outcome == "completed":
+            batch["finalizing_at"] = int(time.time())
+            self._set_status(batch, "finalizing")
+
+        index = FileIndex.get_instance()
+        for name, key, purpose in (("output.jsonl", "output_file_id", "batch_output"),
+                                   ("errors.jsonl", "error_file_id", "batch_output")):
+            path = batch_dir / name
+            if path.exists() and batch[key] is None:
+                batch[key] = await run_blocking(_register_result_file, index, path, batch["id"], purpose)
+
+        counts = batch["request_counts"]
+        counts["completed"], counts["failed"] = await run_blocking(_count_results, batch_dir)
+        batch[f"{outcome}_at"] = int(time.time())
+        self._set_status(batch, outcome)
+        logger.info(
+            f"Batch {batch['id']} {outcome}: {counts['completed']} completed, "
+            f"{counts['failed']} failed of {counts['total']}"
+        )
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _set_status(self, batch: dict, status: str) -> None:
+        batch["status"] = status
+        self._save(batch)
+
+    def _save(self, batch: dict) -> None:
+        path = self._dir / batch["id"] / "batch.json"
+        tmp = path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps(batch), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as exc:
+            logger.warning(f"Could not save batch {batch['id']}: {exc}")
+
+    def _load(self) -> None:
+        for path in self._dir.glob("*/batch.json"):
+            try:
+                batch = json.loads(path.read_text(encoding="utf-8"))
+                self._batches[batch["id"]] = batch
+            except (OSError, ValueError, KeyError) as exc:
+                logger.warning(f"Skipping unreadable batch state {path}: {exc}")
+
+    @staticmethod
+    def _read_input(path: Path, endpoint: str) -> tuple[list[dict], list[dict]]:
+        """Parse and validate the input JSONL. Returns ``(requests, errors)``."""
+        requests, errors, seen = [], [], set()
+        with open(path, encoding="utf-8") as fh:
+            for line_no, line in enumerate(fh, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    errors.append({"code": "invalid_json_line", "message": "Line is not valid JSON", "line": line_no})
+                    continue
+                custom_id = item.get("custom_id") if isinstance(item, dict) else None
+                if not custom_id or not isinstance(item.get("body"), dict):
+                    errors.append({"code": "invalid_request", "message": "Each line needs custom_id and an object body", "line": line_no})
+                elif item.get("url", endpoint) != endpoint:
+                    errors.append({"code": "mismatched_endpoint", "message": f"url must be {endpoint}", "line": line_no})
+                elif custom_id in seen:
+                    errors.append({"code": "duplicate_custom_id", "message": f"Duplicate custom_id {custom_id!r}", "line": line_no})
+                else:
+                    seen.add(custom_id)
+                    item["body"]["stream"] = False
+                    requests.append(item)
+        if not requests and not errors:
+            errors.append({"code": "empty_file", "message": "The input file has no requests", "line": None})
+        return requests, errors
+
+    @staticmethod
+    def _finished_ids(batch_dir: Path) -> set[str]:
+        done = set()
+        for name in ("output.jsonl", "errors.jsonl"):
+            path = batch_dir / name
+            if not path.exists():
+                continue
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        done.add(json.loads(line)["custom_id"])
+                    except (ValueError, KeyError):
+                        continue  # torn last line — that request reruns
+        return done
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _append_line(path: Path, entry: dict) -> None:
+    # io workers append concurrently; one writer at a time keeps lines whole
+    with _append_lock, open(path, "a", encoding="utf-8") as fh:
+        fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def _count_results(batch_dir: Path) -> tuple[int, int]:
+    counts = []
+    for name in ("output.jsonl", "errors.jsonl"):
+        path = batch_dir / name
+        if not path.exists():
+            counts.append(0)
+            continue
+        with open(path, encoding="utf-8") as fh:
+            counts.append(sum(1 for _ in fh))
+    return counts[0], counts[1]
+
+
+def _register_result_file(index: FileIndex, path: Path, batch_id: str, purpose: str) -> str:
+    """Copy a result file into the files dir and index it; returns its file_id."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    sha256 = digest.hexdigest()
+    duplicate = index.add_duplicate(sha256, {
+        "id": f"file_{uuid.uuid4().hex}",
+        "filename": f"{batch_id}_{path.name}",
+        "purpose": purpose,
+    })
+    if duplicate is not None:
+        return duplicate["id"]
+    file_id = f"file_{sha256[:32]}.jsonl"
+    dest = index.directory / file_id
+    shutil.copyfile(path, dest)
+    index.add({
+        "id": file_id,
+        "sha256": sha256,
+        "bytes": dest.stat().st_size,
+        "filename": f"{batch_id}_{path.name}",
+        "purpose": purpose,
+        "content_type": "application/jsonl",
+    })
+    return file_id
@@ -0,0 +1,240 @@
+# src/app/services/file_index.py
+"""
+Persistent metadata index for files uploaded through ``/v1/files``.
+
+Uploads are stored in a stable directory (``[Storage] files_dir``, default
+``<system temp>/webai_files``) so they survive restarts.  Metadata lives in an
+append-only JSON-lines log (``index.jsonl``) inside that directory and is
+mirrored by in-memory dicts, so get/list/delete and ``file://<file_id>``
+resolution never touch the filesystem.  The log is compacted on startup.
+
+File content is stored once per SHA-256 as a *blob* named after the first
+upload's id.  Uploading the same bytes again creates a new record (own id,
+filename, purpose, created_at) pointing at the same blob; the blob is
+deleted only when its last record is removed.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from app.config import CONFIG
+from app.logger import logger
+
+INDEX_NAME = "index.jsonl"
+DEFAULT_FILES_DIR_NAME = "webai_files"
+
+
+def blob_name(record: dict) -> str:
+    """Name of the stored content file of a record (records predating blobs use their id)."""
+    return record.get("blob") or record["id"]
+
+
+def get_files_dir() -> Path:
+    """Return the directory that holds uploaded files (created on demand)."""
+    configured = CONFIG["Storage"].get("files_dir", "").strip() if "Storage" in CONFIG else ""
+    path = Path(configured).expanduser() if configured else Path(tempfile.gettempdir()) / DEFAULT_FILES_DIR_NAME
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class FileIndex:
+    """Singleton metadata index; keyed by file_id, with a content-hash lookup."""
+
+    _instance: Optional["FileIndex"] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dir = get_files_dir()
+        self._log_path = self._dir / INDEX_NAME
+        self._records: dict[str, dict] = {}   # file_id -> record, in creation order
+        self._by_hash: dict[str, str] = {}    # sha256 -> blob name
+        self._blob_refs: dict[str, set[str]] = {}  # blob name -> ids of the records using it
+        self._load()
+
+    @classmethod
+    def get_instance(cls) -> "FileIndex":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def directory(self) -> Path:
+        return self._dir
+
+    # ------------------------------------------------------------------
+    # Lookups (memory only)
+    # ------------------------------------------------------------------
+
+    def get(self, file_id: str) -> Optional[dict]:
+        with self._lock:
+            record = self._records.get(file_id)
+            return dict(record) if record else None
+
+    def get_by_hash(self, sha256: str) -> Optional[dict]:
+        """A record whose blob has this content hash (any of them), or None."""
+        with self._lock:
+            blob = self._by_hash.get(sha256)
+            if blob is None:
+                return None
+            return dict(self._records[next(iter(self._blob_refs[blob]))])
+
+    def resolve(self, file_id: str) -> Optional[Path]:
+        """Map a file_id to its blob on disk, or None if it is not indexed."""
+        with self._lock:
+            record = self._records.get(file_id)
+            return self._dir / blob_name(record) if record else None
+
+    def path_of(self, record: dict) -> Path:
+        return self._dir / blob_name(record)
+
+    def blob_names(self) -> set[str]:
+        """Names of all blobs referenced by at least one record."""
+        with self._lock:
+            return set(self._blob_refs)
+
+    def list_records(
+        self,
+        purpose: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: int = 10000,
+        order: str = "desc",
+    ) -> tuple[list[dict], bool]:
+        """
+        Return ``(records, has_more)`` using OpenAI-style cursor pagination:
+        records strictly after the ``after`` id in the requested order.
+        """
+        with self._lock:
+            records = list(self._records.values())  # insertion order
+        if order != "asc":
+            records.reverse()
+        # Stable sort keeps upload order for files created in the same second
+        records.sort(key=lambda r: r["created_at"], reverse=(order != "asc"))
+        if purpose:
+            records = [r for r in records if r["purpose"] == purpose]
+        if after:
+            ids = [r["id"] for r in records]
+            start = ids.index(after) + 1 if after in ids else len(records)
+            records = records[start:]
+        return [dict(r) for r in records[:limit]], len(records) > limit
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    # ------------------------------------------------------------------
+    # Mutations (memory + log append)
+    # ------------------------------------------------------------------
+
+    def add(self, record: dict) -> dict:
+        """
+        Insert or replace a record. ``record`` must contain id and sha256, and
+        ``blob`` when it shares the content of another record.
+        """
+        record = dict(record)
+        record.setdefault("created_at", int(time.time()))
+        with self._lock:
+            self._apply("put", record)
+            self._append({"op": "put", **record})
+        return dict(record)
+
+    def add_duplicate(self, sha256: str, record: dict) -> Optional[dict]:
+        """
+        Index *record* (id, filename, purpose) as another upload of content
+        already stored under *sha256*, sharing that blob; the blob's suffix
+        is appended to the id.  Returns None when no blob has this hash.
+        """
+        with self._lock:
+            blob = self._by_hash.get(sha256)
+            if blob is None:
+                return None
+            stored = self._records[next(iter(self._blob_refs[blob]))]
+            record = {
+                **record,
+                "id": record["id"] + Path(blob).suffix,
+                "blob": blob,
+                "sha256": sha256,
+                "bytes": stored["bytes"],
+                "content_type": stored["content_type"],
+            }
+            record.setdefault("created_at", int(time.time()))
+            self._apply("put", record)
+            self._append({"op": "put", **record})
+        return dict(record)
+
+    def remove(self, file_id: str) -> tuple[Optional[dict], bool]:
+        """
+        Drop a record.  Returns ``(old record, last_reference)``; when
+        *last_reference* is True the caller deletes the blob.
+        """
+        with self._lock:
+            record = self._records.get(file_id)
+            if record is None:
+                return None, False
+            self._apply("delete", {"id": file_id})
+            self._append({"op": "delete", "id": file_id})
+            return dict(record), blob_name(record) not in self._blob_refs
+
+    def remove_blob(self, blob: str) -> int:
+        """Drop every record stored in *blob* (deleted by the janitor). Returns how many."""
+        with self._lock:
+            file_ids = list(self._blob_refs.get(blob, ()))
+            for file_id in file_ids:
+                self._apply("delete", {"id": file_id})
+                self._append({"op": "delete", "id": file_id})
+        return len(file_ids)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _apply(self, op: str, entry: dict) -> None:
+        file_id = entry["id"]
+        old = self._records.pop(file_id, None)
+        if old is not None:
+            blob = blob_name(old)
+            refs = self._blob_refs.get(blob, set())
+            refs.discard(file_id)
+            if not refs:
+                self._blob_refs.pop(blob, None)
+                if self._by_hash.get(old.get("sha256")) == blob:
+                    del self._by_hash[old["sha256"]]
+        if op == "put":
+            self._records[file_id] = entry
+            blob = blob_name(entry)
+            self._blob_refs.setdefault(blob, set()).add(file_id)
+            if entry.get("sha256"):
+                self._by_hash[entry["sha256"]] = blob
+
+    def _append(self, entry: dict) -> None:
+        try:
+            with open(self._log_path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        except OSError as exc:
+            logger.warning(f"Could not persist file index entry: {exc}")
+
+    def _load(self) -> None:
+        """Replay the log, drop entries whose file is gone, and compact."""
+        if self._log_path.exists():
+            with open(self._log_path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                        op = entry.pop("op")
+                        self._apply(op, entry)
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn write from a crash — skip the line
+        for file_id in [fid for fid, r in self._records.items() if not (self._dir / blob_name(r)).is_file()]:
+            self._apply("delete", {"id": file_id})
+
+        tmp = self._log_path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                for record in self._records.values():
+                    fh.write(json.dumps({"op": "put", **record}, separators=(",", ":")) + "\n")
+            os.replace(tmp, self._log_path)
+        except OSError as exc:
+            logger.warning(f"Could not compact file index: {exc}")
+        logger.info(f"File index loaded: {len(self._records)} file(s) in {self._dir}")
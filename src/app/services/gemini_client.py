@@ -1,9 +1,11 @@
 # src/app/services/gemini_client.py
 import asyncio
+import time
 from models.gemini import MyGeminiClient
-from app.config import CONFIG, write_config
+from app.config import CONFIG, write_config_async
 from app.logger import logger
 from app.utils.browser import get_cookie_from_browser
+from app.utils.executors import run_blocking
 
 # Import the specific exception to handle it gracefully
 from gemini_webapi.exceptions import AuthError
@@ -19,6 +21,7 @@ _gemini_client = None
 _initialization_error = None
 _error_code = None  # "auth_expired", "no_cookies", "network", "disabled", "unknown"
 _persist_task: asyncio.Task = None  # Background task for persisting rotated cookies
+_cookie_seen: tuple = (None, 0.0)  # (__Secure-1PSIDTS value, monotonic time first seen)
 
 async def init_gemini_client() -> bool:
     """
@@ -36,7 +39,7 @@ async def init_gemini_client() -> bool:
             gemini_proxy = CONFIG["Proxy"].get("http_proxy")
 
             if not gemini_cookie_1PSID or not gemini_cookie_1PSIDTS:
-                cookies = get_cookie_from_browser("gemini")
+                cookies = await run_blocking(get_cookie_from_browser, "gemini")
                 if cookies:
                     gemini_cookie_1PSID, gemini_cookie_1PSIDTS = cookies
 
@@ -46,6 +49,7 @@ async def init_gemini_client() -> bool:
             if gemini_cookie_1PSID and gemini_cookie_1PSIDTS:
                 _gemini_client = MyGeminiClient(secure_1psid=gemini_cookie_1PSID, secure_1psidts=gemini_cookie_1PSIDTS, proxy=gemini_proxy)
                 await _gemini_client.init()
+                _note_cookie(gemini_cookie_1PSIDTS)
                 logger.info("Gemini client initialized successfully.")
                 return True
             else:
@@ -103,6 +107,26 @@ def get_client_status() -> dict:
     }
 
 
+def _note_cookie(value: str) -> None:
+    global _cookie_seen
+    if value and value != _cookie_seen[0]:
+        _cookie_seen = (value, time.monotonic())
+
+
+def get_cookie_age_seconds():
+    """
+    Seconds since the current __Secure-1PSIDTS value was first seen (set at
+    init or picked up after an in-library rotation); None without a client.
+    """
+    if _gemini_client is None:
+        return None
+    try:
+        _note_cookie(_gemini_client.client.cookies.get("__Secure-1PSIDTS"))
+    except Exception:
+        pass
+    return time.monotonic() - _cookie_seen[1] if _cookie_seen[0] else None
+
+
 async def _persist_cookies_loop():
     """
     Background task that watches for cookie rotation by gemini-webapi's auto_refresh
@@ -135,7 +159,7 @@ async def _persist_cookies_loop():
                     logger.info("__Secure-1PSIDTS rotated — will persist to config.")
 
                 if changed:
-                    write_config(CONFIG)
+                    await write_config_async(CONFIG)
                     logger.info("Rotated Gemini cookies persisted to config.conf.")
         except asyncio.CancelledError:
             raise
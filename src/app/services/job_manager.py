@@ -0,0 +1,209 @@
+# src/app/services/job_manager.py
+"""
+Background jobs for long-running generations.
+
+A job wraps one generation coroutine in an ``asyncio.Task`` that is not tied
+to the HTTP connection that started it, so slow thinking-model or
+image-generation calls finish even when the client times out.  Results are
+kept for ``[Jobs] retention_minutes`` and can be polled, or pushed to a local
+webhook (only hosts listed in ``[Jobs] webhook_hosts`` are allowed).
+
+Used by ``/v1/responses`` (``background: true``) and ``/gemini``
+(``background: true``); generic polling lives at ``/jobs/{job_id}``.
+"""
+import asyncio
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+from urllib.parse import urlparse
+
+import httpx
+
+from app.config import CONFIG
+from app.logger import logger
+from app.services.stats_collector import begin_request_context, current_request_id, detach_request_context
+
+_TERMINAL = ("completed", "failed", "cancelled")
+
+
+class JobError(ValueError):
+    """Raised for invalid job submissions (maps to HTTP 400/429)."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class JobManager:
+    """Singleton registry of in-memory background jobs."""
+
+    _instance: Optional["JobManager"] = None
+
+    def __init__(self):
+        self._jobs: dict[str, dict] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    @classmethod
+    def get_instance(cls) -> "JobManager":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(
+        self,
+        kind: str,
+        work: Callable[[], Awaitable[dict]],
+        job_id: Optional[str] = None,
+        webhook_url: Optional[str] = None,
+        meta: Optional[dict] = None,
+        on_done: Optional[Callable[[], None]] = None,
+    ) -> dict:
+        """
+        Start ``work()`` in the background and return the job record.
+
+        ``work`` returns the result dict; exceptions carrying ``status_code``
+        and ``detail`` (e.g. HTTPException) become the job error.  ``on_done``
+        is called once the job ends in any way, including a cancellation
+        before ``work`` ever started (e.g. to release its inputs).
+        """
+        self._purge_expired()
+        if webhook_url:
+            _check_webhook_url(webhook_url)
+        max_active = CONFIG.getint("Jobs", "max_active", fallback=32)
+        active = sum(1 for j in self._jobs.values() if j["status"] not in _TERMINAL)
+        if active >= max_active:
+            raise JobError(f"Too many active background jobs (max {max_active})", status_code=429)
+
+        job_id = job_id or f"job_{uuid.uuid4().hex}"
+        job = {
+            "id": job_id,
+            "object": "job",
+            "kind": kind,
+            "status": "queued",
+            "created_at": int(time.time()),
+            "started_at": None,
+            "completed_at": None,
+            "result": None,
+            "error": None,
+            "meta": meta or {},
+        }
+        self._jobs[job_id] = job
+        task = self._tasks[job_id] = asyncio.create_task(self._run(job, work, webhook_url))
+        if on_done is not None:
+            task.add_done_callback(lambda _: on_done())
+        logger.info(f"Background job {job_id} ({kind}) queued")
+        return dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        self._purge_expired()
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a running job (the record is kept). None if unknown."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        # Popped here too: a task cancelled before it starts never runs _run
+        task = self._tasks.pop(job_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            job["status"] = "cancelled"
+            job["completed_at"] = int(time.time())
+        return dict(job)
+
+    def delete(self, job_id: str) -> bool:
+        """Cancel (if needed) and forget a job."""
+        if self.cancel(job_id) is None:
+            return False
+        self._jobs.pop(job_id, None)
+        return True
+
+    def status_counts(self) -> dict[str, int]:
+        """Number of retained jobs per status."""
+        counts: dict[str, int] = {}
+        for job in self._jobs.values():
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+    def stop(self) -> None:
+        """Cancel all running jobs on shutdown."""
+        for task in self._tasks.values():
+            if not task.done():
+                task.cancel()
+        self._tasks.clear()
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    async def _run(self, job: dict, work: Callable[[], Awaitable[dict]], webhook_url: Optional[str]) -> None:
+        # Keep the submitting request's id for log correlation, but record the
+        # job's phases and model in a context of its own
+        request_id = current_request_id()
+        if request_id:
+            begin_request_context(request_id)
+        else:
+            detach_request_context()
+        job["status"] = "in_progress"
+        job["started_at"] = int(time.time())
+        try:
+            job["result"] = await work()
+            job["status"] = "completed"
+        except asyncio.CancelledError:
+            job["status"] = "cancelled"
+            raise
+        except Exception as exc:
+            job["status"] = "failed"
+            job["error"] = {
+                "code": str(getattr(exc, "status_code", 500)),
+                "message": str(getattr(exc, "detail", exc)),
+            }
+            logger.warning(f"Background job {job['id']} failed: {job['error']['message']}")
+        finally:
+            job["completed_at"] = int(time.time())
+            self._tasks.pop(job["id"], None)
+
+        logger.info(f"Background job {job['id']} {job['status']} in {job['completed_at'] - job['started_at']}s")
+        if webhook_url:
+            await self._deliver_webhook(job, webhook_url)
+
+    async def _deliver_webhook(self, job: dict, url: str) -> None:
+        payload = {k: v for k, v in job.items() if k != "meta"}
+        for attempt in range(3):
+            try:
+                async with httpx.AsyncClient(timeout=10) as client:
+                    resp = await client.post(url, json=payload)
+                if resp.status_code < 500:
+                    return
+            except httpx.HTTPError as exc:
+                logger.debug(f"Webhook for job {job['id']} failed: {exc}")
+            await asyncio.sleep(2 ** attempt)
+        logger.warning(f"Giving up on webhook {url} for job {job['id']}")
+
+    def _purge_expired(self) -> None:
+        retention = CONFIG.getint("Jobs", "retention_minutes", fallback=60) * 60
+        cutoff = time.time() - retention
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in _TERMINAL and (job["completed_at"] or 0) < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def _check_webhook_url(url: str) -> None:
+    parsed = urlparse(url)
+    allowed = {
+        h.strip().lower()
+        for h in CONFIG["Jobs"].get("webhook_hosts", "localhost,127.0.0.1,::1").split(",")
+        if h.strip()
+    } if "Jobs" in CONFIG else {"localhost", "127.0.0.1", "::1"}
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise JobError("webhook_url must be an http(s) URL")
+    if parsed.hostname.lower() not in allowed:
+        raise JobError(f"webhook_url host {parsed.hostname!r} is not allowed (see [Jobs] webhook_hosts)")
@@ -9,13 +9,14 @@ from typing import AsyncGenerator, Optional
 class LogEntry:
     """Structured log entry for the admin UI."""
 
-    __slots__ = ("timestamp", "level", "name", "message", "id")
+    __slots__ = ("timestamp", "level", "name", "message", "request_id", "id")
 
     def __init__(self, record: logging.LogRecord, entry_id: int):
         self.timestamp = datetime.fromtimestamp(record.created).isoformat()
         self.level = record.levelname
         self.name = record.name
         self.message = record.getMessage()
+        self.request_id = getattr(record, "request_id", None)
         self.id = entry_id
 
     def to_dict(self) -> dict:
@@ -25,6 +26,7 @@ class LogEntry:
             "level": self.level,
             "logger": self.name,
             "message": self.message,
+            "request_id": self.request_id,
         }
 
 
@@ -41,6 +43,7 @@ class SSELogBroadcaster:
         self._counter: int = 0
         self._event = asyncio.Event()
         self._clients: int = 0
+        self._level_counts: dict[str, int] = {}
 
     @classmethod
     def get_instance(cls) -> "SSELogBroadcaster":
@@ -51,6 +54,7 @@ class SSELogBroadcaster:
     def push(self, record: logging.LogRecord) -> None:
         """Called by the logging handler (may be from any thread)."""
         self._counter += 1
+        self._level_counts[record.levelname] = self._level_counts.get(record.levelname, 0) + 1
         entry = LogEntry(record, self._counter)
         self._buffer.append(entry)
         try:
@@ -89,6 +93,15 @@ class SSELogBroadcaster:
     def client_count(self) -> int:
         return self._clients
 
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def level_counts(self) -> dict[str, int]:
+        """Records seen per level name since startup."""
+        return dict(self._level_counts)
+
 
 class BroadcastLogHandler(logging.Handler):
     """Logging handler that forwards records to the SSELogBroadcaster."""
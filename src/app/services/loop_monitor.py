@@ -0,0 +1,132 @@
+# src/app/services/loop_monitor.py
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A background task sleeps ``[LoopMonitor] interval_ms`` at a time and records
+how late it wakes up: that lateness is the scheduling lag every coroutine on
+the loop sees, and goes into ``StatsCollector`` (``stats.event_loop``).
+
+A watchdog thread watches the task's heartbeat.  When the loop has not run
+for ``block_threshold_ms``, it captures the loop thread's Python stack while
+the blocking call is still on it, so the event shows *what* blocked the
+loop, not just that it happened.  The last ``max_events`` blocks are kept
+for ``GET /api/admin/loop`` and logged as warnings.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Optional
+
+from app.config import CONFIG
+from app.logger import logger
+from app.services.stats_collector import StatsCollector, detach_request_context
+
+_STACK_LIMIT = 30
+
+
+class LoopMonitor:
+    """Singleton owning the lag-sampling task and the watchdog thread."""
+
+    _instance: Optional["LoopMonitor"] = None
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._next_tick = 0.0  # perf_counter time the monitor task should wake up
+        self._pending: Optional[dict] = None  # block captured but not yet over
+        self._events: deque[dict] = deque(maxlen=self._cfg()["max_events"])
+
+    @classmethod
+    def get_instance(cls) -> "LoopMonitor":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def _cfg() -> dict:
+        return {
+            "enabled": CONFIG.getboolean("LoopMonitor", "enabled", fallback=True),
+            "interval": max(10, CONFIG.getint("LoopMonitor", "interval_ms", fallback=100)) / 1000,
+            "threshold": max(10, CONFIG.getint("LoopMonitor", "block_threshold_ms", fallback=200)) / 1000,
+            "max_events": max(1, CONFIG.getint("LoopMonitor", "max_events", fallback=20)),
+        }
+
+    def start(self) -> None:
+        """Start sampling on the running loop. Safe to call multiple times."""
+        cfg = self._cfg()
+        if not cfg["enabled"] or (self._task is not None and not self._task.done()):
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._next_tick = time.perf_counter() + cfg["interval"]
+        self._stop.clear()
+        self._task = asyncio.create_task(self._run(cfg["interval"], cfg["threshold"]))
+        self._watchdog = threading.Thread(
+            target=self._watch, args=(cfg["threshold"],), name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+        logger.info(
+            f"Event-loop monitor started (every {cfg['interval'] * 1000:.0f} ms,"
+            f" block threshold {cfg['threshold'] * 1000:.0f} ms)."
+        )
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    def recent_blocks(self) -> list[dict]:
+        return list(self._events)
+
+    # ------------------------------------------------------------------
+
+    async def _run(self, interval: float, threshold: float) -> None:
+        detach_request_context()
+        stats = StatsCollector.get_instance()
+        while True:
+            self._next_tick = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - self._next_tick)
+            stats.record_loop_lag(lag * 1000)
+            event, self._pending = self._pending, None
+            if event is None and lag >= threshold:
+                # The watchdog never got the GIL: a C call held it for the whole block
+                event = {"at": time.time(), "stack": [], "note": "stack not captured (the blocking call held the GIL)"}
+                stats.record_loop_block()
+                self._events.append(event)
+            if event is not None:
+                event["duration_ms"] = round(lag * 1000, 1)
+                logger.warning(
+                    f"Event loop blocked for {event['duration_ms']:.0f} ms"
+                    + (f" in {event['stack'][-1]}" if event["stack"] else "")
+                )
+
+    def _watch(self, threshold: float) -> None:
+        """Capture the loop thread's stack once per block longer than *threshold*."""
+        poll = min(threshold / 4, 0.05)
+        captured_for = None
+        while not self._stop.wait(poll):
+            tick = self._next_tick
+            if time.perf_counter() - tick < threshold or captured_for == tick:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            captured_for = tick
+            stack = [
+                f"{f.filename}:{f.lineno} in {f.name}" + (f" — {f.line}" if f.line else "")
+                for f in traceback.extract_stack(frame)[-_STACK_LIMIT:]
+            ]
+            event = {
+                "at": time.time(),
+                "duration_ms": None,  # filled in when the loop runs again
+                "stack": stack,
+            }
+            StatsCollector.get_instance().record_loop_block()
+            self._events.append(event)
+            self._pending = event
@@ -0,0 +1,250 @@
+# src/app/services/memory_diagnostics.py
+"""
+Memory diagnostics: ``tracemalloc`` control, snapshots and snapshot diffs
+(``/api/admin/memory``), plus sampled per-request peak allocations.
+
+Per-request accounting needs tracemalloc to be tracing.  tracemalloc only
+keeps one process-wide peak, so at most one request is measured at a time:
+its figure is the peak of traced memory above the level at request start
+while it ran (allocations of concurrent requests are included), and what
+was still allocated when its body finished.  Sampling spreads the
+measurements across endpoints over time.
+"""
+import asyncio
+import linecache
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import CONFIG
+from app.logger import logger
+
+MAX_SNAPSHOTS = 5
+GROUP_BY = ("lineno", "filename", "traceback", "package")
+
+_SITE_PACKAGES = re.compile(r"[\\/](?:site|dist)-packages[\\/]([^\\/]+)")
+_SRC_PACKAGE = re.compile(r"[\\/]src[\\/](app|models|schemas)[\\/]")
+
+
+def _package(filename: str) -> str:
+    """Attribute a source file to a package: our modules, a dependency or the stdlib."""
+    match = _SITE_PACKAGES.search(filename)
+    if match:
+        return match.group(1).split(".")[0]
+    match = _SRC_PACKAGE.search(filename)
+    if match:
+        return match.group(1)
+    if filename.startswith("<"):
+        return filename
+    return "stdlib" if os.sep + "python3" in filename else os.path.basename(filename)
+
+
+def _stat_dict(stat, group_by: str) -> dict:
+    result = {"size_bytes": stat.size, "count": stat.count}
+    if hasattr(stat, "size_diff"):
+        result["size_diff_bytes"] = stat.size_diff
+        result["count_diff"] = stat.count_diff
+    if group_by == "traceback":
+        result["traceback"] = [f"{f.filename}:{f.lineno}" for f in stat.traceback]
+    else:
+        frame = stat.traceback[0]
+        result["site"] = frame.filename if group_by == "filename" else f"{frame.filename}:{frame.lineno}"
+        if group_by == "lineno":
+            result["line"] = linecache.getline(frame.filename, frame.lineno).strip()
+    return result
+
+
+def _by_package(stats: list, diff: bool) -> list[dict]:
+    grouped: dict[str, dict] = {}
+    for stat in stats:
+        entry = grouped.setdefault(_package(stat.traceback[0].filename), {"size_bytes": 0, "count": 0})
+        entry["size_bytes"] += stat.size
+        entry["count"] += stat.count
+        if diff:
+            entry["size_diff_bytes"] = entry.get("size_diff_bytes", 0) + stat.size_diff
+            entry["count_diff"] = entry.get("count_diff", 0) + stat.count_diff
+    key = "size_diff_bytes" if diff else "size_bytes"
+    return sorted(
+        ({"package": name, **entry} for name, entry in grouped.items()),
+        key=lambda e: abs(e[key]), reverse=True,
+    )
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemoryDiagnostics:
+    """Singleton owning tracemalloc state, stored snapshots and request sampling."""
+
+    _instance: Optional["MemoryDiagnostics"] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[int, tuple[float, tracemalloc.Snapshot]]" = OrderedDict()
+        self._next_id = 1
+        self._measuring = False  # one sampled request at a time (tracemalloc has one peak)
+
+    @classmethod
+    def get_instance(cls) -> "MemoryDiagnostics":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    # ------------------------------------------------------------------
+    # tracemalloc control
+    # ------------------------------------------------------------------
+
+    def start(self, frames: Optional[int] = None) -> None:
+        frames = frames or CONFIG.getint("Memory", "tracemalloc_frames", fallback=10)
+        if tracemalloc.is_tracing():
+            if tracemalloc.get_traceback_limit() == frames:
+                return
+            tracemalloc.stop()  # the frame limit can only change on restart
+        tracemalloc.start(max(1, min(frames, 100)))
+        logger.info(f"tracemalloc started ({frames} frame(s) per allocation)")
+
+    def stop(self) -> None:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc stopped")
+
+    def status(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        with self._lock:
+            snapshots = [
+                {"id": sid, "taken_at": taken_at, "traces": len(snap.traces)}
+                for sid, (taken_at, snap) in self._snapshots.items()
+            ]
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else 0,
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "tracemalloc_overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            "rss_bytes": _rss_bytes(),
+            "request_sample_rate": self._sample_rate(),
+            "snapshots": snapshots,
+            "holders": self._holders(),
+        }
+
+    @staticmethod
+    def _holders() -> dict:
+        """Sizes of the in-process caches most likely to grow."""
+        from app.services.log_broadcaster import SSELogBroadcaster
+        from app.services.response_store import ResponseStore
+        from app.services.session_manager import get_chat_session_count
+        from app.services.translator import TranslationMemory
+
+        return {
+            "chat_sessions": get_chat_session_count(),
+            "log_buffer_entries": SSELogBroadcaster.get_instance().buffered,
+            "stored_responses": len(ResponseStore._instance) if ResponseStore._instance else 0,
+            "translation_memory_entries": len(TranslationMemory._instance) if TranslationMemory._instance else 0,
+        }
+
+    # ------------------------------------------------------------------
+    # Snapshots
+    # ------------------------------------------------------------------
+
+    async def take_snapshot(self) -> int:
+        """Take a snapshot (off the event loop) and keep the last ``MAX_SNAPSHOTS``."""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not tracing; start it first.")
+
+        def take() -> tracemalloc.Snapshot:
+            return tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                tracemalloc.Filter(False, "<unknown>"),
+            ))
+
+        snapshot = await asyncio.to_thread(take)
+        with self._lock:
+            sid = self._next_id
+            self._next_id += 1
+            self._snapshots[sid] = (time.time(), snapshot)
+            while len(self._snapshots) > MAX_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        return sid
+
+    def _get(self, sid: int) -> tracemalloc.Snapshot:
+        with self._lock:
+            if sid not in self._snapshots:
+                raise KeyError(sid)
+            return self._snapshots[sid][1]
+
+    def delete_snapshot(self, sid: int) -> bool:
+        with self._lock:
+            return self._snapshots.pop(sid, None) is not None
+
+    async def top(self, sid: int, group_by: str = "lineno", limit: int = 25) -> dict:
+        snapshot = self._get(sid)
+
+        def compute() -> dict:
+            stats = snapshot.statistics("filename" if group_by == "package" else group_by)
+            total = sum(s.size for s in stats)
+            top = _by_package(stats, False)[:limit] if group_by == "package" else [
+                _stat_dict(s, group_by) for s in stats[:limit]
+            ]
+            return {"id": sid, "group_by": group_by, "total_bytes": total, "top": top}
+
+        return await asyncio.to_thread(compute)
+
+    async def diff(self, base: int, target: int, group_by: str = "lineno", limit: int = 25) -> dict:
+        """Allocation sites ordered by growth from snapshot *base* to *target*."""
+        old, new = self._get(base), self._get(target)
+
+        def compute() -> dict:
+            stats = new.compare_to(old, "filename" if group_by == "package" else group_by)
+            top = _by_package(stats, True)[:limit] if group_by == "package" else [
+                _stat_dict(s, group_by) for s in stats[:limit]
+            ]
+            return {
+                "base": base,
+                "target": target,
+                "group_by": group_by,
+                "size_diff_bytes": sum(s.size_diff for s in stats),
+                "top": top,
+            }
+
+        return await asyncio.to_thread(compute)
+
+    # ------------------------------------------------------------------
+    # Per-request sampling (stats middleware)
+    # ------------------------------------------------------------------
+
+    def _sample_rate(self) -> float:
+        return CONFIG.getfloat("Memory", "request_sample_rate", fallback=0.0)
+
+    def begin_request(self) -> Optional[int]:
+        """Start measuring this request if it is sampled; returns the start level."""
+        if not tracemalloc.is_tracing() or random.random() >= self._sample_rate():
+            return None
+        with self._lock:
+            if self._measuring:
+                return None
+            self._measuring = True
+        tracemalloc.reset_peak()
+        return tracemalloc.get_traced_memory()[0]
+
+    def end_request(self, start_bytes: Optional[int]) -> Optional[tuple[int, int]]:
+        """Return ``(peak_bytes, retained_bytes)`` above the start level, or None."""
+        if start_bytes is None:
+            return None
+        with self._lock:
+            self._measuring = False
+        if not tracemalloc.is_tracing():
+            return None
+        current, peak = tracemalloc.get_traced_memory()
+        return max(0, peak - start_bytes), current - start_bytes
@@ -0,0 +1,148 @@
+# src/app/services/metrics.py
+"""
+Prometheus text exposition (format 0.0.4) for ``GET /metrics``.
+
+Everything is read from counters the services already keep in memory —
+nothing walks the filesystem or takes more than a short lock — so the
+endpoint is cheap enough to scrape every few seconds.
+"""
+import time
+from typing import Iterable, Optional
+
+from app.services.stats_collector import LATENCY_BUCKETS_MS, StatsCollector
+
+# Export every 4th fine bucket (1, 2, 4 … ms) — exact, since those bounds are
+# shared with the in-memory histogram
+_EXPORT_BUCKETS = [(i, LATENCY_BUCKETS_MS[i] / 1000) for i in range(0, len(LATENCY_BUCKETS_MS), 4)]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: Optional[dict]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format(value: float) -> str:
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+class _Writer:
+    def __init__(self):
+        self.lines: list[str] = []
+
+    def metric(self, name: str, kind: str, help_text: str, samples: Iterable[tuple[Optional[dict], float]]) -> None:
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            self.lines.append(f"{name}{_labels(labels)} {_format(value)}")
+
+    def histogram(self, name: str, help_text: str, series: list) -> None:
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for labels, counts, count, total_seconds in series:
+            cumulative, upto = 0, 0
+            for index, bound in _EXPORT_BUCKETS:
+                cumulative += sum(counts[upto:index + 1])
+                upto = index + 1
+                self.lines.append(f"{name}_bucket{_labels({**labels, 'le': f'{bound:g}'})} {cumulative}")
+            self.lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {count}")
+            self.lines.append(f"{name}_sum{_labels(labels)} {_format(total_seconds)}")
+            self.lines.append(f"{name}_count{_labels(labels)} {count}")
+
+    def render(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render_metrics() -> str:
+    """Collect all metrics and return them in Prometheus text format."""
+    # Imported here: these modules pull in the Gemini client and endpoints
+    from app.services.file_index import FileIndex
+    from app.services.gemini_client import get_client_status, get_cookie_age_seconds
+    from app.services.job_manager import JobManager
+    from app.services.log_broadcaster import SSELogBroadcaster
+    from app.services.micro_batcher import MicroBatcher
+    from app.services.session_manager import get_chat_session_count
+    from app.services.temp_janitor import TempJanitor
+    from app.utils.executors import executor_stats
+    from models.gemini import UPSTREAM_STATS
+
+    out = _Writer()
+    stats = StatsCollector.get_instance()
+    latency = stats.latency_snapshot()
+
+    out.metric("webai_uptime_seconds", "gauge", "Seconds since the collector started.",
+               [(None, round(stats.uptime_seconds, 3))])
+    out.metric("webai_requests_total", "counter", "API requests by route, resolved model and outcome.",
+               [({"endpoint": e, "model": m, "outcome": o}, count) for (e, m, o), _, count, _ in latency])
+    out.histogram("webai_request_duration_seconds", "API request duration including the response body.",
+                  [({"endpoint": e, "model": m, "outcome": o}, counts, count, total_ms / 1000)
+                   for (e, m, o), counts, count, total_ms in latency])
+    out.histogram("webai_request_phase_duration_seconds", "Time spent per request phase (see [Telemetry]).",
+                  [({"endpoint": e, "phase": p}, counts, count, total_ms / 1000)
+                   for (e, p), counts, count, total_ms in stats.phase_snapshot()])
+
+    out.metric("webai_upstream_in_flight", "gauge", "Gemini web calls currently in progress.",
+               [(None, UPSTREAM_STATS["in_flight"])])
+    out.metric("webai_upstream_calls_total", "counter", "Gemini web calls started.",
+               [(None, UPSTREAM_STATS["calls_total"])])
+    out.metric("webai_upstream_errors_total", "counter", "Gemini web calls that raised.",
+               [(None, UPSTREAM_STATS["errors_total"])])
+    out.metric("webai_upstream_retries_total", "counter", "Retries after transient Gemini errors.",
+               [(None, UPSTREAM_STATS["retries_total"])])
+    pools = executor_stats()
+    out.metric("webai_executor_in_flight", "gauge", "Calls submitted to a worker pool and not yet finished.",
+               [({"pool": name}, p["in_flight"]) for name, p in sorted(pools.items())])
+    out.metric("webai_executor_queued", "gauge", "Calls waiting for a free worker, by pool.",
+               [({"pool": name}, p["queued"]) for name, p in sorted(pools.items())])
+    out.metric("webai_executor_completed_total", "counter", "Worker pool calls finished, by pool and outcome.",
+               [({"pool": name, "outcome": outcome}, p[key]) for name, p in sorted(pools.items())
+                for outcome, key in (("success", "completed"), ("error", "failed"))])
+    out.metric("webai_gemini_client_up", "gauge", "1 when the Gemini client is initialized.",
+               [(None, 1 if get_client_status()["initialized"] else 0)])
+    cookie_age = get_cookie_age_seconds()
+    if cookie_age is not None:
+        out.metric("webai_cookie_age_seconds", "gauge", "Seconds since the current __Secure-1PSIDTS was first seen.",
+                   [(None, round(cookie_age, 3))])
+
+    out.metric("webai_chat_sessions", "gauge", "Live /gemini-chat sessions.", [(None, get_chat_session_count())])
+
+    jobs = JobManager.get_instance().status_counts()
+    out.metric("webai_background_jobs", "gauge", "Background jobs by status.",
+               [({"status": status}, n) for status, n in sorted(jobs.items())])
+
+    micro = MicroBatcher.get_instance().get_stats()
+    out.metric("webai_microbatch_batches_total", "counter", "Packed micro-batch upstream calls.",
+               [(None, micro["batches"])])
+    out.metric("webai_microbatch_fallbacks_total", "counter", "Micro-batched prompts retried individually.",
+               [(None, micro["fallbacks"])])
+
+    janitor = TempJanitor.get_instance().get_stats()
+    out.metric("webai_temp_dir_bytes", "gauge", "Bytes in the temp and files dirs at the last janitor sweep.",
+               [(None, janitor["bytes"])])
+    out.metric("webai_temp_dir_files", "gauge", "Files in the temp and files dirs at the last janitor sweep.",
+               [(None, janitor["files"])])
+    out.metric("webai_temp_reclaimed_bytes_total", "counter", "Bytes deleted by the temp janitor.",
+               [(None, janitor["reclaimed_bytes_total"])])
+    if janitor["last_sweep_at"]:
+        out.metric("webai_temp_last_sweep_timestamp_seconds", "gauge", "Unix time of the last janitor sweep.",
+                   [(None, janitor["last_sweep_at"])])
+    out.metric("webai_indexed_files", "gauge", "Files registered in the Files API index.",
+               [(None, len(FileIndex.get_instance()))])
+
+    broadcaster = SSELogBroadcaster.get_instance()
+    out.metric("webai_log_records_total", "counter", "Log records by level.",
+               [({"level": level}, n) for level, n in sorted(broadcaster.level_counts.items())])
+    out.metric("webai_log_stream_clients", "gauge", "Connected admin log stream clients.",
+               [(None, broadcaster.client_count)])
+
+    out.metric("webai_scrape_timestamp_seconds", "gauge", "Unix time this exposition was rendered.",
+               [(None, round(time.time(), 3))])
+    return out.render()
@@ -0,0 +1,202 @@
+# src/app/services/micro_batcher.py
+"""
+Opt-in micro-batching of short, text-only, stateless prompts.
+
+Every web Gemini call carries a large fixed overhead, which dominates the
+latency of tiny classification / extraction prompts.  For models listed in
+``[MicroBatch] models``, prompts that arrive within ``window_ms`` of each
+other are packed (up to ``max_batch`` prompts / ``max_batch_chars``) into a
+single upstream prompt with numbered, nonce-tagged delimiters.  The reply is
+split back into per-request answers; any request whose answer cannot be found
+falls back to an individual call.
+"""
+import asyncio
+import re
+import uuid
+from typing import Optional
+
+from app.config import CONFIG
+from app.logger import logger
+from app.services.stats_collector import detach_request_context, request_phase
+
+_INSTRUCTIONS = (
+    "You will receive {count} independent requests. Answer each one on its own, "
+    "exactly as if it were the only request — never mention or combine the others.\n"
+    "Reply using exactly this format and nothing else:\n"
+    "@@ANSWER 1 {nonce}@@\n<answer to request 1>\n"
+    "@@ANSWER 2 {nonce}@@\n<answer to request 2>\n"
+    "...\n"
+    "@@END {nonce}@@\n\n"
+)
+
+
+class MicroBatcher:
+    """Singleton that coalesces concurrent short prompts per model."""
+
+    _instance: Optional["MicroBatcher"] = None
+
+    def __init__(self):
+        self._queues: dict[str, list[tuple[str, asyncio.Future]]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._clients: dict[str, object] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._stats = {
+            "batches": 0,
+            "batched_prompts": 0,
+            "single_calls": 0,
+            "fallbacks": 0,
+            "largest_batch": 0,
+        }
+
+    @classmethod
+    def get_instance(cls) -> "MicroBatcher":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def accepts(self, model: str, prompt: str) -> bool:
+        """True if this text-only prompt should go through the batcher."""
+        if "MicroBatch" not in CONFIG:
+            return False
+        models = {m.strip() for m in CONFIG["MicroBatch"].get("models", "").split(",") if m.strip()}
+        if model not in models and "*" not in models:
+            return False
+        max_chars = CONFIG.getint("MicroBatch", "max_prompt_chars", fallback=1500)
+        return 0 < len(prompt) <= max_chars
+
+    async def generate(self, gemini_client, prompt: str, model: str) -> str:
+        """Queue *prompt* for the next batch of *model* and return its answer text."""
+        loop = asyncio.get_running_loop()
+        max_batch = max(1, CONFIG.getint("MicroBatch", "max_batch", fallback=8))
+        max_batch_chars = CONFIG.getint("MicroBatch", "max_batch_chars", fallback=12000)
+        window = max(0, CONFIG.getint("MicroBatch", "window_ms", fallback=30)) / 1000
+
+        queue = self._queues.setdefault(model, [])
+        if queue and sum(len(p) for p, _ in queue) + len(prompt) > max_batch_chars:
+            self._flush(model)
+            queue = self._queues.setdefault(model, [])
+
+        future = loop.create_future()
+        queue.append((prompt, future))
+        self._clients[model] = gemini_client
+        if len(queue) >= max_batch:
+            self._flush(model)
+        elif model not in self._timers:
+            self._timers[model] = loop.call_later(window, self._flush, model)
+        with request_phase("upstream"):
+            return await future
+
+    def get_stats(self) -> dict:
+        return {
+            **self._stats,
+            "pending": sum(len(q) for q in self._queues.values()),
+            "models": sorted(
+                m.strip() for m in CONFIG["MicroBatch"].get("models", "").split(",") if m.strip()
+            ) if "MicroBatch" in CONFIG else [],
+        }
+
+    def stop(self) -> None:
+        """Fail queued prompts and cancel in-flight batches on shutdown."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for queue in self._queues.values():
+            for _, future in queue:
+                if not future.done():
+                    future.cancel()
+        self._queues.clear()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+
+    def _flush(self, model: str) -> None:
+        timer = self._timers.pop(model, None)
+        if timer is not None:
+            timer.cancel()
+        items = [(p, f) for p, f in self._queues.pop(model, []) if not f.done()]
+        if not items:
+            return
+        task = asyncio.create_task(self._dispatch(self._clients[model], model, items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, gemini_client, model: str, items: list[tuple[str, asyncio.Future]]) -> None:
+        # The batch serves every queued request; each one times its own wait
+        detach_request_context()
+        if len(items) == 1:
+            self._stats["single_calls"] += 1
+            await self._call_single(gemini_client, model, *items[0])
+            return
+
+        nonce = uuid.uuid4().hex[:8]
+        packed = _INSTRUCTIONS.format(count=len(items), nonce=nonce) + "".join(
+            f"@@REQUEST {i} {nonce}@@\n{prompt}\n" for i, (prompt, _) in enumerate(items, 1)
+        ) + f"@@END REQUESTS {nonce}@@"
+
+        try:
+            response = await gemini_client.generate_content(message=packed, model=model, files=None)
+        except Exception as exc:
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        self._stats["batches"] += 1
+        self._stats["batched_prompts"] += len(items)
+        self._stats["largest_batch"] = max(self._stats["largest_batch"], len(items))
+
+        answers = split_numbered_blocks(response.text or "", nonce, len(items))
+        missing = [(p, f) for i, (p, f) in enumerate(items, 1) if not answers.get(i)]
+        for i, (_, future) in enumerate(items, 1):
+            if answers.get(i) and not future.done():
+                future.set_result(answers[i])
+        if missing:
+            self._stats["fallbacks"] += len(missing)
+            logger.warning(
+                f"Micro-batch of {len(items)} ({model}): {len(missing)} answer(s) not found, "
+                f"falling back to individual calls"
+            )
+            await asyncio.gather(*(self._call_single(gemini_client, model, p, f) for p, f in missing))
+        else:
+            logger.debug(f"Micro-batch of {len(items)} prompts answered in one call ({model})")
+
+    async def _call_single(self, gemini_client, model: str, prompt: str, future: asyncio.Future) -> None:
+        try:
+            response = await gemini_client.generate_content(message=prompt, model=model, files=None)
+        except Exception as exc:
+            if not future.done():
+                future.set_exception(exc)
+            return
+        if not future.done():
+            future.set_result(response.text)
+
+
+def split_numbered_blocks(text: str, nonce: str, count: int, label: str = "ANSWER") -> dict[int, str]:
+    """
+    Parse ``@@<label> <n> <nonce>@@`` delimited blocks (terminated by
+    ``@@END <nonce>@@``) into ``{n: text}``.  Numbers outside 1..count or
+    repeated are dropped.
+    """
+    marker = re.compile(rf"@@\s*({label}\s+(\d+)|END)\s+{nonce}\s*@@")
+    matches = list(marker.finditer(text))
+    answers: dict[int, str] = {}
+    seen: set[int] = set()
+    for match, nxt in zip(matches, matches[1:] + [None]):
+        if match.group(2) is None:
+            continue
+        number = int(match.group(2))
+        if number in seen or not 1 <= number <= count:
+            answers.pop(number, None)
+            continue
+        seen.add(number)
+        end = nxt.start() if nxt else len(text)
+        answers[number] = text[match.end():end].strip()
+    return answers
@@ -0,0 +1,196 @@
+# src/app/services/profiler.py
+"""
+On-demand sampling CPU profiler (``POST /api/admin/profile``).
+
+A daemon thread snapshots the Python stack of every thread of the server
+process (event loop, ``io``/``cpu``/``image`` executor threads, the cookie
+persister, ...) every few milliseconds via ``sys._current_frames()``.
+Nothing is installed in the profiled threads, so overhead is just the
+sampler itself and the profiler is safe to run in production for a bounded
+time.
+
+Worker processes (the ``process`` pool behind ``run_cpu`` for large inputs
+and the ``pdf`` pool) are not sampled: their work only shows up as the
+calling coroutine awaiting its future.
+
+Results are exported as:
+
+- ``collapsed``: ``thread;outer;...;leaf count`` lines, the input format of
+  flamegraph.pl, speedscope and inferno
+- ``pstats``: a marshalled ``pstats`` dict (open with ``pstats.Stats``,
+  snakeviz or tuna); each sample is weighted by the measured wall time
+  since the previous sampler wakeup, so late wakeups (GIL contention, a
+  loaded host) do not shrink the reported times
+"""
+import asyncio
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# (file basename, function) of frames where a thread is just waiting
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("process.py", "_worker"),
+}
+
+_Func = tuple[str, int, str]  # (filename, first line, function) — the pstats key
+
+
+def _short_path(filename: str) -> str:
+    for marker in ("site-packages" + os.sep, "src" + os.sep, "lib" + os.sep):
+        index = filename.rfind(marker)
+        if index >= 0:
+            return filename[index + len(marker):]
+    return filename
+
+
+class ProfileResult:
+    """Stack samples collected by one profiling run."""
+
+    def __init__(self, samples: Counter, weights: Counter, interval: float, duration: float, idle_dropped: int):
+        self.samples = samples  # (thread name, (func outermost → leaf)) -> count
+        self.weights = weights  # same key -> seconds of wall time the samples stand for
+        self.interval = interval
+        self.duration = duration
+        self.idle_dropped = idle_dropped
+
+    @property
+    def sample_count(self) -> int:
+        return sum(self.samples.values())
+
+    def to_collapsed(self) -> str:
+        lines = []
+        for (thread, stack), count in sorted(self.samples.items(), key=lambda kv: -kv[1]):
+            frames = ";".join(f"{func} ({_short_path(filename)}:{line})" for filename, line, func in stack)
+            lines.append(f"{thread};{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_pstats(self) -> bytes:
+        """Build ``{func: (cc, nc, tt, ct, callers)}`` as ``pstats.Stats`` loads it."""
+        stats: dict[_Func, list] = {}
+        for key, count in self.samples.items():
+            stack = key[1]
+            seconds = self.weights[key]
+            seen: set[_Func] = set()
+            for depth, func in enumerate(stack):
+                entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+                if func not in seen:  # recursion: count inclusive time once
+                    seen.add(func)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if depth == len(stack) - 1:
+                    entry[2] += seconds
+                if depth:
+                    caller = stack[depth - 1]
+                    cc, nc, tt, ct = entry[4].get(caller, (0, 0, 0.0, 0.0))
+                    entry[4][caller] = (
+                        cc + count, nc + count,
+                        tt + (seconds if depth == len(stack) - 1 else 0.0), ct + seconds,
+                    )
+        return marshal.dumps({func: tuple(entry) for func, entry in stats.items()})
+
+    def top(self, limit: int = 15) -> list[dict]:
+        """Functions with the most self (leaf) samples."""
+        leaves: Counter = Counter()
+        for (_, stack), count in self.samples.items():
+            leaves[stack[-1]] += count
+        total = self.sample_count or 1
+        return [
+            {"function": func, "location": f"{_short_path(filename)}:{line}",
+             "samples": count, "percent": round(100 * count / total, 1)}
+            for (filename, line, func), count in leaves.most_common(limit)
+        ]
+
+
+class CpuProfiler:
+    """Singleton running at most one sampling session at a time."""
+
+    _instance: Optional["CpuProfiler"] = None
+
+    def __init__(self):
+        self._running = False
+        self.last: Optional[ProfileResult] = None
+
+    @classmethod
+    def get_instance(cls) -> "CpuProfiler":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    async def run(self, seconds: float, interval_ms: float = 5.0, include_idle: bool = False) -> ProfileResult:
+        """Sample all threads for *seconds* without blocking the event loop."""
+        if self._running:
+            raise RuntimeError("A profile is already running.")
+        self._running = True
+        try:
+            stop = threading.Event()
+            holder: dict = {}
+            sampler = threading.Thread(
+                target=self._sample,
+                args=(stop, interval_ms / 1000, include_idle, holder),
+                name="cpu-profiler",
+                daemon=True,
+            )
+            started = time.perf_counter()
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                stop.set()
+                await asyncio.to_thread(sampler.join)
+            self.last = ProfileResult(
+                holder["samples"], holder["weights"], interval_ms / 1000,
+                time.perf_counter() - started, holder["idle"],
+            )
+            return self.last
+        finally:
+            self._running = False
+
+    @staticmethod
+    def _sample(stop: threading.Event, interval: float, include_idle: bool, holder: dict) -> None:
+        samples: Counter = Counter()
+        weights: Counter = Counter()
+        idle = 0
+        own = threading.get_ident()
+        code_keys: dict = {}  # code object -> pstats key, avoids rebuilding tuples
+        last_wakeup = time.perf_counter()
+        while not stop.wait(interval):
+            now = time.perf_counter()
+            elapsed, last_wakeup = now - last_wakeup, now
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    key = code_keys.get(code)
+                    if key is None:
+                        key = code_keys[code] = (code.co_filename, code.co_firstlineno, code.co_name)
+                    stack.append(key)
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                if not include_idle and (os.path.basename(stack[0][0]), stack[0][2]) in _IDLE_LEAVES:
+                    idle += 1
+                    continue
+                stack.reverse()
+                key = (names.get(ident, f"thread-{ident}"), tuple(stack))
+                samples[key] += 1
+                weights[key] += elapsed
+        holder["samples"] = samples
+        holder["weights"] = weights
+        holder["idle"] = idle
@@ -0,0 +1,126 @@
+# src/app/services/response_store.py
+"""
+Stored ``/v1/responses`` objects (``store: true``) for ``previous_response_id``.
+
+Each record keeps the response object returned to the client plus the Gemini
+chat metadata (``[cid, rid, rcid]``) of the upstream conversation, so a
+follow-up turn continues that conversation and only sends its new input.
+Records live in memory (LRU, ``[Responses] max_stored``) and are persisted to
+an append-only JSON-lines log under ``<files_dir>/responses/``, compacted on
+startup and whenever the log grows past twice the limit.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from app.config import CONFIG
+from app.logger import logger
+from app.services.file_index import get_files_dir
+
+STORE_DIR_NAME = "responses"
+STORE_NAME = "store.jsonl"
+
+
+class ResponseStore:
+    """Singleton bounded store of responses keyed by response id."""
+
+    _instance: Optional["ResponseStore"] = None
+
+    def __init__(self, path: Optional[Path] = None):
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[str, dict]" = OrderedDict()
+        self._path = path or get_files_dir() / STORE_DIR_NAME / STORE_NAME
+        self._appended = 0
+        self._load()
+
+    @classmethod
+    def get_instance(cls) -> "ResponseStore":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def get(self, response_id: str) -> Optional[dict]:
+        with self._lock:
+            record = self._records.get(response_id)
+            if record is not None:
+                self._records.move_to_end(response_id)
+            return dict(record) if record else None
+
+    def put(self, response: dict, model: str, metadata: Optional[list]) -> None:
+        """Store a completed response and the upstream chat it belongs to."""
+        record = {
+            "id": response["id"],
+            "response": response,
+            "model": model,
+            "metadata": list(metadata or []),
+            "stored_at": int(time.time()),
+        }
+        with self._lock:
+            self._records[record["id"]] = record
+            self._records.move_to_end(record["id"])
+            self._evict()
+            self._append({"op": "put", **record})
+
+    def delete(self, response_id: str) -> bool:
+        with self._lock:
+            if self._records.pop(response_id, None) is None:
+                return False
+            self._append({"op": "delete", "id": response_id})
+        return True
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _max_stored(self) -> int:
+        return max(1, CONFIG.getint("Responses", "max_stored", fallback=1000))
+
+    def _evict(self) -> None:
+        while len(self._records) > self._max_stored():
+            self._records.popitem(last=False)
+
+    def _append(self, entry: dict) -> None:
+        try:
+            with open(self._path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._appended += 1
+        except OSError as exc:
+            logger.warning(f"Could not persist stored response: {exc}")
+        if self._appended > 2 * self._max_stored():
+            self._compact()
+
+    def _load(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        if self._path.exists():
+            with open(self._path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                        op = entry.pop("op")
+                        if op == "put":
+                            self._records[entry["id"]] = entry
+                            self._records.move_to_end(entry["id"])
+                        else:
+                            self._records.pop(entry["id"], None)
+                    except (ValueError, KeyError, TypeError):
+                        continue  # torn write from a crash — skip the line
+            self._evict()
+            self._compact()
+        logger.info(f"Response store loaded: {len(self._records)} response(s)")
+
+    def _compact(self) -> None:
+        tmp = self._path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                for record in self._records.values():
+                    fh.write(json.dumps({"op": "put", **record}, ensure_ascii=False, separators=(",", ":")) + "\n")
+            tmp.replace(self._path)
+            self._appended = 0
+        except OSError as exc:
+            logger.warning(f"Could not compact response store: {exc}")
@@ -51,6 +51,11 @@ def delete_chat_session(session_id: str) -> bool:
     return False
 
 
+def get_chat_session_count() -> int:
+    """Số session /gemini-chat đang sống (dùng cho /metrics)."""
+    return len(_chat_sessions)
+
+
 def get_translate_session_manager() -> SessionManager | None:
     return _translate_session_manager
 
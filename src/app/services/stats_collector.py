@@ -1,7 +1,254 @@
 # src/app/services/stats_collector.py
+import bisect
+import contextvars
+import math
 import time
 import threading
-from typing import Optional
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from app.config import CONFIG
+from app.services.tracer import span
+
+# Upper bounds (ms) of the fixed latency buckets: log-scaled, 4 per doubling,
+# from 1 ms to ~30 min.  Anything slower lands in one overflow bucket.
+LATENCY_BUCKETS_MS: tuple[float, ...] = tuple(round(2 ** (i / 4), 3) for i in range(84))
+PERCENTILES = (50, 90, 95, 99)
+
+# Per-request scratch dict shared between the stats middleware and the
+# endpoint handling the request (which runs in a child task)
+_request_context: contextvars.ContextVar[Optional[dict]] = contextvars.ContextVar(
+    "webai_request_context", default=None
+)
+
+
+def begin_request_context(request_id: str) -> dict:
+    """Start a fresh per-request context (called by the stats middleware)."""
+    ctx: dict = {"request_id": request_id}
+    _request_context.set(ctx)
+    return ctx
+
+
+def current_request_id() -> Optional[str]:
+    """ID of the request being handled (also inherited by its background work)."""
+    ctx = _request_context.get()
+    return ctx.get("request_id") if ctx is not None else None
+
+
+def set_request_model(model: str) -> None:
+    """Record the resolved Gemini model for the current request's latency stats."""
+    ctx = _request_context.get()
+    if ctx is not None:
+        ctx["model"] = model
+
+
+def detach_request_context() -> None:
+    """
+    Stop attributing work in the current task to the request that spawned it
+    (for shared work such as a micro-batch serving several requests).
+    """
+    _request_context.set(None)
+
+
+@contextmanager
+def request_phase(name: str, **attributes) -> Iterator[None]:
+    """
+    Time a phase of the current request (``Server-Timing`` / phase stats)
+    and trace it as a span with *attributes*.
+
+    Spans of the same phase that overlap (e.g. parallel downloads) count
+    wall-clock time once.  Without a request context this is a no-op.
+    """
+    ctx = _request_context.get()
+    if ctx is None:
+        yield
+        return
+    # name -> [seconds, open spans, start of the outermost open span]
+    entry = ctx.setdefault("phases", {}).setdefault(name, [0.0, 0, 0.0])
+    if entry[1] == 0:
+        entry[2] = time.perf_counter()
+    entry[1] += 1
+    try:
+        with span(name, **attributes):
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            entry[0] += time.perf_counter() - entry[2]
+
+
+def request_phases(ctx: dict) -> dict[str, float]:
+    """Milliseconds spent per phase so far (phases still open count up to now)."""
+    now = time.perf_counter()
+    return {
+        name: (seconds + (now - started if open_spans else 0.0)) * 1000
+        for name, (seconds, open_spans, started) in ctx.get("phases", {}).items()
+    }
+
+
+def _outcome(status_code: int, completed: bool = True) -> str:
+    if not completed:
+        return "disconnected"
+    if status_code < 400:
+        return "ok"
+    return "client_error" if status_code < 500 else "server_error"
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram (see ``LATENCY_BUCKETS_MS``)."""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, q: float) -> float:
+        """Estimate the q-th percentile (0–100), interpolating inside the bucket."""
+        if not self.count:
+            return 0.0
+        target = self.count * q / 100
+        cumulative = 0
+        for i, c in enumerate(self.counts):
+            if c and cumulative + c >= target:
+                lower = LATENCY_BUCKETS_MS[i - 1] if i > 0 else 0.0
+                upper = LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+                estimate = lower + (upper - lower) * (target - cumulative) / c
+                return round(min(estimate, self.max_ms), 1)
+            cumulative += c
+        return round(self.max_ms, 1)
+
+    def summary(self) -> dict:
+        result = {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 1) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 1),
+        }
+        for q in PERCENTILES:
+            result[f"p{q}_ms"] = self.percentile(q)
+        return result
+
+
+# Time constant of the per-client request rate (an exponentially decayed count)
+_CLIENT_RATE_WINDOW_S = 60.0
+# Distinct routes / models kept per client; the rest are counted as "other"
+_CLIENT_BREAKDOWN_KEYS = 5
+
+
+def _count_capped(counts: dict[str, int], key: str) -> None:
+    if key not in counts and len(counts) >= _CLIENT_BREAKDOWN_KEYS:
+        key = "other"
+    counts[key] = counts.get(key, 0) + 1
+
+
+class _ClientEntry:
+    __slots__ = (
+        "count", "overcount", "errors", "bytes_in", "bytes_out", "latency",
+        "rate", "rate_at", "first_seen", "last_seen", "routes", "models", "user_agent", "address",
+    )
+
+    def __init__(self, count: int, now: float):
+        self.count = count
+        self.overcount = count - 1  # requests inherited from the evicted entry
+        self.errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.latency = LatencyHistogram()
+        self.rate = 0.0
+        self.rate_at = now
+        self.first_seen = now
+        self.last_seen = now
+        self.routes: dict[str, int] = {}
+        self.models: dict[str, int] = {}
+        self.user_agent = ""
+        self.address = ""
+
+    def rate_per_min(self, now: float) -> float:
+        return self.rate * math.exp(-(now - self.rate_at) / _CLIENT_RATE_WINDOW_S) * 60
+
+
+class ClientTopK:
+    """
+    Space-Saving top-K of client identities (see ``StatsCollector.record_client``).
+
+    At most ``capacity`` clients are tracked.  A new client replaces the one
+    with the fewest requests and inherits its count, so the heaviest clients
+    are always kept and their counts are over-estimated by at most
+    ``overcount``.  Errors, bytes and latency cover the requests seen since
+    the client entered the table.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self._entries: dict[str, _ClientEntry] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(
+        self, identity: str, route: str, model: Optional[str], status_code: int, ms: float,
+        bytes_in: int, bytes_out: int, user_agent: str, address: str, now: float,
+    ) -> None:
+        entry = self._entries.get(identity)
+        if entry is None:
+            floor = 0
+            if len(self._entries) >= self.capacity:
+                victim = min(self._entries, key=lambda k: self._entries[k].count)
+                floor = self._entries.pop(victim).count
+            entry = self._entries[identity] = _ClientEntry(floor + 1, now)
+        else:
+            entry.count += 1
+        entry.rate = entry.rate_per_min(now) / 60 + 1 / _CLIENT_RATE_WINDOW_S
+        entry.rate_at = now
+        entry.last_seen = now
+        if status_code >= 400:
+            entry.errors += 1
+        entry.bytes_in += bytes_in
+        entry.bytes_out += bytes_out
+        entry.latency.observe(ms)
+        _count_capped(entry.routes, route)
+        _count_capped(entry.models, model or "-")
+        entry.user_agent = user_agent
+        entry.address = address
+
+    def top(self, limit: int, now: float) -> list[dict]:
+        entries = sorted(self._entries.items(), key=lambda kv: kv[1].count, reverse=True)[:limit]
+        result = []
+        for identity, e in entries:
+            seen = e.latency.count
+            result.append({
+                "client": identity,
+                "count": e.count,
+                "overcount": e.overcount,
+                "rate_per_min": round(e.rate_per_min(now), 2),
+                "error_rate": round(e.errors / seen, 4) if seen else 0.0,
+                "latency": {k: v for k, v in e.latency.summary().items() if k != "count"},
+                "bytes_in": e.bytes_in,
+                "bytes_out": e.bytes_out,
+                "routes": dict(sorted(e.routes.items(), key=lambda kv: -kv[1])),
+                "models": dict(sorted(e.models.items(), key=lambda kv: -kv[1])),
+                "user_agent": e.user_agent,
+                "address": e.address,
+                "first_seen": e.first_seen,
+                "last_seen": e.last_seen,
+            })
+        return result
 
 
 class StatsCollector:
@@ -20,6 +267,17 @@ class StatsCollector:
         self._endpoint_error: dict[str, int] = {}
         self._endpoint_last_seen: dict[str, float] = {}
         self._last_request_time: Optional[float] = None
+        # (endpoint route, model, outcome) -> histogram
+        self._latency: dict[tuple[str, str, str], LatencyHistogram] = {}
+        # (endpoint route, phase) -> histogram
+        self._phases: dict[tuple[str, str], LatencyHistogram] = {}
+        # Event-loop scheduling lag (see loop_monitor)
+        self._loop_lag = LatencyHistogram()
+        self._loop_blocks = 0
+        # endpoint route -> sampled peak/retained allocation totals
+        self._memory: dict[str, dict] = {}
+        # Heaviest clients by request count (API key or user agent + address)
+        self._clients = ClientTopK(CONFIG.getint("Telemetry", "top_clients", fallback=100))
 
     @classmethod
     def get_instance(cls) -> "StatsCollector":
@@ -27,6 +285,10 @@ class StatsCollector:
             cls._instance = cls()
         return cls._instance
 
+    @property
+    def uptime_seconds(self) -> float:
+        return time.time() - self._start_time
+
     def record_request(self, path: str, status_code: int) -> None:
         with self._lock:
             now = time.time()
@@ -42,7 +304,110 @@ class StatsCollector:
                 self._error_count += 1
                 self._endpoint_error[path] = self._endpoint_error.get(path, 0) + 1
 
+    def record_latency(
+        self, endpoint: str, model: Optional[str], status_code: int, seconds: float, completed: bool = True
+    ) -> None:
+        """Add one request duration to the endpoint × model × outcome histograms."""
+        key = (endpoint, model or "-", _outcome(status_code, completed))
+        with self._lock:
+            hist = self._latency.get(key)
+            if hist is None:
+                hist = self._latency[key] = LatencyHistogram()
+            hist.observe(seconds * 1000)
+
+    def record_phases(self, endpoint: str, phases: dict[str, float]) -> None:
+        """Add one request's per-phase milliseconds to the endpoint × phase histograms."""
+        with self._lock:
+            for phase, ms in phases.items():
+                hist = self._phases.get((endpoint, phase))
+                if hist is None:
+                    hist = self._phases[(endpoint, phase)] = LatencyHistogram()
+                hist.observe(ms)
+
+    def latency_snapshot(self) -> list[tuple[tuple[str, str, str], list[int], int, float]]:
+        """Copy of ``(key, bucket_counts, count, total_ms)`` per series for /metrics."""
+        with self._lock:
+            return [(key, list(h.counts), h.count, h.total_ms) for key, h in self._latency.items()]
+
+    def record_client(
+        self, identity: str, route: str, model: Optional[str], status_code: int, seconds: float,
+        bytes_in: int, bytes_out: int, user_agent: str = "", address: str = "",
+    ) -> None:
+        """Add one finished request to the per-client top-K."""
+        with self._lock:
+            self._clients.record(
+                identity, route, model, status_code, seconds * 1000,
+                bytes_in, bytes_out, user_agent, address, time.time(),
+            )
+
+    def top_clients(self, limit: int = 20) -> list[dict]:
+        with self._lock:
+            return self._clients.top(limit, time.time())
+
+    def record_loop_lag(self, ms: float) -> None:
+        with self._lock:
+            self._loop_lag.observe(ms)
+
+    def record_loop_block(self) -> None:
+        with self._lock:
+            self._loop_blocks += 1
+
+    def record_memory(self, endpoint: str, peak_bytes: int, retained_bytes: int) -> None:
+        """Add one sampled request's traced-allocation peak (see memory_diagnostics)."""
+        with self._lock:
+            entry = self._memory.setdefault(
+                endpoint, {"samples": 0, "peak_total": 0, "peak_max": 0, "retained_total": 0}
+            )
+            entry["samples"] += 1
+            entry["peak_total"] += peak_bytes
+            entry["peak_max"] = max(entry["peak_max"], peak_bytes)
+            entry["retained_total"] += retained_bytes
+
+    def _memory_stats(self) -> dict:
+        return {
+            endpoint: {
+                "samples": e["samples"],
+                "peak_mean_bytes": e["peak_total"] // e["samples"],
+                "peak_max_bytes": e["peak_max"],
+                "retained_mean_bytes": e["retained_total"] // e["samples"],
+            }
+            for endpoint, e in self._memory.items()
+        }
+
+    def phase_snapshot(self) -> list[tuple[tuple[str, str], list[int], int, float]]:
+        """Copy of ``(key, bucket_counts, count, total_ms)`` per endpoint × phase for /metrics."""
+        with self._lock:
+            return [(key, list(h.counts), h.count, h.total_ms) for key, h in self._phases.items()]
+
+    def _latency_stats(self) -> dict:
+        """Percentile summaries overall, per endpoint, model, outcome and series."""
+        overall = LatencyHistogram()
+        groups: dict[str, dict[str, LatencyHistogram]] = {"endpoints": {}, "models": {}, "outcomes": {}}
+        series = []
+        for (endpoint, model, outcome), hist in self._latency.items():
+            overall.merge(hist)
+            for group, name in (("endpoints", endpoint), ("models", model), ("outcomes", outcome)):
+                groups[group].setdefault(name, LatencyHistogram()).merge(hist)
+            series.append({"endpoint": endpoint, "model": model, "outcome": outcome, **hist.summary()})
+        series.sort(key=lambda s: s["count"], reverse=True)
+        return {
+            "overall": overall.summary(),
+            **{group: {name: h.summary() for name, h in hists.items()} for group, hists in groups.items()},
+            "series": series,
+        }
+
+    def _phase_stats(self) -> dict:
+        """Percentile summaries per phase, overall and per endpoint."""
+        overall: dict[str, LatencyHistogram] = {}
+        endpoints: dict[str, dict] = {}
+        for (endpoint, phase), hist in self._phases.items():
+            overall.setdefault(phase, LatencyHistogram()).merge(hist)
+            endpoints.setdefault(endpoint, {})[phase] = hist.summary()
+        return {"overall": {phase: h.summary() for phase, h in overall.items()}, "endpoints": endpoints}
+
     def get_stats(self) -> dict:
+        from app.utils.executors import executor_stats  # executors imports app.logger, which imports us
+
         with self._lock:
             uptime_seconds = time.time() - self._start_time
             hours, remainder = divmod(int(uptime_seconds), 3600)
@@ -67,4 +432,10 @@ class StatsCollector:
                 "endpoints": {p: d["count"] for p, d in endpoints_detail.items()},
                 "endpoints_detail": endpoints_detail,
                 "last_request_time": self._last_request_time,
+                "latency": self._latency_stats(),
+                "phases": self._phase_stats(),
+                "memory": self._memory_stats(),
+                "event_loop": {"lag": self._loop_lag.summary(), "blocks": self._loop_blocks},
+                "executors": executor_stats(),
+                "clients": self._clients.top(20, time.time()),
             }
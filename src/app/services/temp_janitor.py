@@ -0,0 +1,300 @@
+# src/app/services/temp_janitor.py
+"""
+Background janitor for the temp directory and the uploaded files directory.
+
+In the files directory only uploads are managed — files the FileIndex knows
+or that follow the upload naming scheme — and the files still referenced by
+batches are never deleted.
+
+- Per-file TTL: files not used for ``[Storage] ttl_hours`` are deleted.
+- Disk quota: when the directory grows past ``[Storage] quota_mb``, the least
+  recently used files are evicted until it fits again.
+- Startup reclamation: ``webai_uploads_*`` directories abandoned by crashed or
+  restarted processes are removed.
+
+Metrics are exposed through ``get_stats()`` (see ``/api/admin/storage``).
+"""
+import asyncio
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from app.config import CONFIG
+from app.logger import logger
+from app.services.file_index import INDEX_NAME, FileIndex
+from app.utils.image_utils import (
+    OWNER_LOCK_NAME,
+    TEMP_DIR_PREFIX,
+    get_temp_dir,
+    is_temp_dir_orphaned,
+)
+
+# Files used this recently are never evicted for quota (likely in flight)
+_EVICTION_GRACE_SECONDS = 60
+# Bookkeeping files that must never be swept
+_RESERVED_NAMES = {OWNER_LOCK_NAME, INDEX_NAME, Path(INDEX_NAME).with_suffix(".tmp").name}
+# Stored uploads: file_<32 hex><suffix> (see the files endpoint)
+_UPLOAD_NAME = re.compile(r"^file_[0-9a-f]{32}\.[A-Za-z0-9]+$")
+
+
+class TempJanitor:
+    """Singleton that reclaims disk space in the temp and files directories."""
+
+    _instance: Optional["TempJanitor"] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Last-use time per file name; falls back to mtime for unknown files
+        self._last_access: dict[str, float] = {}
+        self._files = 0
+        self._bytes = 0
+        self._expired_total = 0
+        self._evicted_total = 0
+        self._reclaimed_bytes_total = 0
+        self._orphan_dirs_total = 0
+        self._sweeps = 0
+        self._last_sweep_at: Optional[float] = None
+        self._last_sweep_ms: Optional[float] = None
+
+    @classmethod
+    def get_instance(cls) -> "TempJanitor":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    # ------------------------------------------------------------------
+    # Config helpers
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _cfg() -> dict:
+        return {
+            "ttl": CONFIG.getfloat("Storage", "ttl_hours", fallback=24.0) * 3600,
+            "quota": CONFIG.getint("Storage", "quota_mb", fallback=2048) * 1024 * 1024,
+            "interval": max(10, CONFIG.getint("Storage", "sweep_interval", fallback=300)),
+        }
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def touch(self, path: Path) -> None:
+        """Record that *path* was just used (keeps it from expiring/eviction)."""
+        with self._lock:
+            self._last_access[path.name] = time.time()
+
+    def forget(self, path: Path) -> None:
+        """Drop access tracking for a file that was deleted elsewhere."""
+        with self._lock:
+            self._last_access.pop(path.name, None)
+
+    def reclaim_orphan_dirs(self) -> int:
+        """
+        Remove temp directories left behind by dead processes.
+
+        A directory is an orphan when its owner lock is free.  Directories
+        without a lock (older versions, or platforms without ``fcntl``) are
+        only removed once everything in them is older than the TTL.
+        """
+        own = get_temp_dir().resolve()
+        ttl = self._cfg()["ttl"]
+        now = time.time()
+        removed = 0
+        for candidate in Path(tempfile.gettempdir()).glob(f"{TEMP_DIR_PREFIX}*"):
+            try:
+                if not candidate.is_dir() or candidate.resolve() == own:
+                    continue
+                orphaned = is_temp_dir_orphaned(candidate)
+                if orphaned is None:
+                    orphaned = now - _newest_mtime(candidate) > ttl
+                if not orphaned:
+                    continue
+                size = _dir_size(candidate)
+                shutil.rmtree(candidate)
+                removed += 1
+                with self._lock:
+                    self._reclaimed_bytes_total += size
+                logger.info(f"Removed orphaned temp dir {candidate} ({size} bytes)")
+            except Exception as exc:
+                logger.warning(f"Could not reclaim temp dir {candidate}: {exc}")
+        with self._lock:
+            self._orphan_dirs_total += removed
+        return removed
+
+    def sweep(self) -> dict:
+        """Apply TTL expiry and the disk quota once. Returns a summary."""
+        started = time.perf_counter()
+        cfg = self._cfg()
+        now = time.time()
+
+        entries = []  # (last_used, size, path)
+        with self._lock:
+            last_access = dict(self._last_access)
+        index = FileIndex.get_instance()
+        indexed = index.blob_names()
+        pinned = _batch_pinned_files(index)
+        for directory in (get_temp_dir(), index.directory):
+            uploads_only = directory == index.directory
+            for entry in os.scandir(directory):
+                if not entry.is_file() or entry.name in _RESERVED_NAMES:
+                    continue
+                if uploads_only and (
+                    entry.name in pinned
+                    or (entry.name not in indexed and not _UPLOAD_NAME.match(entry.name))
+                ):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                last_used = max(st.st_mtime, last_access.get(entry.name, 0.0))
+                entries.append((last_used, st.st_size, Path(entry.path)))
+
+        expired = evicted = reclaimed = 0
+        total = sum(size for _, size, _ in entries)
+
+        # 1. TTL
+        remaining = []
+        for last_used, size, path in entries:
+            if now - last_used > cfg["ttl"] and _unlink(path):
+                expired += 1
+                reclaimed += size
+                total -= size
+            else:
+                remaining.append((last_used, size, path))
+
+        # 2. Quota — least recently used first
+        if total > cfg["quota"]:
+            remaining.sort(key=lambda e: e[0])
+            kept = []
+            for last_used, size, path in remaining:
+                if total > cfg["quota"] and now - last_used > _EVICTION_GRACE_SECONDS and _unlink(path):
+                    evicted += 1
+                    reclaimed += size
+                    total -= size
+                else:
+                    kept.append((last_used, size, path))
+            remaining = kept
+            if total > cfg["quota"]:
+                logger.warning(
+                    f"Temp dir still over quota after eviction ({total} > {cfg['quota']} bytes)"
+                )
+
+        live_names = {path.name for _, _, path in remaining}
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._last_access = {n: t for n, t in self._last_access.items() if n in live_names}
+            self._files = len(remaining)
+            self._bytes = total
+            self._expired_total += expired
+            self._evicted_total += evicted
+            self._reclaimed_bytes_total += reclaimed
+            self._sweeps += 1
+            self._last_sweep_at = now
+            self._last_sweep_ms = round(elapsed_ms, 2)
+
+        if expired or evicted:
+            logger.info(
+                f"Temp janitor: expired {expired}, evicted {evicted}, "
+                f"reclaimed {reclaimed} bytes ({len(remaining)} files / {total} bytes left)"
+            )
+        return {"expired": expired, "evicted": evicted, "reclaimed_bytes": reclaimed}
+
+    def get_stats(self) -> dict:
+        cfg = self._cfg()
+        with self._lock:
+            return {
+                "temp_dir": str(get_temp_dir()),
+                "files_dir": str(FileIndex.get_instance().directory),
+                "indexed_files": len(FileIndex.get_instance()),
+                "files": self._files,
+                "bytes": self._bytes,
+                "ttl_hours": cfg["ttl"] / 3600,
+                "quota_bytes": cfg["quota"],
+                "sweep_interval": cfg["interval"],
+                "sweeps": self._sweeps,
+                "last_sweep_at": self._last_sweep_at,
+                "last_sweep_ms": self._last_sweep_ms,
+                "expired_total": self._expired_total,
+                "evicted_total": self._evicted_total,
+                "reclaimed_bytes_total": self._reclaimed_bytes_total,
+                "orphan_dirs_reclaimed_total": self._orphan_dirs_total,
+            }
+
+    # ------------------------------------------------------------------
+    # Background task
+    # ------------------------------------------------------------------
+
+    async def _run(self) -> None:
+        await asyncio.to_thread(self.reclaim_orphan_dirs)
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Temp janitor sweep failed: {e}")
+            await asyncio.sleep(self._cfg()["interval"])
+
+    def start(self) -> asyncio.Task:
+        """Start the background janitor. Safe to call multiple times."""
+        if self._task is not None and not self._task.done():
+            return self._task
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Temp janitor started (every {self._cfg()['interval']}s).")
+        return self._task
+
+    def stop(self) -> None:
+        """Cancel the janitor task on shutdown."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            logger.info("Temp janitor stopped.")
+        self._task = None
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _batch_pinned_files(index: FileIndex) -> set[str]:
+    """Names of the stored files that batches still reference."""
+    from app.services.batch_manager import BatchManager  # imports the Gemini client
+
+    names = set()
+    for file_id in BatchManager.get_instance().referenced_file_ids():
+        path = index.resolve(file_id)
+        if path is not None:
+            names.add(path.name)
+    return names
+
+
+def _unlink(path: Path) -> bool:
+    try:
+        path.unlink()
+        FileIndex.get_instance().remove_blob(path.name)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as exc:
+        logger.warning(f"Temp janitor could not delete {path}: {exc}")
+        return False
+
+
+def _dir_size(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file())
+
+
+def _newest_mtime(path: Path) -> float:
+    newest = path.stat().st_mtime
+    for f in path.rglob("*"):
+        try:
+            newest = max(newest, f.stat().st_mtime)
+        except OSError:
+            continue
+    return newest
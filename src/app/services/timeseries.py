@@ -0,0 +1,176 @@
+# src/app/services/timeseries.py
+"""
+Per-second and per-minute request time series for the live dashboard.
+
+The stats middleware reports each API request as it starts and finishes.
+A background task closes a point every second (and every minute) with the
+request and error counts, latency percentiles and the in-flight counts, and
+appends it to a fixed-size ring:
+
+- ``[Telemetry] timeseries_seconds``: per-second points kept
+- ``[Telemetry] timeseries_minutes``: per-minute points kept
+
+``GET /api/admin/stats/stream`` pushes the rings and each new point over SSE,
+so open dashboards stream updates instead of polling.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import AsyncGenerator, Optional
+
+from app.config import CONFIG
+from app.logger import logger
+from app.services.stats_collector import LatencyHistogram, detach_request_context
+
+
+class _Bucket:
+    __slots__ = ("requests", "errors", "latency", "in_flight_max")
+
+    def __init__(self, in_flight: int = 0):
+        self.requests = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+        self.in_flight_max = in_flight
+
+
+def _point(t: int, bucket: _Bucket, in_flight: int, upstream_in_flight: int) -> dict:
+    return {
+        "t": t,
+        "requests": bucket.requests,
+        "errors": bucket.errors,
+        "p50_ms": bucket.latency.percentile(50),
+        "p95_ms": bucket.latency.percentile(95),
+        "p99_ms": bucket.latency.percentile(99),
+        "in_flight": in_flight,
+        "in_flight_max": bucket.in_flight_max,
+        "upstream_in_flight": upstream_in_flight,
+    }
+
+
+class StatsTimeSeries:
+    """Singleton holding the current buckets, the rings and the SSE subscribers."""
+
+    _instance: Optional["StatsTimeSeries"] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._second = _Bucket()
+        self._minute = _Bucket()
+        self._minute_t = int(time.time()) // 60 * 60  # start of the current minute
+        self._seconds: deque[dict] = deque(
+            maxlen=max(10, CONFIG.getint("Telemetry", "timeseries_seconds", fallback=300))
+        )
+        self._minutes: deque[dict] = deque(
+            maxlen=max(10, CONFIG.getint("Telemetry", "timeseries_minutes", fallback=120))
+        )
+        self._seq = 0  # points published so far
+        self._event = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._clients = 0
+
+    @classmethod
+    def get_instance(cls) -> "StatsTimeSeries":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    # ------------------------------------------------------------------
+    # Recording (stats middleware)
+    # ------------------------------------------------------------------
+
+    def request_started(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+            for bucket in (self._second, self._minute):
+                bucket.in_flight_max = max(bucket.in_flight_max, self._in_flight)
+
+    def request_finished(self, status_code: int, seconds: float) -> None:
+        ms = seconds * 1000
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            for bucket in (self._second, self._minute):
+                bucket.requests += 1
+                if status_code >= 400:
+                    bucket.errors += 1
+                bucket.latency.observe(ms)
+
+    # ------------------------------------------------------------------
+    # Ticker
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        """Start closing points every second. Safe to call multiple times."""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Stats time series started ({self._seconds.maxlen} s / {self._minutes.maxlen} min kept)."
+        )
+
+    def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self) -> None:
+        detach_request_context()
+        while True:
+            # Wake just after each wall-clock second so points line up with it
+            await asyncio.sleep(1 - time.time() % 1 + 0.001)
+            self._close(int(time.time()) - 1)
+
+    def _close(self, second: int) -> None:
+        from models.gemini import UPSTREAM_STATS  # pulls in gemini_webapi
+
+        upstream = UPSTREAM_STATS["in_flight"]
+        with self._lock:
+            in_flight = self._in_flight
+            self._seconds.append(_point(second, self._second, in_flight, upstream))
+            self._second = _Bucket(in_flight)
+            next_minute = (second + 1) // 60 * 60
+            if next_minute != self._minute_t:
+                self._minutes.append(_point(self._minute_t, self._minute, in_flight, upstream))
+                self._minute = _Bucket(in_flight)
+                self._minute_t = next_minute
+            self._seq += 1
+        self._event.set()
+        self._event = asyncio.Event()
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def history(self) -> dict:
+        with self._lock:
+            return {"seconds": list(self._seconds), "minutes": list(self._minutes)}
+
+    async def subscribe(self) -> AsyncGenerator[tuple[str, dict], None]:
+        """
+        Yield ``("history", rings)`` once, then ``("second", point)`` every
+        second and ``("minute", point)`` whenever a minute closes.
+        """
+        self._clients += 1
+        try:
+            yield "history", self.history()
+            seq = self._seq
+            last_minute = self._minutes[-1]["t"] if self._minutes else None
+            while True:
+                await self._event.wait()
+                with self._lock:
+                    missed = min(self._seq - seq, len(self._seconds))
+                    seconds = list(self._seconds)[-missed:] if missed else []
+                    minute = self._minutes[-1] if self._minutes else None
+                    seq = self._seq
+                for point in seconds:
+                    yield "second", point
+                if minute is not None and minute["t"] != last_minute:
+                    last_minute = minute["t"]
+                    yield "minute", minute
+        finally:
+            self._clients -= 1
+
+    @property
+    def client_count(self) -> int:
+        return self._clients
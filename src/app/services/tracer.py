@@ -0,0 +1,276 @@
+# src/app/services/tracer.py
+"""
+Lightweight request tracing with a local trace export.
+
+The stats middleware opens a root span per API request; ``span()`` opens
+child spans anywhere below it (request phases, upstream attempts, image
+fetches, cleanup).  Spans are buffered per request and, when the trace is
+kept, appended to a daily file in ``[Tracing] export_dir``:
+
+- ``otlp``: one OTLP/JSON ``ExportTraceServiceRequest`` per line (the
+  OpenTelemetry collector file-exporter format, readable by Jaeger/Tempo
+  tooling via ``otelcol``'s ``otlpjsonfile`` receiver)
+- ``chrome``: a Chrome trace-event JSON array (chrome://tracing, Perfetto),
+  one row per request
+
+Sampling is decided when the request ends: ``sample_rate`` of all traces,
+plus failed or slow requests with ``keep_slow_and_errors`` and requests
+whose incoming ``traceparent`` header has the sampled flag set.  Kept
+traces are written on the ``io`` executor.
+"""
+import contextvars
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.config import CONFIG
+
+SERVICE_NAME = "webai-to-api"
+TRACES_DIR_NAME = "traces"
+
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+_FILE_SUFFIXES = {"otlp": ".otlp.jsonl", "chrome": ".trace.json"}
+
+
+class Trace:
+    """Spans of one request, collected until the root span ends."""
+
+    __slots__ = ("trace_id", "spans", "forced", "done")
+
+    def __init__(self, trace_id: str, forced: bool = False):
+        self.trace_id = trace_id
+        self.spans: list["Span"] = []
+        self.forced = forced
+        self.done = False
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str], attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: Optional[str] = None) -> None:
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error and not self.error:
+            self.error = error
+        if not self.trace.done:
+            self.trace.spans.append(self)
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("webai_current_span", default=None)
+
+
+def tracing_enabled() -> bool:
+    return CONFIG.getboolean("Tracing", "enabled", fallback=False)
+
+
+def start_trace(name: str, trace_id: str, traceparent: Optional[str] = None, **attributes) -> Optional[Span]:
+    """
+    Open the root span of a request (called by the stats middleware).
+
+    A valid W3C ``traceparent`` header continues the caller's trace instead
+    of *trace_id*.  Returns None when tracing is disabled.
+    """
+    if not tracing_enabled():
+        return None
+    parent_id = None
+    forced = False
+    match = _TRACEPARENT.match((traceparent or "").strip().lower())
+    if match:
+        trace_id, parent_id = match.group(1), match.group(2)
+        forced = bool(int(match.group(3), 16) & 1)
+    root = Span(Trace(trace_id, forced), name, parent_id, attributes)
+    _current_span.set(root)
+    return root
+
+
+def finish_trace(root: Span, status_code: int, elapsed_ms: float, error: Optional[str] = None) -> None:
+    """End the root span and export the trace if it is sampled."""
+    root.set(**{"http.status_code": status_code})
+    root.end(error or (f"HTTP {status_code}" if status_code >= 500 else None))
+    trace = root.trace
+    trace.done = True
+
+    keep = trace.forced or random.random() < CONFIG.getfloat("Tracing", "sample_rate", fallback=0.1)
+    if not keep and CONFIG.getboolean("Tracing", "keep_slow_and_errors", fallback=True):
+        slow_ms = CONFIG.getint("Telemetry", "slow_request_ms", fallback=15000)
+        keep = status_code >= 500 or (0 < slow_ms <= elapsed_ms) or any(s.error for s in trace.spans)
+    if keep:
+        from app.utils.executors import in_event_loop, submit_blocking  # app.logger imports this module
+
+        exporter = TraceExporter.get_instance()
+        if in_event_loop():
+            submit_blocking(exporter.export, trace)  # file appends stay off the loop
+        else:
+            exporter.export(trace)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """
+    Time a block as a child of the current span; exceptions mark it failed.
+    Without an active trace this is a no-op yielding None.
+    """
+    parent = _current_span.get()
+    if parent is None or parent.trace.done:
+        yield None
+        return
+    child = Span(parent.trace, name, parent.span_id, attributes)
+    token = _current_span.set(child)
+    error = None
+    try:
+        yield child
+    except BaseException as exc:
+        error = f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Async generators may be finalized from another context
+            _current_span.set(parent)
+        child.end(error)
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(span_: Span, root: bool) -> dict:
+    record = {
+        "traceId": span_.trace.trace_id,
+        "spanId": span_.span_id,
+        "name": span_.name,
+        "kind": 2 if root else 1,  # SPAN_KIND_SERVER / SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(span_.start_ns),
+        "endTimeUnixNano": str(span_.end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span_.attributes.items()],
+        "status": {"code": 2, "message": span_.error} if span_.error else {"code": 1},
+    }
+    if span_.parent_id:
+        record["parentSpanId"] = span_.parent_id
+    return record
+
+
+class TraceExporter:
+    """Singleton writing kept traces to daily files in the export directory."""
+
+    _instance: Optional["TraceExporter"] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tids = itertools.count(1)
+        self._pruned_day: Optional[str] = None
+        self.exported = 0
+
+    @classmethod
+    def get_instance(cls) -> "TraceExporter":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def export_dir(self) -> Path:
+        configured = CONFIG["Tracing"].get("export_dir", "").strip() if "Tracing" in CONFIG else ""
+        if configured:
+            path = Path(configured).expanduser()
+        else:
+            from app.services.file_index import get_files_dir  # app.logger imports this module
+
+            path = get_files_dir() / TRACES_DIR_NAME
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def export(self, trace: Trace) -> None:
+        formats = [f.strip() for f in CONFIG.get("Tracing", "format", fallback="otlp").split(",") if f.strip()]
+        day = datetime.now().strftime("%Y%m%d")
+        try:
+            directory = self.export_dir()
+            with self._lock:
+                for fmt in formats:
+                    if fmt not in _FILE_SUFFIXES:
+                        continue
+                    path = directory / f"traces-{day}{_FILE_SUFFIXES[fmt]}"
+                    lines = self._otlp(trace) if fmt == "otlp" else self._chrome(trace, not path.exists())
+                    with open(path, "a", encoding="utf-8") as fh:
+                        fh.write(lines)
+                self.exported += 1
+                if self._pruned_day != day:
+                    self._pruned_day = day
+                    self._prune(directory)
+        except OSError as exc:
+            from app.logger import logger
+
+            logger.warning(f"Could not export trace {trace.trace_id}: {exc}")
+
+    def _otlp(self, trace: Trace) -> str:
+        root = trace.spans[-1]
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                    {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": SERVICE_NAME},
+                    "spans": [_otlp_span(s, s is root) for s in trace.spans],
+                }],
+            }]
+        }
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+    def _chrome(self, trace: Trace, new_file: bool) -> str:
+        pid, tid = os.getpid(), next(self._tids)
+        root = trace.spans[-1]
+        events = [{
+            "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+            "args": {"name": f"{root.name} {root.attributes.get('request.id', trace.trace_id)}"},
+        }]
+        for s in sorted(trace.spans, key=lambda s: s.start_ns):
+            args = {**s.attributes, "trace_id": trace.trace_id, "span_id": s.span_id}
+            if s.error:
+                args["error"] = s.error
+            events.append({
+                "name": s.name, "cat": SERVICE_NAME, "ph": "X", "pid": pid, "tid": tid,
+                "ts": s.start_ns / 1000, "dur": (s.end_ns - s.start_ns) / 1000, "args": args,
+            })
+        # JSON array format: viewers accept the missing closing bracket
+        body = "".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + ",\n" for e in events)
+        return ("[\n" if new_file else "") + body
+
+    def _prune(self, directory: Path) -> None:
+        keep_days = CONFIG.getint("Tracing", "retention_days", fallback=3)
+        cutoff = (datetime.now() - timedelta(days=max(1, keep_days) - 1)).strftime("%Y%m%d")
+        for path in directory.glob("traces-*"):
+            if path.name[len("traces-"):len("traces-") + 8] < cutoff:
+                path.unlink(missing_ok=True)
@@ -0,0 +1,301 @@
+# src/app/services/translator.py
+"""
+Bulk translation: many short strings or one long document per request.
+
+- Short strings are deduplicated and packed into numbered, delimiter-tagged
+  batches (``[Translate] pack_size`` strings / ``chunk_chars`` characters).
+- Long documents are split on paragraph, then sentence boundaries into
+  chunks under ``chunk_chars`` and reassembled with the original spacing.
+- Chunks run in parallel (``[Translate] concurrency``) as stateless calls.
+- A persistent translation memory skips segments translated before.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from app.config import CONFIG
+from app.logger import logger
+from app.services.file_index import get_files_dir
+from app.services.micro_batcher import split_numbered_blocks
+
+MEMORY_DIR_NAME = "translation"
+MEMORY_NAME = "memory.jsonl"
+
+_PARAGRAPH_SPLIT = re.compile(r"(\n[ \t]*\n\s*)")
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?。！？…])(\s+)")
+
+
+class TranslationMemory:
+    """Singleton LRU of translated segments, persisted as JSON lines."""
+
+    _instance: Optional["TranslationMemory"] = None
+
+    def __init__(self, path: Optional[Path] = None):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._path = path or get_files_dir() / MEMORY_DIR_NAME / MEMORY_NAME
+        self._appended = 0
+        self._load()
+
+    @classmethod
+    def get_instance(cls) -> "TranslationMemory":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def key(text: str, target: str, source: Optional[str], model: str, instructions: Optional[str]) -> str:
+        raw = "\x1f".join([source or "", target, model, instructions or "", text])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put_many(self, items: dict[str, str]) -> None:
+        if not items:
+            return
+        with self._lock:
+            for key, value in items.items():
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            self._evict()
+            try:
+                with open(self._path, "a", encoding="utf-8") as fh:
+                    for key, value in items.items():
+                        fh.write(json.dumps({"k": key, "v": value}, ensure_ascii=False) + "\n")
+                self._appended += len(items)
+            except OSError as exc:
+                logger.warning(f"Could not persist translation memory: {exc}")
+            if self._appended > self._max_entries():
+                self._compact()
+
+    def clear(self) -> int:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            self._compact()
+        return count
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _max_entries(self) -> int:
+        return max(0, CONFIG.getint("Translate", "memory_entries", fallback=20000))
+
+    def _evict(self) -> None:
+        while len(self._entries) > self._max_entries():
+            self._entries.popitem(last=False)
+
+    def _load(self) -> None:
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        if self._path.exists():
+            with open(self._path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                        self._entries[entry["k"]] = entry["v"]
+                        self._entries.move_to_end(entry["k"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+            self._evict()
+            self._compact()
+        logger.info(f"Translation memory loaded: {len(self._entries)} segment(s)")
+
+    def _compact(self) -> None:
+        tmp = self._path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as fh:
+                for key, value in self._entries.items():
+                    fh.write(json.dumps({"k": key, "v": value}, ensure_ascii=False) + "\n")
+            tmp.replace(self._path)
+            self._appended = 0
+        except OSError as exc:
+            logger.warning(f"Could not compact translation memory: {exc}")
+
+
+# ---------------------------------------------------------------------------
+# Document splitting
+# ---------------------------------------------------------------------------
+
+def split_document(text: str, budget: int) -> list[tuple[str, str]]:
+    """
+    Split *text* into ``(chunk, separator)`` pairs, each chunk at most
+    *budget* characters where possible.  ``"".join(c + s for c, s in ...)``
+    reproduces the input exactly.
+    """
+    # Units keep the whitespace that followed them so spacing survives
+    pieces = _PARAGRAPH_SPLIT.split(text)
+    units: list[tuple[str, str]] = []
+    for i in range(0, len(pieces), 2):
+        paragraph, sep = pieces[i], pieces[i + 1] if i + 1 < len(pieces) else ""
+        if len(paragraph) <= budget:
+            units.append((paragraph, sep))
+            continue
+        sentences = _SENTENCE_SPLIT.split(paragraph)
+        for j in range(0, len(sentences), 2):
+            sentence = sentences[j]
+            inner = sentences[j + 1] if j + 1 < len(sentences) else sep
+            while len(sentence) > budget:
+                # No sentence boundary fits: cut at the last space, else hard cut
+                cut = sentence.rfind(" ", 0, budget)
+                if cut <= 0:
+                    units.append((sentence[:budget], ""))
+                    sentence = sentence[budget:]
+                else:
+                    units.append((sentence[:cut], " "))
+                    sentence = sentence[cut + 1:]
+            units.append((sentence, inner))
+
+    chunks: list[tuple[str, str]] = []
+    current: Optional[str] = None
+    current_sep = ""
+    for unit, sep in units:
+        if current is not None and len(current) + len(current_sep) + len(unit) > budget:
+            chunks.append((current, current_sep))
+            current = None
+        current = unit if current is None else current + current_sep + unit
+        current_sep = sep
+    if current is not None:
+        chunks.append((current, current_sep))
+    return chunks
+
+
+# ---------------------------------------------------------------------------
+# Translation
+# ---------------------------------------------------------------------------
+
+def _describe(target: str, source: Optional[str], instructions: Optional[str]) -> str:
+    line = f"Translate from {source} into {target}." if source else f"Translate into {target}."
+    line += " Preserve placeholders ({name}, %s, {{0}}), markup, line breaks and surrounding whitespace."
+    if instructions:
+        line += f"\nAdditional instructions: {instructions}"
+    return line
+
+
+class BulkTranslator:
+    """Runs one bulk translation request against a Gemini client."""
+
+    def __init__(
+        self,
+        gemini_client,
+        model: str,
+        target: str,
+        source: Optional[str] = None,
+        instructions: Optional[str] = None,
+        use_memory: bool = True,
+    ):
+        self.client = gemini_client
+        self.model = model
+        self.target = target
+        self.source = source
+        self.instructions = instructions
+        use_memory = use_memory and CONFIG.getint("Translate", "memory_entries", fallback=20000) > 0
+        self.memory = TranslationMemory.get_instance() if use_memory else None
+        self.semaphore = asyncio.Semaphore(max(1, CONFIG.getint("Translate", "concurrency", fallback=4)))
+        self.chunk_chars = max(200, CONFIG.getint("Translate", "chunk_chars", fallback=4000))
+        self.stats = {"segments": 0, "cached": 0, "chunks": 0, "upstream_calls": 0, "fallbacks": 0}
+
+    async def translate_texts(self, texts: list[str]) -> list[str]:
+        """Translate a list of strings, preserving order and duplicates."""
+        unique = list(dict.fromkeys(t for t in texts if t.strip()))
+        done = self._from_memory(unique)
+        pending = [t for t in unique if t not in done]
+
+        pack_size = max(1, CONFIG.getint("Translate", "pack_size", fallback=40))
+        batches: list[list[str]] = []
+        for text in pending:
+            if (
+                not batches
+                or len(batches[-1]) >= pack_size
+                or sum(map(len, batches[-1])) + len(text) > self.chunk_chars
+            ):
+                batches.append([])
+            batches[-1].append(text)
+        self.stats["chunks"] = len(batches)
+
+        results = await asyncio.gather(*(self._translate_pack(batch) for batch in batches))
+        fresh = {text: out for result in results for text, out in result.items()}
+        self._remember(fresh)
+        done.update(fresh)
+        return [done.get(t, t) for t in texts]
+
+    async def translate_document(self, document: str) -> str:
+        """Translate a long document chunk by chunk and reassemble it in order."""
+        chunks = split_document(document, self.chunk_chars)
+        texts = [c for c, _ in chunks if c.strip()]
+        done = self._from_memory(list(dict.fromkeys(texts)))
+        pending = list(dict.fromkeys(t for t in texts if t not in done))
+        self.stats["chunks"] = len(pending)
+
+        outputs = await asyncio.gather(*(self._translate_one(t) for t in pending))
+        fresh = dict(zip(pending, outputs))
+        self._remember(fresh)
+        done.update(fresh)
+        return "".join(done.get(c, c) + sep for c, sep in chunks)
+
+    # ------------------------------------------------------------------
+
+    def _key(self, text: str) -> str:
+        return TranslationMemory.key(text, self.target, self.source, self.model, self.instructions)
+
+    def _from_memory(self, texts: list[str]) -> dict[str, str]:
+        self.stats["segments"] += len(texts)
+        if self.memory is None:
+            return {}
+        found = {}
+        for text in texts:
+            cached = self.memory.get(self._key(text))
+            if cached is not None:
+                found[text] = cached
+        self.stats["cached"] += len(found)
+        return found
+
+    def _remember(self, translations: dict[str, str]) -> None:
+        if self.memory is not None:
+            self.memory.put_many({self._key(src): out for src, out in translations.items()})
+
+    async def _call(self, prompt: str) -> str:
+        async with self.semaphore:
+            self.stats["upstream_calls"] += 1
+            response = await self.client.generate_content(message=prompt, model=self.model, files=None)
+        return (response.text or "").strip()
+
+    async def _translate_one(self, text: str) -> str:
+        prompt = (
+            f"{_describe(self.target, self.source, self.instructions)}\n"
+            "Reply with the translation only, no commentary.\n\n"
+            f"{text}"
+        )
+        return await self._call(prompt)
+
+    async def _translate_pack(self, batch: list[str]) -> dict[str, str]:
+        if len(batch) == 1:
+            return {batch[0]: await self._translate_one(batch[0])}
+
+        nonce = uuid.uuid4().hex[:8]
+        prompt = (
+            f"{_describe(self.target, self.source, self.instructions)}\n"
+            f"Translate each of the {len(batch)} numbered segments independently. Reply with every "
+            "segment in exactly the same delimited format, translation only, and end with the END line:\n\n"
+            + "".join(f"@@SEGMENT {i} {nonce}@@\n{text}\n" for i, text in enumerate(batch, 1))
+            + f"@@END {nonce}@@"
+        )
+        answers = split_numbered_blocks(await self._call(prompt), nonce, len(batch), label="SEGMENT")
+        result = {text: answers[i] for i, text in enumerate(batch, 1) if answers.get(i)}
+        missing = [text for text in batch if text not in result]
+        if missing:
+            self.stats["fallbacks"] += len(missing)
+            logger.warning(f"Bulk translate: {len(missing)}/{len(batch)} segment(s) missing, retrying individually")
+            outputs = await asyncio.gather(*(self._translate_one(t) for t in missing))
+            result.update(zip(missing, outputs))
+        return result
@@ -0,0 +1,176 @@
+# src/app/utils/executors.py
+"""
+Named worker pools for blocking work that must stay off the event loop.
+
+- ``io``: thread pool for file writes, moves and unlinks, config writes and
+  browser cookie-DB reads (``[Executors] io_workers``)
+- ``cpu``: thread pool for CPU work on small inputs (``cpu_workers``)
+- ``process``: process pool for CPU work on inputs of at least
+  ``process_threshold_kb`` (``cpu_processes``); ``run_cpu`` picks it by size
+- ``image`` / ``pdf``: the image preprocessing threads and PDF worker
+  processes (``[Images] preprocess_workers``, ``[PDF] workers``)
+
+Pools are created on first use.  Each one tracks how many calls are in
+flight and how many of those are waiting for a worker (``queued``); the
+figures are exposed in ``stats.executors`` and ``/metrics``.
+
+Functions run in a process pool must be module-level (picklable) and must
+not depend on per-process state such as the temp directory — pass explicit
+paths instead.
+"""
+import asyncio
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from app.config import CONFIG
+from app.logger import logger
+
+T = TypeVar("T")
+
+# name -> (kind, config section, option, fallback worker count)
+_POOL_SPECS: dict[str, tuple[str, str, str, int]] = {
+    "io": ("thread", "Executors", "io_workers", 4),
+    "cpu": ("thread", "Executors", "cpu_workers", 2),
+    "process": ("process", "Executors", "cpu_processes", 2),
+    "image": ("thread", "Images", "preprocess_workers", 2),
+    "pdf": ("process", "PDF", "workers", 2),
+}
+
+
+class _Pool:
+    __slots__ = ("name", "kind", "workers", "executor", "in_flight", "peak_queued", "completed", "failed")
+
+    def __init__(self, name: str, kind: str, workers: int):
+        self.name = name
+        self.kind = kind
+        self.workers = workers
+        if kind == "process":
+            self.executor: Executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+        self.in_flight = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.failed = 0
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+
+_pools: dict[str, _Pool] = {}
+_lock = threading.Lock()
+
+
+def _get_pool(name: str) -> _Pool:
+    pool = _pools.get(name)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(name)
+            if pool is None:
+                kind, section, option, fallback = _POOL_SPECS[name]
+                workers = max(1, CONFIG.getint(section, option, fallback=fallback))
+                pool = _pools[name] = _Pool(name, kind, workers)
+    return pool
+
+
+def _submit(name: str, fn: Callable, *args, **kwargs) -> Future:
+    pool = _get_pool(name)
+    with _lock:
+        pool.in_flight += 1
+        pool.peak_queued = max(pool.peak_queued, pool.queued)
+
+    def done(future: Future) -> None:
+        with _lock:
+            pool.in_flight -= 1
+            if future.cancelled() or future.exception() is not None:
+                pool.failed += 1
+            else:
+                pool.completed += 1
+
+    try:
+        future = pool.executor.submit(fn, *args, **kwargs)
+    except BaseException:
+        with _lock:
+            pool.in_flight -= 1
+        raise
+    future.add_done_callback(done)
+    return future
+
+
+async def run_in_pool(name: str, fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run ``fn(*args, **kwargs)`` in the named pool and await its result."""
+    return await asyncio.wrap_future(_submit(name, fn, *args, **kwargs))
+
+
+async def run_blocking(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run blocking I/O (disk, sqlite, config writes) in the ``io`` pool."""
+    return await run_in_pool("io", fn, *args, **kwargs)
+
+
+async def run_cpu(fn: Callable[..., T], *args, size: int = 0, **kwargs) -> T:
+    """
+    Run CPU-bound ``fn(*args, **kwargs)`` off the event loop.
+
+    Inputs of *size* bytes at or above ``[Executors] process_threshold_kb``
+    go to the process pool, where they do not compete with the loop for the
+    GIL; smaller ones to the ``cpu`` thread pool, avoiding the pickling cost.
+    A threshold of 0 disables the process pool.
+    """
+    threshold = CONFIG.getint("Executors", "process_threshold_kb", fallback=1024) * 1024
+    name = "process" if 0 < threshold <= size else "cpu"
+    return await run_in_pool(name, fn, *args, **kwargs)
+
+
+def submit_blocking(fn: Callable, *args, **kwargs) -> None:
+    """
+    Fire-and-forget variant of ``run_blocking`` for work nobody waits on
+    (e.g. deleting temp files); failures are logged.
+    """
+    def log_failure(future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Background {getattr(fn, '__name__', 'task')} failed: {future.exception()}")
+
+    _submit("io", fn, *args, **kwargs).add_done_callback(log_failure)
+
+
+def in_event_loop() -> bool:
+    """True when called from a thread that is running an event loop."""
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def executor_stats() -> dict[str, dict]:
+    """Per-pool worker count, calls in flight / waiting and totals."""
+    with _lock:
+        return {
+            name: {
+                "kind": pool.kind,
+                "workers": pool.workers,
+                "in_flight": pool.in_flight,
+                "queued": pool.queued,
+                "peak_queued": pool.peak_queued,
+                "completed": pool.completed,
+                "failed": pool.failed,
+            }
+            for name, pool in _pools.items()
+        }
+
+
+def shutdown_executors() -> None:
+    """
+    Stop all pools (called on application shutdown).  Worker processes are
+    stopped without waiting; queued thread work (temp file cleanup) still runs.
+    """
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        if pool.kind == "process":
+            pool.executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            pool.executor.shutdown(wait=False)
@@ -1,25 +1,95 @@
 # src/app/utils/image_utils.py
 """
 Utilities for image processing: base64 decoding, URL downloading,
-Gemini response serialization, and temp file management.
+pre-upload downscaling, Gemini response serialization, and temp file management.
 """
 
+import asyncio
 import base64
+import binascii
 import hashlib
-import re
+import os
 import tempfile
+import threading
 import time
+import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
 
 import httpx
 
+from app.config import CONFIG
 from app.logger import logger
+from app.services.stats_collector import request_phase
+from app.services.tracer import span
+from app.utils.executors import in_event_loop, run_in_pool, submit_blocking
+
+# Pillow is optional — only needed for the [Images] preprocess stage
+try:
+    from PIL import Image, ImageOps
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+# POSIX only — used to mark temp directories as owned by a live process
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 # ---------------------------------------------------------------------------
-# Temp directory — created once per process lifetime
+# Temp directory — created on first use, once per process lifetime
 # ---------------------------------------------------------------------------
-_TEMP_DIR: Path = Path(tempfile.mkdtemp(prefix="webai_uploads_"))
+TEMP_DIR_PREFIX = "webai_uploads_"
+OWNER_LOCK_NAME = ".owner.lock"
+
+# Lazy, so worker processes importing this module do not create their own
+_TEMP_DIR: Optional[Path] = None
+_TEMP_DIR_LOCK = None
+_temp_dir_guard = threading.Lock()
+
+
+def _claim_temp_dir(path: Path):
+    """
+    Hold an exclusive lock on ``<path>/.owner.lock`` for the life of the process,
+    so janitors in later processes can tell live directories from orphans
+    (unlike PIDs, locks are released when the owner dies, even in containers).
+    """
+    if fcntl is None:
+        return None
+    try:
+        fh = open(path / OWNER_LOCK_NAME, "w")
+        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        fh.write(str(os.getpid()))
+        fh.flush()
+        return fh
+    except OSError as exc:
+        logger.warning(f"Could not lock temp dir {path}: {exc}")
+        return None
+
+
+def is_temp_dir_orphaned(path: Path) -> Optional[bool]:
+    """
+    Tell whether another process's temp directory has been abandoned.
+
+    Returns True if its owner lock can be taken (owner is gone), False if a
+    live process holds it, and None when that cannot be determined (no lock
+    file, or no ``fcntl`` on this platform).
+    """
+    lock_path = path / OWNER_LOCK_NAME
+    if fcntl is None or not lock_path.exists():
+        return None
+    try:
+        with open(lock_path, "a") as fh:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return False
+            fcntl.flock(fh, fcntl.LOCK_UN)
+            return True
+    except OSError:
+        return None
 
 _MIME_TO_EXT: dict[str, str] = {
     "image/jpeg": ".jpg",
@@ -33,65 +103,226 @@ _MIME_TO_EXT: dict[str, str] = {
 
 ALLOWED_MIME_TYPES: set[str] = set(_MIME_TO_EXT.keys())
 
+# Base64 text is decoded in slices of this many characters (multiple of 4)
+_B64_CHUNK_CHARS = 256 * 1024
+
+# Remote downloads are read in chunks of this size
+_DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+
+class InlineDataTooLarge(ValueError):
+    """Raised when a decoded inline (base64) payload exceeds the configured limit."""
+    pass
+
+
+class DownloadRejected(ValueError):
+    """Raised when a remote image is refused (too large or not an image)."""
+    pass
+
 
 def get_temp_dir() -> Path:
     """Return the shared temp directory for this process."""
+    global _TEMP_DIR, _TEMP_DIR_LOCK
+    if _TEMP_DIR is None:
+        with _temp_dir_guard:
+            if _TEMP_DIR is None:
+                path = Path(tempfile.mkdtemp(prefix=TEMP_DIR_PREFIX))
+                _TEMP_DIR_LOCK = _claim_temp_dir(path)
+                _TEMP_DIR = path
     _TEMP_DIR.mkdir(parents=True, exist_ok=True)
     return _TEMP_DIR
 
 
 def _unique_name(prefix: str, ext: str) -> str:
     ts = int(time.time() * 1000)
-    return f"{prefix}_{ts}{ext}"
+    return f"{prefix}_{ts}_{uuid.uuid4().hex[:8]}{ext}"
 
 
 # ---------------------------------------------------------------------------
 # Decode base64 data URI → temp file
 # ---------------------------------------------------------------------------
-def decode_base64_to_tempfile(data_uri: str) -> Path:
+def parse_data_uri_header(header: str) -> Optional[str]:
+    """
+    Parse the part of a data URI before the comma (``data:<mime>[;...];base64``).
+
+    Returns the MIME type for base64 URIs, None for anything else.
+    """
+    if not header.startswith("data:"):
+        return None
+    params = header[len("data:"):].split(";")
+    if len(params) < 2 or params[-1].strip().lower() != "base64":
+        return None
+    return params[0].strip().lower()
+
+
+class Base64FileSink:
+    """
+    Incremental base64 decoder that writes straight to a temp file.
+
+    Base64 text can be fed in arbitrarily sized pieces; only the trailing
+    partial quad is kept between writes, so memory stays O(chunk).
+    Raises InlineDataTooLarge as soon as the decoded size passes ``max_bytes``.
+    The file goes to *directory*, by default this process's temp dir.
+    """
+
+    def __init__(self, mime_type: str, max_bytes: Optional[int] = None, directory: Optional[Path] = None):
+        ext = _MIME_TO_EXT.get(mime_type, ".bin")
+        self.path: Path = (directory or get_temp_dir()) / _unique_name("b64", ext)
+        self.size = 0
+        self._max_bytes = max_bytes
+        self._pending = b""
+        self._fh = open(self.path, "wb")
+
+    def write(self, data: bytes) -> None:
+        data = data.translate(None, b" \t\r\n")
+        if not data:
+            return
+        if self._pending:
+            data = self._pending + data
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        if usable:
+            self._emit(data[:usable] if usable != len(data) else data)
+
+    def _emit(self, b64: bytes) -> None:
+        try:
+            raw = binascii.a2b_base64(b64)
+        except binascii.Error as exc:
+            raise ValueError(f"Invalid base64 data: {exc}") from exc
+        self.size += len(raw)
+        if self._max_bytes is not None and self.size > self._max_bytes:
+            raise InlineDataTooLarge(
+                f"Inline data exceeds the {self._max_bytes // (1024 * 1024)} MB limit"
+            )
+        self._fh.write(raw)
+
+    def close(self) -> Path:
+        """Flush the remaining input and close the file. Returns its path."""
+        try:
+            if self._pending:
+                pending, self._pending = self._pending, b""
+                self._emit(pending + b"=" * (-len(pending) % 4))
+        finally:
+            self._fh.close()
+        return self.path
+
+    def abort(self) -> None:
+        """Close and delete the partially written file."""
+        self._fh.close()
+        self.path.unlink(missing_ok=True)
+
+
+def decode_base64_to_tempfile(
+    data_uri: str, max_bytes: Optional[int] = None, directory: Optional[Path] = None
+) -> Path:
     """
     Decode a base64 data URI (``data:<mime>;base64,<data>``) to a temp file.
 
+    The payload is decoded in slices, so no full-size copy of the string or
+    of the decoded bytes is held in memory.  Pass *directory* (the caller's
+    ``get_temp_dir()``) when running in a worker process.
+
     Returns the Path of the saved file.
-    Raises ValueError for invalid format.
+    Raises ValueError for invalid format (InlineDataTooLarge over ``max_bytes``).
     """
-    match = re.match(r"data:([^;]+);base64,(.+)", data_uri, re.DOTALL)
-    if not match:
+    comma = data_uri.find(",", 0, 256)
+    mime_type = parse_data_uri_header(data_uri[:comma]) if comma > 0 else None
+    if mime_type is None:
         raise ValueError(f"Invalid data URI: {data_uri[:60]}…")
 
-    mime_type = match.group(1).strip()
-    b64_data = match.group(2).strip()
-    ext = _MIME_TO_EXT.get(mime_type, ".bin")
-
-    raw = base64.b64decode(b64_data)
-    dest = get_temp_dir() / _unique_name("b64", ext)
-    dest.write_bytes(raw)
-    logger.debug(f"Decoded base64 → {dest} ({len(raw)} bytes)")
+    sink = Base64FileSink(mime_type, max_bytes, directory)
+    try:
+        for start in range(comma + 1, len(data_uri), _B64_CHUNK_CHARS):
+            piece = data_uri[start:start + _B64_CHUNK_CHARS]
+            sink.write(piece.encode("ascii", errors="ignore"))
+        dest = sink.close()
+    except Exception:
+        sink.abort()
+        raise
+    logger.debug(f"Decoded base64 → {dest} ({sink.size} bytes)")
     return dest
 
 
+# ---------------------------------------------------------------------------
+# Streaming, size-capped image download
+# ---------------------------------------------------------------------------
+def _download_limits() -> tuple[int, float]:
+    """Return ``(max_bytes, timeout_seconds)`` for remote image downloads."""
+    max_mb = CONFIG.getint("Images", "max_download_mb", fallback=20)
+    timeout = CONFIG.getfloat("Images", "download_timeout", fallback=30.0)
+    return max_mb * 1024 * 1024, timeout
+
+
+@asynccontextmanager
+async def _open_image_stream(url: str, cookies: Optional[dict] = None, declared_type: Optional[str] = None):
+    """
+    Open a streaming GET for an image or PDF and yield ``(content_type, chunks)``.
+
+    The body is never buffered: ``chunks`` is an async iterator of at most
+    ``_DOWNLOAD_CHUNK_BYTES`` pieces.  ``declared_type`` (the client's
+    ``mimeType``) stands in when the server sends no or a generic type.
+    Raises DownloadRejected before reading the body when the MIME type is
+    neither an image nor in ``ALLOWED_MIME_TYPES`` or ``Content-Length`` is
+    over the limit, and while iterating once the streamed size passes it.
+    """
+    max_bytes, timeout = _download_limits()
+    async with httpx.AsyncClient(timeout=timeout, cookies=cookies or {}) as client:
+        async with client.stream("GET", url, follow_redirects=True) as resp:
+            resp.raise_for_status()
+
+            # A missing Content-Type is tolerated; an explicit unsupported one is not
+            content_type = resp.headers.get("content-type", "").split(";")[0].strip().lower()
+            if content_type in ("", "application/octet-stream", "binary/octet-stream") and declared_type:
+                content_type = declared_type.lower()
+            if content_type and not (content_type.startswith("image/") or content_type in ALLOWED_MIME_TYPES):
+                raise DownloadRejected(f"Not an image or PDF (content-type: {content_type})")
+
+            declared = resp.headers.get("content-length", "")
+            if declared.isdigit() and int(declared) > max_bytes:
+                raise DownloadRejected(
+                    f"Content-Length {declared} exceeds the {max_bytes} byte limit"
+                )
+
+            async def chunks():
+                received = 0
+                async for chunk in resp.aiter_bytes(_DOWNLOAD_CHUNK_BYTES):
+                    received += len(chunk)
+                    if received > max_bytes:
+                        raise DownloadRejected(f"Body exceeds the {max_bytes} byte limit")
+                    yield chunk
+
+            yield content_type, chunks()
+
+
 # ---------------------------------------------------------------------------
 # Download URL → temp file
 # ---------------------------------------------------------------------------
-async def download_to_tempfile(url: str, cookies: Optional[dict] = None) -> Optional[Path]:
+async def download_to_tempfile(
+    url: str, cookies: Optional[dict] = None, mime_type: Optional[str] = None
+) -> Optional[Path]:
     """
-    Download an image/file from *url* into a temp file.
+    Stream an image or PDF from *url* into a temp file, chunk by chunk.
 
-    ``cookies`` is forwarded for authenticated Gemini URLs (generated images).
-    Returns the Path on success, None on failure.
+    ``cookies`` is forwarded for authenticated Gemini URLs (generated images);
+    ``mime_type`` is the type declared by the client, used when the server
+    sends none.  Returns the Path on success, None on failure (including
+    oversize bodies and unsupported content types — see ``[Images]`` in config).
     """
+    dest: Optional[Path] = None
     try:
-        async with httpx.AsyncClient(timeout=30, cookies=cookies or {}) as client:
-            resp = await client.get(url, follow_redirects=True)
-            resp.raise_for_status()
-
-            content_type = resp.headers.get("content-type", "").split(";")[0].strip()
+        async with _open_image_stream(url, cookies, mime_type) as (content_type, chunks):
             ext = _MIME_TO_EXT.get(content_type, ".jpg")
             dest = get_temp_dir() / _unique_name("dl", ext)
-            dest.write_bytes(resp.content)
-            logger.debug(f"Downloaded {url} → {dest} ({len(resp.content)} bytes)")
-            return dest
+            size = 0
+            with open(dest, "wb") as fh:
+                async for chunk in chunks:
+                    fh.write(chunk)
+                    size += len(chunk)
+        logger.debug(f"Downloaded {url} → {dest} ({size} bytes)")
+        return dest
     except Exception as exc:
+        if dest is not None:
+            dest.unlink(missing_ok=True)
         logger.warning(f"Failed to download {url}: {exc}")
         return None
 
@@ -103,21 +334,184 @@ async def fetch_image_as_base64(url: str, cookies: Optional[dict] = None) -> str
     """
     Download an image from *url* and return it as a ``data:<mime>;base64,<data>`` string.
 
+    The body is base64-encoded incrementally as it streams in, so the raw
+    bytes are never held in full next to their encoding.
     Returns empty string on failure.
     """
     try:
-        async with httpx.AsyncClient(timeout=30, cookies=cookies or {}) as client:
-            resp = await client.get(url, follow_redirects=True)
-            resp.raise_for_status()
-
-            content_type = resp.headers.get("content-type", "image/png").split(";")[0].strip()
-            b64 = base64.b64encode(resp.content).decode()
-            return f"data:{content_type};base64,{b64}"
+        async with _open_image_stream(url, cookies) as (content_type, chunks):
+            encoded: list[str] = []
+            carry = b""
+            async for chunk in chunks:
+                data = carry + chunk
+                usable = len(data) - len(data) % 3
+                carry = data[usable:]
+                if usable:
+                    encoded.append(base64.b64encode(data[:usable]).decode())
+            if carry:
+                encoded.append(base64.b64encode(carry).decode())
+        return f"data:{content_type or 'image/png'};base64,{''.join(encoded)}"
     except Exception as exc:
         logger.warning(f"Failed to fetch image as base64 from {url}: {exc}")
         return ""
 
 
+# ---------------------------------------------------------------------------
+# Pre-upload downscaling / recompression
+# ---------------------------------------------------------------------------
+# Formats we re-encode; GIFs (possibly animated) and PDFs are left alone
+_PREPROCESS_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+_OUTPUT_FORMATS = {"jpeg": ".jpg", "webp": ".webp"}
+
+_warned_no_pil = False
+
+
+def _max_edge_for_detail(detail: Optional[str]) -> int:
+    """Map the OpenAI ``detail`` hint (low | high | auto) to a max edge in pixels."""
+    detail = (detail or "auto").lower()
+    if detail == "low":
+        return CONFIG.getint("Images", "low_detail_max_edge", fallback=512)
+    if detail == "high":
+        return CONFIG.getint("Images", "high_detail_max_edge", fallback=2048)
+    return CONFIG.getint("Images", "max_edge", fallback=1536)
+
+
+def _preprocess_image_sync(src: Path, max_edge: int, fmt: str, quality: int) -> Optional[Path]:
+    """
+    Downscale *src* to fit ``max_edge`` and re-encode it as *fmt*.
+
+    EXIF orientation is applied before saving; no metadata is copied to the
+    output.  Returns the new temp file, or None for animated images.
+    Runs in the image worker pool.
+    """
+    with Image.open(src) as img:
+        if getattr(img, "is_animated", False):
+            return None
+        out = ImageOps.exif_transpose(img)
+        out.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        if fmt == "jpeg":
+            if out.mode in ("RGBA", "LA", "P"):
+                rgba = out.convert("RGBA")
+                out = Image.new("RGB", rgba.size, (255, 255, 255))
+                out.paste(rgba, mask=rgba.getchannel("A"))
+            elif out.mode != "RGB":
+                out = out.convert("RGB")
+            save_kwargs = {"quality": quality, "optimize": True}
+        else:
+            if out.mode not in ("RGB", "RGBA"):
+                out = out.convert("RGBA" if "A" in out.getbands() or out.mode == "P" else "RGB")
+            save_kwargs = {"quality": quality, "method": 4}
+
+        dest = get_temp_dir() / _unique_name("pp", _OUTPUT_FORMATS[fmt])
+        out.save(dest, format=fmt.upper(), **save_kwargs)
+    return dest
+
+
+async def preprocess_image(path: Path, detail: Optional[str] = "auto") -> Path:
+    """
+    Optionally downscale and recompress an image before it is uploaded to Gemini.
+
+    Controlled by ``[Images] preprocess``; a no-op when disabled, when Pillow
+    is not installed, or for non-image / animated files.  ``detail`` follows the
+    OpenAI vision field (``low`` | ``high`` | ``auto``) and selects the max edge.
+
+    Returns the path of a new temp file, or *path* unchanged.  The input file
+    is never modified or deleted — the caller decides what to clean up.
+    """
+    global _warned_no_pil
+    if not CONFIG.getboolean("Images", "preprocess", fallback=False):
+        return path
+    if not HAS_PIL:
+        if not _warned_no_pil:
+            logger.warning("[Images] preprocess is enabled but Pillow is not installed — skipping.")
+            _warned_no_pil = True
+        return path
+    if path.suffix.lower() not in _PREPROCESS_EXTS:
+        return path
+
+    fmt = CONFIG["Images"].get("output_format", "jpeg").strip().lower()
+    if fmt not in _OUTPUT_FORMATS:
+        fmt = "jpeg"
+    quality = CONFIG.getint("Images", "quality", fallback=85)
+    max_edge = _max_edge_for_detail(detail)
+
+    try:
+        dest = await run_in_pool("image", _preprocess_image_sync, path, max_edge, fmt, quality)
+    except Exception as exc:
+        logger.warning(f"Image preprocessing failed for {path.name}, uploading original: {exc}")
+        return path
+    if dest is None:
+        return path
+
+    logger.debug(
+        f"Preprocessed {path.name} → {dest.name} "
+        f"({path.stat().st_size} → {dest.stat().st_size} bytes, max_edge={max_edge})"
+    )
+    return dest
+
+
+# ---------------------------------------------------------------------------
+# Near-duplicate frame suppression
+# ---------------------------------------------------------------------------
+def _dhash_sync(path: Path) -> Optional[int]:
+    """64-bit difference hash of an image (None if it cannot be read)."""
+    try:
+        with Image.open(path) as img:
+            small = img.convert("L").resize((9, 8), Image.Resampling.BILINEAR)
+    except Exception:
+        return None
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+async def drop_near_duplicate_frames(paths: list[Path]) -> tuple[list[Path], list[Path]]:
+    """
+    Drop images that are perceptually near-identical to an earlier one.
+
+    Controlled by ``[Images] dedupe_frames``; each image's difference hash is
+    compared against every frame kept so far and the image is dropped when the
+    Hamming distance is below ``dedupe_threshold``.  Non-image files and
+    unreadable images are always kept; order is preserved.
+
+    Returns ``(kept, dropped)``.  Dropped files are not deleted.
+    """
+    if not CONFIG.getboolean("Images", "dedupe_frames", fallback=False) or len(paths) < 2:
+        return paths, []
+    if not HAS_PIL:
+        return paths, []
+
+    threshold = CONFIG.getint("Images", "dedupe_threshold", fallback=6)
+    async def _hash(path: Path) -> Optional[int]:
+        if path.suffix.lower() not in _PREPROCESS_EXTS | {".gif"}:
+            return None
+        return await run_in_pool("image", _dhash_sync, path)
+
+    with request_phase("dedupe"):
+        hashes = await asyncio.gather(*(_hash(p) for p in paths))
+
+    kept: list[Path] = []
+    dropped: list[Path] = []
+    kept_hashes: list[int] = []
+    for path, h in zip(paths, hashes):
+        if h is not None and any(bin(h ^ k).count("1") < threshold for k in kept_hashes):
+            dropped.append(path)
+            continue
+        kept.append(path)
+        if h is not None:
+            kept_hashes.append(h)
+
+    if dropped:
+        logger.info(f"Dropped {len(dropped)} near-duplicate frame(s) of {len(paths)}")
+    return kept, dropped
+
+
 # ---------------------------------------------------------------------------
 # Serialize GeminiResponse images → list[dict]
 # ---------------------------------------------------------------------------
@@ -141,7 +535,8 @@ async def serialize_response_images(response, gemini_cookies: Optional[dict] = N
 
     # Web images — publicly accessible URLs
     for img in chosen.web_images:
-        b64 = await fetch_image_as_base64(img.url)
+        with request_phase("images", type="web_image"):
+            b64 = await fetch_image_as_base64(img.url)
         result.append({
             "type": "web_image",
             "url": img.url,
@@ -152,7 +547,8 @@ async def serialize_response_images(response, gemini_cookies: Optional[dict] = N
 
     # Generated images — may require auth cookies
     for img in chosen.generated_images:
-        b64 = await fetch_image_as_base64(img.url, cookies=gemini_cookies)
+        with request_phase("images", type="generated_image"):
+            b64 = await fetch_image_as_base64(img.url, cookies=gemini_cookies)
         result.append({
             "type": "generated_image",
             "url": img.url,
@@ -167,12 +563,28 @@ async def serialize_response_images(response, gemini_cookies: Optional[dict] = N
 # ---------------------------------------------------------------------------
 # Cleanup temp files
 # ---------------------------------------------------------------------------
-def cleanup_temp_files(paths: list[Path]) -> None:
-    """Delete a list of temp files, logging any errors."""
+def _unlink_temp_files(paths: list[Path]) -> None:
+    temp_dir = get_temp_dir()
     for p in paths:
         try:
-            if p and p.exists() and p.is_relative_to(_TEMP_DIR):
+            if p and p.exists() and p.is_relative_to(temp_dir):
                 p.unlink()
                 logger.debug(f"Cleaned up temp file: {p}")
         except Exception as exc:
             logger.warning(f"Failed to delete temp file {p}: {exc}")
+
+
+def cleanup_temp_files(paths: list[Path]) -> None:
+    """
+    Delete a list of temp files, logging any errors.
+
+    Called from the event loop, the unlinks are handed to the ``io`` pool
+    and this returns immediately; elsewhere they run inline.
+    """
+    if not paths:
+        return
+    with span("cleanup", files=len(paths)):
+        if in_event_loop():
+            submit_blocking(_unlink_temp_files, list(paths))
+        else:
+            _unlink_temp_files(paths)
@@ -0,0 +1,277 @@
+# src/app/utils/json_ingest.py
+"""
+Streaming ingestion of JSON request bodies that carry inline base64 images.
+
+The request body is scanned chunk by chunk as it arrives.  A base64 data URI
+(``"data:image/png;base64,..."``) in an image or file position — the value of
+``image_url``, ``image_url.url`` or ``file_data`` — is decoded incrementally
+straight into a temp file and replaced in the body by a ``"file://<file_id>"``
+reference, which the multimodal extraction path already resolves.  Strings
+anywhere else (message text, instructions, ...) are passed through
+unchanged.  Only the remaining (small) JSON is ever parsed, so peak memory
+for an image request stays close to one read chunk instead of several
+full-size copies of the base64 text.
+"""
+
+import json
+import re
+from pathlib import Path
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from app.logger import logger
+from app.utils.image_utils import (
+    ALLOWED_MIME_TYPES,
+    Base64FileSink,
+    cleanup_temp_files,
+    parse_data_uri_header,
+)
+
+# Longest ``data:<mime>;...;base64`` header we look at before giving up
+_PROBE_LIMIT = 128
+_DATA_PREFIX = b"data:"
+
+_STRING_STOP = re.compile(rb'["\\]')
+_PROBE_STOP = re.compile(rb'["\\,]')
+_STRUCTURE = re.compile(rb'[{}\[\],]')
+
+# Object keys whose string value may be an inline data URI, and the key of
+# the enclosing object for nested ones (``"image_url": {"url": "data:..."}``)
+_DATA_KEYS = {b"image_url", b"file_data"}
+_NESTED_DATA_KEYS = {(b"image_url", b"url")}
+_KEY_LIMIT = 64
+
+# Scanner states
+_OUTSIDE = 0   # between JSON strings
+_PROBE = 1     # at the start of a string, deciding whether it is a data URI
+_STRING = 2    # inside an ordinary string (copied through)
+_DATA = 3      # inside a base64 data URI payload (decoded to disk)
+
+
+class _InlineDataExtractor:
+    """
+    Byte-level JSON scanner that diverts base64 data URIs in image/file
+    positions into temp files.
+
+    It follows the container nesting and the current object key, which is
+    enough to tell ``image_url`` / ``file_data`` values from any other string.
+    """
+
+    def __init__(self, max_inline_bytes: Optional[int]):
+        self.paths: List[Path] = []
+        self._max_inline_bytes = max_inline_bytes
+        self._out = bytearray()
+        self._state = _OUTSIDE
+        self._probe = bytearray()
+        self._escape = False
+        self._sink: Optional[Base64FileSink] = None
+        # Open containers: (is_object, key the container is the value of)
+        self._stack: List[Tuple[bool, Optional[bytes]]] = []
+        self._expect_key = False
+        self._key: Optional[bytes] = None  # current key of the innermost object
+        self._key_buf: Optional[bytearray] = None  # set while copying a key string
+
+    def feed(self, chunk: bytes) -> None:
+        pos, n = 0, len(chunk)
+        out = self._out
+        while pos < n:
+            if self._state == _OUTSIDE:
+                q = chunk.find(b'"', pos)
+                end = n if q < 0 else q
+                self._track_structure(chunk, pos, end)
+                out += chunk[pos:end]
+                if q < 0:
+                    return
+                pos = q + 1
+                if self._in_data_position():
+                    self._probe.clear()
+                    self._state = _PROBE
+                else:
+                    if self._stack and self._stack[-1][0] and self._expect_key:
+                        self._key_buf = bytearray()
+                    out += b'"'
+                    self._state = _STRING
+
+            elif self._state == _PROBE:
+                if self._escape:
+                    # Escape split across chunks; only ``\/`` stays a candidate
+                    self._escape = False
+                    if chunk[pos] == ord("/"):
+                        self._probe += b"/"
+                        pos += 1
+                    else:
+                        self._fall_back(escape=True)
+                    continue
+                room = _PROBE_LIMIT - len(self._probe)
+                m = _PROBE_STOP.search(chunk, pos, min(n, pos + room))
+                end = m.start() if m else min(n, pos + room)
+                self._probe += chunk[pos:end]
+                pos = end
+                if not _DATA_PREFIX.startswith(bytes(self._probe[:len(_DATA_PREFIX)])):
+                    self._fall_back()
+                elif m is None:
+                    if len(self._probe) >= _PROBE_LIMIT:
+                        self._fall_back()
+                elif chunk[pos] == ord("\\"):
+                    # Some encoders write ``image\/png`` in the header
+                    if pos + 1 == n:
+                        self._escape = True
+                        pos += 1
+                    elif chunk[pos + 1] == ord("/"):
+                        self._probe += b"/"
+                        pos += 2
+                    else:
+                        self._fall_back()
+                elif chunk[pos] == ord(",") and self._open_sink():
+                    pos += 1
+                else:
+                    # Closing quote, or a comma in a non-base64 URI
+                    self._fall_back()
+
+            elif self._state == _STRING:
+                if self._escape:
+                    self._copy_string(chunk[pos:pos + 1])
+                    pos += 1
+                    self._escape = False
+                    continue
+                m = _STRING_STOP.search(chunk, pos)
+                if m is None:
+                    self._copy_string(chunk[pos:])
+                    return
+                i = m.start()
+                self._copy_string(chunk[pos:i + 1])
+                pos = i + 1
+                if chunk[i] == ord('"'):
+                    self._state = _OUTSIDE
+                    if self._key_buf is not None:
+                        key = bytes(self._key_buf[:-1])
+                        self._key = key if len(key) <= _KEY_LIMIT else None
+                        self._key_buf = None
+                        self._expect_key = False
+                else:
+                    self._escape = True
+
+            else:  # _DATA
+                if self._escape:
+                    escaped = chunk[pos:pos + 1]
+                    if escaped == b"/":
+                        self._sink.write(b"/")
+                    elif escaped not in (b"n", b"r", b"t"):
+                        raise ValueError("Unexpected escape sequence in base64 data URI")
+                    pos += 1
+                    self._escape = False
+                    continue
+                m = _STRING_STOP.search(chunk, pos)
+                if m is None:
+                    self._sink.write(chunk[pos:])
+                    return
+                i = m.start()
+                self._sink.write(chunk[pos:i])
+                pos = i + 1
+                if chunk[i] == ord('"'):
+                    self._close_sink()
+                else:
+                    self._escape = True
+
+    def finish(self) -> bytes:
+        if self._state == _DATA:
+            raise ValueError("Request body ended inside a base64 data URI")
+        if self._state == _PROBE:
+            self._fall_back(escape=self._escape)
+        return bytes(self._out)
+
+    def abort(self) -> None:
+        """Drop everything written so far (partial and completed files)."""
+        if self._sink is not None:
+            self._sink.abort()
+            self._sink = None
+        cleanup_temp_files(self.paths)
+        self.paths = []
+
+    # -- helpers ----------------------------------------------------------
+
+    def _track_structure(self, chunk: bytes, start: int, end: int) -> None:
+        """Follow ``{ } [ ] ,`` between strings (``:`` needs no handling)."""
+        for m in _STRUCTURE.finditer(chunk, start, end):
+            c = chunk[m.start()]
+            if c in b"{[":
+                parent_key = self._key if self._stack and self._stack[-1][0] else None
+                self._stack.append((c == ord("{"), parent_key))
+                self._expect_key = c == ord("{")
+                self._key = None
+            elif c in b"}]":
+                if self._stack:
+                    self._stack.pop()
+                self._expect_key = False
+            elif self._stack and self._stack[-1][0]:  # comma inside an object
+                self._expect_key = True
+                self._key = None
+
+    def _in_data_position(self) -> bool:
+        if not self._stack or not self._stack[-1][0] or self._expect_key or self._key is None:
+            return False
+        return self._key in _DATA_KEYS or (self._stack[-1][1], self._key) in _NESTED_DATA_KEYS
+
+    def _copy_string(self, data: bytes) -> None:
+        self._out += data
+        if self._key_buf is not None and len(self._key_buf) <= _KEY_LIMIT:
+            self._key_buf += data
+
+    def _fall_back(self, escape: bool = False) -> None:
+        # Probe bytes never contain a quote or backslash, so the string can
+        # continue in plain-copy mode from here.  ``escape`` re-emits a
+        # backslash that was consumed at the end of the previous chunk.
+        self._out += b'"'
+        self._out += self._probe
+        if escape:
+            self._out += b"\\"
+        self._probe.clear()
+        self._state = _STRING
+        self._escape = escape
+
+    def _open_sink(self) -> bool:
+        mime_type = parse_data_uri_header(self._probe.decode("ascii", errors="replace"))
+        if mime_type is None or mime_type not in ALLOWED_MIME_TYPES:
+            return False
+        self._sink = Base64FileSink(mime_type, self._max_inline_bytes)
+        self._probe.clear()
+        self._state = _DATA
+        return True
+
+    def _close_sink(self) -> None:
+        sink, self._sink = self._sink, None
+        try:
+            path = sink.close()
+        except Exception:
+            sink.abort()
+            raise
+        self.paths.append(path)
+        self._out += b'"file://' + path.name.encode() + b'"'
+        self._state = _OUTSIDE
+        logger.debug(f"Ingested inline data URI → {path} ({sink.size} bytes)")
+
+
+async def ingest_json_body(
+    chunks: AsyncIterator[bytes],
+    max_inline_bytes: Optional[int] = None,
+) -> Tuple[Any, List[Path]]:
+    """
+    Parse a streamed JSON body, spooling base64 data URIs to temp files.
+
+    Returns ``(parsed_body, temp_file_paths)``.  Each data URI string in the
+    body is replaced by ``"file://<file_id>"``; the caller owns the returned
+    temp files and must clean them up.
+
+    Raises InlineDataTooLarge when a single decoded payload passes
+    ``max_inline_bytes`` (checked while streaming), ValueError for malformed
+    bodies.  No temp files are left behind on error.
+    """
+    extractor = _InlineDataExtractor(max_inline_bytes)
+    try:
+        async for chunk in chunks:
+            if chunk:
+                extractor.feed(chunk)
+        body = json.loads(extractor.finish())
+    except Exception:
+        extractor.abort()
+        raise
+    return body, extractor.paths
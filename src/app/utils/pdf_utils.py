@@ -0,0 +1,231 @@
+# src/app/utils/pdf_utils.py
+"""
+Optional PDF stage run before a PDF is uploaded to Gemini.
+
+- Page selection: keep only the requested pages (``"3"``, ``"1-3,7"``).
+- Embedded image reduction: images whose longest edge passes
+  ``[PDF] max_image_edge`` are downscaled (or dropped), shrinking scanned PDFs.
+- Text-only: extract the text layer so the PDF does not need to be uploaded.
+
+The work is CPU heavy, so it runs in the ``pdf`` process pool.  This module avoids
+importing ``image_utils`` at load time so pool workers started with ``spawn``
+do not create a temp directory of their own.
+"""
+
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from app.config import CONFIG
+from app.logger import logger
+from app.utils.executors import run_in_pool
+
+# pypdf is optional — without it PDFs are uploaded unchanged
+try:
+    from pypdf import PdfReader, PdfWriter
+    HAS_PYPDF = True
+except ImportError:
+    HAS_PYPDF = False
+
+# Pillow is optional — needed only to re-encode embedded images
+try:
+    from PIL import Image
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
+
+_warned_no_pypdf = False
+
+
+def parse_page_ranges(spec: str) -> list[int]:
+    """
+    Parse a 1-based page spec like ``"1-3, 5, 8-"`` into sorted 0-based indices.
+
+    An open range (``"8-"``) runs to the end; it is returned as ``-8`` and
+    expanded once the page count is known.  Raises ValueError on bad input.
+    """
+    pages: set[int] = set()
+    for chunk in spec.replace(" ", "").split(","):
+        if not chunk:
+            continue
+        start, sep, end = chunk.partition("-")
+        if not start.isdigit() or (end and not end.isdigit()):
+            raise ValueError(f"Invalid page range: {chunk!r}")
+        first = int(start)
+        if first < 1:
+            raise ValueError("Page numbers start at 1")
+        if sep and not end:
+            pages.add(-first)
+            continue
+        last = int(end) if sep else first
+        if last < first:
+            raise ValueError(f"Invalid page range: {chunk!r}")
+        pages.update(range(first - 1, last))
+    if not pages:
+        raise ValueError("Empty page range")
+    return sorted(pages)
+
+
+def _expand_pages(pages: Optional[list[int]], count: int) -> list[int]:
+    if not pages:
+        return list(range(count))
+    expanded: set[int] = set()
+    for p in pages:
+        if p < 0:
+            expanded.update(range(-p - 1, count))
+        elif p < count:
+            expanded.add(p)
+    return sorted(expanded)
+
+
+# ---------------------------------------------------------------------------
+# Worker functions (run in the process pool)
+# ---------------------------------------------------------------------------
+
+def _reduce_images(writer, max_edge: int, mode: str, quality: int) -> int:
+    """Downscale or blank out embedded images larger than ``max_edge``."""
+    changed = 0
+    for page in writer.pages:
+        for image in page.images:
+            try:
+                pil = image.image
+                if max(pil.size) <= max_edge:
+                    continue
+                if mode == "drop":
+                    replacement = Image.new("L", (1, 1), 255)
+                else:
+                    replacement = pil.copy()
+                    if replacement.mode not in ("RGB", "L"):
+                        replacement = replacement.convert("RGB")
+                    replacement.thumbnail((max_edge, max_edge), Image.LANCZOS)
+                image.replace(replacement, quality=quality)
+                changed += 1
+            except Exception:
+                continue  # unsupported filter / colour space — keep the original
+    return changed
+
+
+def _process_pdf_sync(
+    src: str,
+    dest: str,
+    pages: Optional[list[int]],
+    max_image_edge: int,
+    image_mode: str,
+    quality: int,
+) -> Optional[dict]:
+    """Write a reduced copy of *src* to *dest*; None when nothing would change."""
+    reader = PdfReader(src)
+    count = len(reader.pages)
+    selected = _expand_pages(pages, count)
+    if not selected:
+        raise ValueError(f"Page selection is outside the document ({count} pages)")
+
+    writer = PdfWriter()
+    for i in selected:
+        writer.add_page(reader.pages[i])
+
+    images = 0
+    if max_image_edge > 0 and HAS_PIL:
+        images = _reduce_images(writer, max_image_edge, image_mode, quality)
+    if len(selected) == count and not images:
+        return None
+
+    writer.compress_identical_objects(remove_identicals=True, remove_orphans=True)
+    with open(dest, "wb") as fh:
+        writer.write(fh)
+    return {"pages": len(selected), "of": count, "images": images}
+
+
+def _extract_text_sync(src: str, pages: Optional[list[int]]) -> str:
+    """Text of the selected pages with page markers; "" if there is no text layer."""
+    reader = PdfReader(src)
+    parts = []
+    has_text = False
+    for i in _expand_pages(pages, len(reader.pages)):
+        text = (reader.pages[i].extract_text() or "").strip()
+        has_text = has_text or bool(text)
+        parts.append(f"--- Page {i + 1} ---\n{text}")
+    return "\n\n".join(parts) if has_text else ""
+
+
+# ---------------------------------------------------------------------------
+# Async API
+# ---------------------------------------------------------------------------
+
+def _pypdf_available() -> bool:
+    global _warned_no_pypdf
+    if not HAS_PYPDF and not _warned_no_pypdf:
+        logger.warning("PDF preprocessing requested but pypdf is not installed — using PDFs as-is.")
+        _warned_no_pypdf = True
+    return HAS_PYPDF
+
+
+def _parse_pages_or_warn(pages: Optional[str]) -> Optional[list[int]]:
+    if not pages:
+        return None
+    try:
+        return parse_page_ranges(str(pages))
+    except ValueError as exc:
+        logger.warning(f"Ignoring PDF page selection {pages!r}: {exc}")
+        return None
+
+
+async def preprocess_pdf(path: Path, pages: Optional[str] = None) -> Path:
+    """
+    Select pages and shrink oversized embedded images of a PDF.
+
+    Page selection always applies when ``pages`` is given; image reduction
+    only when ``[PDF] preprocess`` is enabled.  Returns a new temp file, or
+    *path* unchanged.  The input file is never modified or deleted.
+    """
+    if path.suffix.lower() != ".pdf":
+        return path
+    page_list = _parse_pages_or_warn(pages)
+    reduce_images = CONFIG.getboolean("PDF", "preprocess", fallback=False)
+    if not page_list and not reduce_images:
+        return path
+    if not _pypdf_available():
+        return path
+
+    # Imported here so spawned pool workers never create their own temp dir
+    from app.utils.image_utils import get_temp_dir
+
+    max_edge = CONFIG.getint("PDF", "max_image_edge", fallback=1600) if reduce_images else 0
+    image_mode = CONFIG["PDF"].get("oversized_images", "downscale").strip().lower() if "PDF" in CONFIG else "downscale"
+    quality = CONFIG.getint("PDF", "image_quality", fallback=75)
+    dest = get_temp_dir() / f"pdf_{uuid.uuid4().hex}.pdf"
+
+    try:
+        summary = await run_in_pool(
+            "pdf", _process_pdf_sync,
+            str(path), str(dest), page_list, max_edge, image_mode, quality,
+        )
+    except Exception as exc:
+        logger.warning(f"PDF preprocessing failed for {path.name}, uploading original: {exc}")
+        dest.unlink(missing_ok=True)
+        return path
+    if summary is None:
+        return path
+
+    logger.info(
+        f"Preprocessed PDF {path.name}: {summary['pages']}/{summary['of']} pages, "
+        f"{summary['images']} image(s) reduced ({path.stat().st_size} → {dest.stat().st_size} bytes)"
+    )
+    return dest
+
+
+async def extract_pdf_text(path: Path, pages: Optional[str] = None) -> Optional[str]:
+    """
+    Return the text layer of a PDF (optionally a page selection).
+
+    None when pypdf is missing, extraction fails, or the selected pages have
+    no text at all (e.g. a scanned document).
+    """
+    if path.suffix.lower() != ".pdf" or not _pypdf_available():
+        return None
+    try:
+        text = await run_in_pool("pdf", _extract_text_sync, str(path), _parse_pages_or_warn(pages))
+    except Exception as exc:
+        logger.warning(f"PDF text extraction failed for {path.name}: {exc}")
+        return None
+    return text or None
@@ -1,10 +1,13 @@
 # src/models/gemini.py
 import asyncio
-from typing import Optional, List, Union
+from typing import AsyncIterator, Optional, List, Union
 from pathlib import Path
+import gemini_webapi.client as _web_client_module
 from gemini_webapi import GeminiClient as WebGeminiClient
 from app.config import CONFIG
 from app.logger import logger
+from app.services.stats_collector import request_phase
+from app.services.tracer import span
 
 # Errors that are transient — gemini-webapi auto-reinits the session after
 # these, so retrying after a short delay usually succeeds.
@@ -12,6 +15,67 @@ _RETRYABLE_KEYWORDS = ("zombie stream", "failed to parse response body", "stalle
 _MAX_RETRIES = 2
 _RETRY_DELAYS = (3.0, 5.0)  # seconds between retry attempts
 
+# Process-wide upstream call counters (exported by /metrics)
+UPSTREAM_STATS = {"in_flight": 0, "calls_total": 0, "errors_total": 0, "retries_total": 0}
+
+
+def _install_upload_timing() -> None:
+    """
+    Report file uploads done inside ``generate_content`` as their own phase.
+
+    gemini-webapi (checked against 1.19.2) uploads attachments through the
+    module-level ``gemini_webapi.client.upload_file`` with no hook, so it is
+    wrapped once — on first client init, never twice.  If a later version
+    moves the call, the ``upload`` phase just stops being reported.
+    """
+    upload_file = getattr(_web_client_module, "upload_file", None)
+    if upload_file is None or getattr(upload_file, "_webai_timed", False):
+        return
+
+    async def timed(*args, **kwargs):
+        with request_phase("upload"):
+            return await upload_file(*args, **kwargs)
+
+    timed._webai_timed = True
+    _web_client_module.upload_file = timed
+
+
+def _instrument(client: WebGeminiClient) -> None:
+    """
+    Count and time calls on the web client instance itself, so chat sessions
+    (which call ``generate_content`` on it directly) are included too.
+    """
+    generate = client.generate_content
+    generate_stream = client.generate_content_stream
+
+    async def counted_generate(*args, **kwargs):
+        UPSTREAM_STATS["in_flight"] += 1
+        UPSTREAM_STATS["calls_total"] += 1
+        try:
+            with request_phase("upstream"):
+                return await generate(*args, **kwargs)
+        except Exception:
+            UPSTREAM_STATS["errors_total"] += 1
+            raise
+        finally:
+            UPSTREAM_STATS["in_flight"] -= 1
+
+    async def counted_stream(*args, **kwargs):
+        UPSTREAM_STATS["in_flight"] += 1
+        UPSTREAM_STATS["calls_total"] += 1
+        try:
+            with request_phase("upstream"):
+                async for output in generate_stream(*args, **kwargs):
+                    yield output
+        except Exception:
+            UPSTREAM_STATS["errors_total"] += 1
+            raise
+        finally:
+            UPSTREAM_STATS["in_flight"] -= 1
+
+    client.generate_content = counted_generate
+    client.generate_content_stream = counted_stream
+
 
 class MyGeminiClient:
     """
@@ -20,9 +84,11 @@ class MyGeminiClient:
     """
     def __init__(self, secure_1psid: str, secure_1psidts: str, proxy: str | None = None) -> None:
         self.client = WebGeminiClient(secure_1psid, secure_1psidts, proxy)
+        _instrument(self.client)
 
     async def init(self) -> None:
         """Initialize the Gemini client."""
+        _install_upload_timing()
         await self.client.init()
 
     async def generate_content(self, message: str, model: str, files: Optional[List[Union[str, Path]]] = None):
@@ -31,32 +97,91 @@ class MyGeminiClient:
         gemini-webapi reinitializes its session after zombie/parse errors
         (~2-3 s); retrying after that window succeeds in most cases.
         """
+        return await self._with_retries(
+            "gemini.generate_content", model, files,
+            lambda: self.client.generate_content(message, model=model, files=files),
+        )
+
+    async def send_chat(
+        self, message: str, model: str, metadata: list, files: Optional[List[Union[str, Path]]] = None
+    ):
+        """
+        Continue the conversation identified by its ``[cid, rid, rcid]``
+        *metadata*, with the same retries as ``generate_content``.  Returns
+        ``(response, metadata)`` where *metadata* identifies the new turn.
+        """
+        chat = None
+
+        async def send():
+            nonlocal chat
+            chat = self.start_chat(model, metadata=metadata)  # fresh session per attempt
+            return await chat.send_message(message, files=files)
+
+        response = await self._with_retries("gemini.send_chat", model, files, send)
+        return response, chat.metadata
+
+    async def _with_retries(self, name: str, model: str, files: Optional[list], call):
         last_exc: Exception | None = None
         for attempt in range(_MAX_RETRIES + 1):
             try:
-                return await self.client.generate_content(message, model=model, files=files)
+                with span(name, attempt=attempt + 1, model=model, files=len(files or [])):
+                    return await call()
             except Exception as e:
                 last_exc = e
                 err_lower = str(e).lower()
                 is_retryable = any(kw in err_lower for kw in _RETRYABLE_KEYWORDS)
                 if is_retryable and attempt < _MAX_RETRIES:
+                    UPSTREAM_STATS["retries_total"] += 1
                     delay = _RETRY_DELAYS[attempt]
                     logger.warning(
                         f"Gemini transient error (attempt {attempt + 1}/{_MAX_RETRIES + 1},"
                         f" model={model}): {e!r} — retrying in {delay}s"
                     )
-                    await asyncio.sleep(delay)
+                    with request_phase("retry"):
+                        await asyncio.sleep(delay)
                     continue
                 # Non-retryable or exhausted retries
                 raise
         raise last_exc  # unreachable, satisfies type checkers
 
+    async def generate_content_stream(
+        self, message: str, model: str, files: Optional[List[Union[str, Path]]] = None
+    ) -> AsyncIterator:
+        """
+        Stream partial outputs (``text_delta`` / ``thoughts_delta``) as they arrive.
+        Transient errors are retried only until the first chunk has been yielded.
+        """
+        for attempt in range(_MAX_RETRIES + 1):
+            started = False
+            try:
+                with span("gemini.generate_content_stream", attempt=attempt + 1, model=model, files=len(files or [])):
+                    async for output in self.client.generate_content_stream(message, files=files, model=model):
+                        started = True
+                        yield output
+                return
+            except Exception as e:
+                err_lower = str(e).lower()
+                is_retryable = any(kw in err_lower for kw in _RETRYABLE_KEYWORDS)
+                if started or not is_retryable or attempt >= _MAX_RETRIES:
+                    raise
+                UPSTREAM_STATS["retries_total"] += 1
+                delay = _RETRY_DELAYS[attempt]
+                logger.warning(
+                    f"Gemini transient stream error (attempt {attempt + 1}/{_MAX_RETRIES + 1},"
+                    f" model={model}): {e!r} — retrying in {delay}s"
+                )
+                with request_phase("retry"):
+                    await asyncio.sleep(delay)
+
     async def close(self) -> None:
         """Close the Gemini client."""
         await self.client.close()
 
-    def start_chat(self, model: str):
+    def start_chat(self, model: str, metadata: Optional[list] = None):
         """
-        Start a chat session with the given model.
+        Start a chat session with the given model, or resume an existing
+        conversation from its ``[cid, rid, rcid]`` metadata.
         """
+        if metadata:
+            return self.client.start_chat(model=model, metadata=metadata)
         return self.client.start_chat(model=model)
@@ -1,7 +1,7 @@
 # src/schemas/request.py
 from enum import Enum
 from typing import Any, List, Optional, Union
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 # ---------------------------------------------------------------------------
@@ -11,7 +11,7 @@ from pydantic import BaseModel, Field
 class ImageUrlDetail(BaseModel):
     """Inner object for image_url content parts."""
     url: str
-    detail: Optional[str] = "auto"
+    detail: Optional[str] = "auto"  # "low" | "high" | "auto" — picks the [Images] max edge
 
 
 class ContentPart(BaseModel):
@@ -41,6 +41,25 @@ class GeminiRequest(BaseModel):
     model: GeminiModels = Field(default=GeminiModels.FLASH, description="Model to use for Gemini.")
     files: Optional[List[str]] = []
     session_id: Optional[str] = None
+    # PDF options for ``files``: 1-based page selection ("1-3,7") and
+    # sending only the extracted text layer instead of the document
+    pdf_pages: Optional[str] = None
+    pdf_text_only: Optional[bool] = False
+    # /gemini only: run as a background job (poll /jobs/{job_id}) and
+    # optionally POST the finished job to a local webhook
+    background: Optional[bool] = False
+    webhook_url: Optional[str] = None
+
+class BulkTranslateRequest(BaseModel):
+    """Body for /translate/bulk — exactly one of ``texts`` or ``document``."""
+    target_language: str
+    texts: Optional[List[str]] = None
+    document: Optional[str] = None
+    source_language: Optional[str] = None
+    # Extra guidance for every segment (tone, glossary, product names …)
+    instructions: Optional[str] = None
+    model: GeminiModels = Field(default=GeminiModels.FLASH, description="Model to use for Gemini.")
+    use_memory: Optional[bool] = True
 
 class OpenAIChatRequest(BaseModel):
     messages: List[dict]
@@ -51,11 +70,29 @@ class OpenAIChatRequest(BaseModel):
     model: Optional[str] = None
     stream: Optional[bool] = False
 
+class Blob(BaseModel):
+    """Google ``inlineData``: base64 bytes with a MIME type."""
+    model_config = ConfigDict(populate_by_name=True)
+    mime_type: str = Field(alias="mimeType")
+    data: str
+
+class FileData(BaseModel):
+    """Google ``fileData``: a ``file_…`` id, ``file://`` or http(s) URI."""
+    model_config = ConfigDict(populate_by_name=True)
+    mime_type: Optional[str] = Field(default=None, alias="mimeType")
+    file_uri: str = Field(alias="fileUri")
+
 class Part(BaseModel):
-    text: str
+    model_config = ConfigDict(populate_by_name=True)
+    text: Optional[str] = None
+    inline_data: Optional[Blob] = Field(default=None, alias="inlineData")
+    file_data: Optional[FileData] = Field(default=None, alias="fileData")
 
 class Content(BaseModel):
-    parts: List[Part]
+    role: Optional[str] = None  # "user" | "model"
+    parts: List[Part] = []
 
 class GoogleGenerativeRequest(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
     contents: List[Content]
+    system_instruction: Optional[Content] = Field(default=None, alias="systemInstruction")
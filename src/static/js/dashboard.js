@@ -107,7 +107,8 @@ curl -X POST ${base}/v1/chat/completions \\
 ];
 
 const Dashboard = {
-    intervalId: null,
+    eventSource: null,
+    series: { seconds: [], minutes: [] },
 
     _activeCurlTab: null,
 
@@ -138,6 +139,10 @@ const Dashboard = {
             }
         });
 
+        document.getElementById("btn-profile").addEventListener("click", () => this.runProfile());
+        document.getElementById("live-resolution").addEventListener("change", () => this.drawCharts());
+        window.addEventListener("resize", () => this.drawCharts());
+
         // Copy button handlers
         document.querySelectorAll(".btn-copy").forEach(btn => {
             btn.addEventListener("click", () => {
@@ -156,27 +161,125 @@ const Dashboard = {
     },
 
     activate() {
-        this.refresh();
-        this.intervalId = setInterval(() => this.refresh(), 10000);
+        this.connectStats();
     },
 
     deactivate() {
-        if (this.intervalId) {
-            clearInterval(this.intervalId);
-            this.intervalId = null;
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
         }
     },
 
     async refresh() {
         try {
-            const data = await api.get("/api/admin/status");
-            this.updateCards(data);
-            this.updateEndpointTable(data.stats.endpoints, data.stats.endpoints_detail, data.stats.total_requests);
+            this.applyStatus(await api.get("/api/admin/status"));
         } catch {
             document.getElementById("val-status").textContent = "Error";
         }
     },
 
+    applyStatus(data) {
+        this.updateCards(data);
+        this.updateEndpointTable(data.stats.endpoints, data.stats.endpoints_detail, data.stats.total_requests);
+        this.updateLatencyTable(data.stats.latency);
+        this.updateClientsTable(data.stats.clients);
+    },
+
+    // Status every 10 s and a time-series point every second, pushed by the server
+    connectStats() {
+        if (this.eventSource) this.eventSource.close();
+        this.eventSource = new EventSource("/api/admin/stats/stream");
+
+        this.eventSource.addEventListener("status", (event) => this.applyStatus(JSON.parse(event.data)));
+        this.eventSource.addEventListener("history", (event) => {
+            this.series = JSON.parse(event.data);
+            this.drawCharts();
+        });
+        for (const [name, key] of [["second", "seconds"], ["minute", "minutes"]]) {
+            this.eventSource.addEventListener(name, (event) => {
+                const points = this.series[key];
+                points.push(JSON.parse(event.data));
+                if (points.length > 600) points.splice(0, points.length - 600);
+                if (document.getElementById("live-resolution").value === key) this.drawCharts();
+            });
+        }
+
+        this.eventSource.onerror = () => {
+            // EventSource auto-reconnects
+            document.getElementById("val-status").textContent = "Reconnecting...";
+        };
+    },
+
+    drawCharts() {
+        const key = document.getElementById("live-resolution").value;
+        const points = this.series[key] || [];
+        const unit = key === "seconds" ? "/s" : "/min";
+        const fmtMs = (ms) => ms >= 1000 ? (ms / 1000).toFixed(2) + " s" : Math.round(ms) + " ms";
+        const last = points[points.length - 1];
+        document.getElementById("live-summary").textContent = last
+            ? `${last.requests} req${unit} · p95 ${fmtMs(last.p95_ms)} · ${last.in_flight} in flight`
+            : "";
+
+        this.drawChart("chart-throughput", points, [
+            { field: "requests", color: "--md-primary", bars: true },
+            { field: "errors", color: "--md-error", bars: true },
+        ], (max) => `${max} req${unit}`);
+        this.drawChart("chart-latency", points, [
+            { field: "p95_ms", color: "--md-warning", label: (max) => "p95 " + fmtMs(max) },
+            { field: "in_flight_max", color: "--md-tertiary", label: (max) => max + " in flight" },
+        ]);
+    },
+
+    // Bars share one scale; each line is scaled to its own maximum (noted top-left)
+    drawChart(canvasId, points, layers, barLabel) {
+        const canvas = document.getElementById(canvasId);
+        const ratio = window.devicePixelRatio || 1;
+        const width = canvas.clientWidth, height = canvas.clientHeight;
+        if (!width) return;
+        canvas.width = width * ratio;
+        canvas.height = height * ratio;
+        const ctx = canvas.getContext("2d");
+        ctx.scale(ratio, ratio);
+        ctx.clearRect(0, 0, width, height);
+
+        const style = getComputedStyle(document.documentElement);
+        const top = 18, plotHeight = height - top - 4;
+        const step = width / Math.max(points.length, 1);
+        const barMax = Math.max(1, ...layers.filter(l => l.bars).flatMap(l => points.map(p => p[l.field])));
+        const labels = [];
+        ctx.font = "11px monospace";
+
+        for (const layer of layers) {
+            const color = style.getPropertyValue(layer.color).trim();
+            ctx.fillStyle = ctx.strokeStyle = color;
+            if (layer.bars) {
+                points.forEach((p, i) => {
+                    const h = (p[layer.field] / barMax) * plotHeight;
+                    ctx.fillRect(i * step, height - 4 - h, Math.max(step - 1, 1), h);
+                });
+                continue;
+            }
+            const max = Math.max(...points.map(p => p[layer.field]), 0);
+            labels.push([layer.label(max), color]);
+            ctx.beginPath();
+            points.forEach((p, i) => {
+                const y = height - 4 - (max ? p[layer.field] / max : 0) * plotHeight;
+                i ? ctx.lineTo(i * step + step / 2, y) : ctx.moveTo(step / 2, y);
+            });
+            ctx.lineWidth = 1.5;
+            ctx.stroke();
+        }
+
+        if (barLabel) labels.unshift([barLabel(barMax), style.getPropertyValue("--md-on-surface-variant").trim()]);
+        let x = 6;
+        for (const [text, color] of labels) {
+            ctx.fillStyle = color;
+            ctx.fillText(text, x, 12);
+            x += ctx.measureText(text).width + 14;
+        }
+    },
+
     updateCards(data) {
         const statusEl = document.getElementById("val-status");
         const statusCard = document.getElementById("card-status");
@@ -209,6 +312,14 @@ const Dashboard = {
         document.getElementById("val-errors").textContent = data.stats.error_count + " ERR";
         document.getElementById("val-uptime").textContent = data.stats.uptime;
 
+        const loop = data.stats.event_loop;
+        if (loop) {
+            const fmtLag = (ms) => ms >= 1000 ? (ms / 1000).toFixed(2) + " s" : ms.toFixed(1) + " ms";
+            document.getElementById("val-loop-lag").textContent = fmtLag(loop.lag.p99_ms);
+            document.getElementById("val-loop-max").textContent = "max " + fmtLag(loop.lag.max_ms);
+            document.getElementById("val-loop-blocks").textContent = loop.blocks + " blocked";
+        }
+
         // Update header badge
         const badge = document.getElementById("connection-status");
         badge.textContent = data.gemini_status === "connected" ? "Connected" : "Disconnected";
@@ -257,6 +368,99 @@ const Dashboard = {
         }).join("");
     },
 
+    updateLatencyTable(latency) {
+        const tbody = document.getElementById("latency-tbody");
+        const noData = document.getElementById("no-latency");
+        const overallEl = document.getElementById("latency-overall");
+        const series = (latency && latency.series) || [];
+
+        if (series.length === 0) {
+            tbody.innerHTML = "";
+            overallEl.textContent = "";
+            noData.classList.remove("hidden");
+            return;
+        }
+
+        noData.classList.add("hidden");
+        const fmt = (ms) => ms >= 1000 ? (ms / 1000).toFixed(2) + " s" : Math.round(ms) + " ms";
+        const o = latency.overall;
+        overallEl.textContent = `p50 ${fmt(o.p50_ms)} · p95 ${fmt(o.p95_ms)} · p99 ${fmt(o.p99_ms)}`;
+
+        tbody.innerHTML = series.map(s => {
+            const outcomeClass = s.outcome === "ok" ? "ep-ok" : "ep-err";
+            return `<tr>
+                <td class="ep-path">${escapeHtml(s.endpoint)}</td>
+                <td>${escapeHtml(s.model)}</td>
+                <td class="${outcomeClass}">${escapeHtml(s.outcome)}</td>
+                <td class="col-num ep-count">${s.count}</td>
+                <td class="col-num">${fmt(s.p50_ms)}</td>
+                <td class="col-num">${fmt(s.p90_ms)}</td>
+                <td class="col-num">${fmt(s.p95_ms)}</td>
+                <td class="col-num">${fmt(s.p99_ms)}</td>
+            </tr>`;
+        }).join("");
+    },
+
+    updateClientsTable(clients) {
+        const tbody = document.getElementById("clients-tbody");
+        const noData = document.getElementById("no-clients");
+        if (!clients || clients.length === 0) {
+            tbody.innerHTML = "";
+            noData.classList.remove("hidden");
+            return;
+        }
+
+        noData.classList.add("hidden");
+        const fmtMs = (ms) => ms >= 1000 ? (ms / 1000).toFixed(2) + " s" : Math.round(ms) + " ms";
+        const fmtBytes = (n) => n >= 1048576 ? (n / 1048576).toFixed(1) + " MB" : n >= 1024 ? (n / 1024).toFixed(1) + " KB" : n + " B";
+        const now = Date.now() / 1000;
+
+        tbody.innerHTML = clients.map(c => {
+            const [route, hits] = Object.entries(c.routes)[0] || ["—", 0];
+            const models = Object.keys(c.models).join(", ");
+            const errPct = (c.error_rate * 100).toFixed(1);
+            const errClass = c.error_rate > 0 ? ' class="col-num ep-err"' : ' class="col-num"';
+            const count = c.overcount ? `≤${c.count}` : `${c.count}`;
+            return `<tr>
+                <td class="ep-path" title="${escapeHtml(c.user_agent + " @ " + c.address)}">${escapeHtml(c.client)}</td>
+                <td class="ep-path" title="${escapeHtml("models: " + models)}">${escapeHtml(route)} <span class="section-note">${hits}</span></td>
+                <td class="col-num ep-count">${count}</td>
+                <td class="col-num">${c.rate_per_min.toFixed(1)}</td>
+                <td${errClass}>${errPct}%</td>
+                <td class="col-num">${fmtMs(c.latency.p95_ms)}</td>
+                <td class="col-num">${fmtBytes(c.bytes_in)}</td>
+                <td class="col-num">${fmtBytes(c.bytes_out)}</td>
+                <td class="ep-last">${escapeHtml(_relativeTime(now - c.last_seen))}</td>
+            </tr>`;
+        }).join("");
+    },
+
+    async runProfile() {
+        const btn = document.getElementById("btn-profile");
+        const resultEl = document.getElementById("profile-result");
+        const seconds = document.getElementById("profile-seconds").value;
+        btn.disabled = true;
+        btn.textContent = `Profiling ${seconds} s...`;
+        try {
+            const data = await api.post(`/api/admin/profile?seconds=${seconds}`);
+            resultEl.textContent = `${data.samples} samples · ${data.threads.length} thread(s)`;
+            resultEl.style.color = "var(--success)";
+            document.getElementById("profile-downloads").classList.remove("hidden");
+            document.getElementById("profile-table").classList.remove("hidden");
+            document.getElementById("profile-tbody").innerHTML = data.top.map(f => `<tr>
+                <td class="ep-path">${escapeHtml(f.function)}</td>
+                <td class="ep-path">${escapeHtml(f.location)}</td>
+                <td class="col-num">${f.samples}</td>
+                <td class="col-num">${f.percent}</td>
+            </tr>`).join("");
+        } catch (err) {
+            showInline(resultEl, "Failed: " + (err.detail || "Unknown error"), true);
+        } finally {
+            btn.disabled = false;
+            btn.textContent = "Run CPU Profile";
+        }
+    },
+
     getBaseUrl() {
         return window.location.origin;
     },
@@ -74,7 +74,8 @@ const Logs = {
 
         if (levelFilter !== "ALL" && entry.level !== levelFilter) return false;
         if (searchText && !entry.message.toLowerCase().includes(searchText) &&
-            !entry.logger.toLowerCase().includes(searchText)) return false;
+            !entry.logger.toLowerCase().includes(searchText) &&
+            !(entry.request_id || "").toLowerCase().includes(searchText)) return false;
 
         return true;
     },
@@ -104,6 +105,6 @@ const Logs = {
 
     formatEntry(entry) {
         const ts = entry.timestamp.split("T")[1] || entry.timestamp;
-        return `<div class="log-entry"><span class="ts">${escapeHtml(ts)}</span> <span class="lvl lvl-${entry.level}">${entry.level.padEnd(7)}</span> <span class="logger-name">[${escapeHtml(entry.logger)}]</span> <span class="msg">${escapeHtml(entry.message)}</span></div>`;
+        return `<div class="log-entry"><span class="ts">${escapeHtml(ts)}</span> <span class="lvl lvl-${entry.level}">${entry.level.padEnd(7)}</span> <span class="logger-name">[${escapeHtml(entry.logger)}]</span> ${entry.request_id ? `<span class="request-id" title="Request ID">${escapeHtml(entry.request_id)}</span> ` : ""}<span class="msg">${escapeHtml(entry.message)}</span></div>`;
     },
 };